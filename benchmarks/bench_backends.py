@@ -0,0 +1,91 @@
+"""
+Compare the model backends side by side on the same synthetic month.
+
+Each backend of config/model.yaml is trained on one synthetic month with its
+configured parameters and evaluated on another one. The report gives its fit
+time, the size of the saved pipeline, the latency of a single-row prediction
+and the throughput of a batch through the inference handlers, and its RMSE. Run
+it from the root of the repository:
+
+    python benchmarks/bench_backends.py --train-rows 500000
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.append("benchmarks")
+sys.path.append("deployment")
+sys.path.append("src/data")
+sys.path.append("src/models")
+from inference import predict_fn  # noqa: E402
+from joblib import load  # noqa: E402
+from make_dataset import transform_trips  # noqa: E402
+from synthetic import make_trips  # noqa: E402
+from train_model import Trainer  # noqa: E402
+
+PARAMS = {
+    "random_forest": {"n_estimators": 50, "max_depth": 10},
+    "hist_gradient_boosting": {
+        "max_iter": 200,
+        "learning_rate": 0.1,
+        "max_leaf_nodes": 31,
+    },
+}
+
+
+def main():
+    """Train every backend and report them side by side."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--train-rows", type=int, default=500_000)
+    parser.add_argument("--test-rows", type=int, default=200_000)
+    parser.add_argument("--single-rows", type=int, default=200)
+    args = parser.parse_args()
+
+    train = transform_trips(make_trips(args.train_rows, month=1, seed=0))
+    train["PU_DO"] = train["PULocationID"] + "_" + train["DOLocationID"]
+    test = make_trips(args.test_rows, month=2, seed=1)
+    test = test.assign(duration=transform_trips(test)["duration"]).dropna()
+    requests = test[["PULocationID", "DOLocationID", "trip_distance"]]
+    records = requests.head(args.single_rows).to_dict(orient="records")
+
+    print(
+        f"{'backend':<24}{'fit s':>8}{'MB':>8}{'single ms':>11}"
+        f"{'batch rows/s':>14}{'rmse':>9}"
+    )
+    for backend, params in PARAMS.items():
+        with tempfile.TemporaryDirectory() as root_folder:
+            trainer = Trainer(
+                train[["PU_DO", "trip_distance"]],
+                train["duration"].to_numpy(),
+                params={"backend": backend, **params},
+                root_folder=root_folder,
+            )
+            start = time.perf_counter()
+            trainer.train()
+            fit_seconds = time.perf_counter() - start
+            trainer.save_pipeline()
+            size = os.path.getsize(trainer.pipeline_path) / 2**20
+            model = load(trainer.pipeline_path)
+
+        predict_fn(records[0], model)
+        start = time.perf_counter()
+        for record in records:
+            predict_fn(record, model)
+        single = (time.perf_counter() - start) / len(records)
+        start = time.perf_counter()
+        predictions = predict_fn(requests, model)
+        rate = len(requests) / (time.perf_counter() - start)
+        rmse = np.sqrt(np.mean((predictions - test["duration"].to_numpy()) ** 2))
+        print(
+            f"{backend:<24}{fit_seconds:>8.1f}{size:>8.1f}{single * 1e3:>11.3f}"
+            f"{rate:>14,.0f}{rmse:>9.4f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
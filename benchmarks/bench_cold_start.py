@@ -0,0 +1,124 @@
+"""
+Measure the cold start of each model artifact format: load plus first prediction.
+
+A random forest with the config/model.yaml shape (50 trees of depth 10) is
+trained on a synthetic month, saved in each format, then every format is loaded
+in a fresh process, the way a serverless endpoint starts: the imports, the load
+and the first prediction are timed separately. NumPy is imported by this module,
+so it is not part of the timed imports. Run it from the root of the repository:
+
+    python benchmarks/bench_cold_start.py --repeat 5
+
+Formats:
+        joblib-compressed: The pipeline pickled with joblib, compress=3.
+        joblib: The pipeline pickled with joblib, uncompressed (save_pipeline).
+        joblib-mmap: The uncompressed pipeline, loaded with mmap_mode="r".
+        flat-npz: The flattened forest (export_forest), read with np.load.
+        flat-mmap: The flattened forest, memory-mapped in place.
+"""
+
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+FORMATS = ["joblib-compressed", "joblib", "joblib-mmap", "flat-npz", "flat-mmap"]
+SAMPLE = {"PULocationID": 9, "DOLocationID": 70, "trip_distance": 2.5}
+
+
+def _cold_start(artifact, artifact_format, queue):
+    """Load an artifact in a fresh process and predict one row."""
+    start = time.perf_counter()
+    sys.path.append("deployment")
+    if artifact_format.startswith("flat"):
+        from flat_forest import FlatForest
+    else:
+        import pandas as pd
+        from inference import predict_fn
+        from joblib import load
+    imported = time.perf_counter()
+
+    if artifact_format.startswith("flat"):
+        mmap_mode = "r" if artifact_format == "flat-mmap" else None
+        model = FlatForest.load(artifact, mmap_mode=mmap_mode)
+    else:
+        mmap_mode = "r" if artifact_format == "joblib-mmap" else None
+        model = load(artifact, mmap_mode=mmap_mode)
+    loaded = time.perf_counter()
+
+    if artifact_format.startswith("flat"):
+        prediction = model.predict_locations(
+            [SAMPLE["PULocationID"]], [SAMPLE["DOLocationID"]], SAMPLE["trip_distance"]
+        )[0]
+    else:
+        prediction = predict_fn(pd.DataFrame([SAMPLE]), model)[0]
+    predicted = time.perf_counter()
+    queue.put(
+        {
+            "imports": imported - start,
+            "load": loaded - imported,
+            "predict": predicted - loaded,
+            "prediction": float(prediction),
+        }
+    )
+
+
+def main():
+    """Save the model in each format and measure their cold starts."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--train-rows", type=int, default=200_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    sys.path.append("benchmarks")
+    from bench_predict import train_trainer
+    from joblib import dump
+
+    context = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as root_folder:
+        trainer, _ = train_trainer(args.train_rows, root_folder)
+        trainer.save_pipeline()
+        trainer.export_forest()
+        compressed = os.path.join(root_folder, "compressed.joblib")
+        dump(trainer.pipeline, compressed, compress=3)
+        artifacts = {
+            "joblib-compressed": compressed,
+            "joblib": trainer.pipeline_path,
+            "joblib-mmap": trainer.pipeline_path,
+            "flat-npz": trainer.forest_path,
+            "flat-mmap": trainer.forest_path,
+        }
+
+        print(
+            f"{'format':<19}{'MB':>7}{'imports ms':>12}{'load ms':>10}"
+            f"{'predict ms':>12}{'total ms':>10}"
+        )
+        for artifact_format in FORMATS:
+            runs = []
+            for _ in range(args.repeat):
+                queue = context.Queue()
+                process = context.Process(
+                    target=_cold_start,
+                    args=(artifacts[artifact_format], artifact_format, queue),
+                )
+                process.start()
+                runs.append(queue.get())
+                process.join()
+            median = {
+                phase: np.median([run[phase] for run in runs]) * 1000
+                for phase in ["imports", "load", "predict"]
+            }
+            size = os.path.getsize(artifacts[artifact_format]) / 2**20
+            print(
+                f"{artifact_format:<19}{size:>7.1f}{median['imports']:>12.1f}"
+                f"{median['load']:>10.1f}{median['predict']:>12.1f}"
+                f"{sum(median.values()):>10.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Compare the latency of the FlatForest predictor with the scikit-learn pipeline.
+
+A random forest with the config/model.yaml shape (50 trees of depth 10) is
+trained on a synthetic month, saved and exported like the training job does,
+then the saved pipeline and the exported forest predict single rows and batches.
+Run it from the root of the repository:
+
+    python benchmarks/bench_flat_forest.py --batch-sizes 1 100 10000
+"""
+
+import argparse
+import sys
+import tempfile
+import time
+
+import numpy as np
+from joblib import load
+
+sys.path.append("benchmarks")
+sys.path.append("deployment")
+from bench_predict import train_trainer  # noqa: E402
+from flat_forest import FlatForest  # noqa: E402
+from pair_encoding import location_keys  # noqa: E402
+from synthetic import make_trips  # noqa: E402
+
+
+def time_calls(function, n_calls):
+    """
+    Time repeated calls of a function.
+
+    Args:
+        function (callable): The function to call, without arguments.
+        n_calls (int): The number of calls.
+
+    Returns:
+        numpy.ndarray: The latency of each call, in milliseconds.
+    """
+    latencies = np.empty(n_calls)
+    for i in range(n_calls):
+        start = time.perf_counter()
+        function()
+        latencies[i] = (time.perf_counter() - start) * 1000
+    return latencies
+
+
+def main():
+    """Train, export and measure both predictors per batch size."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--train-rows", type=int, default=200_000)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 100, 10_000])
+    parser.add_argument("--calls", type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root_folder:
+        trainer, _ = train_trainer(args.train_rows, root_folder)
+        trainer.save_pipeline()
+        trainer.export_forest()
+        pipeline = load(trainer.pipeline_path)
+        forest = FlatForest.load(trainer.forest_path)
+    print(f"flat forest: {len(forest.value):,} nodes, {forest.nbytes / 2**20:.1f} MB")
+
+    requests = make_trips(max(args.batch_sizes), seed=1)
+    pu_do = location_keys(requests["PULocationID"], requests["DOLocationID"])
+    distances = requests["trip_distance"].to_numpy()
+    records = [
+        {"PU_DO": key, "trip_distance": distance}
+        for key, distance in zip(pu_do, distances, strict=True)
+    ]
+    np.testing.assert_allclose(
+        forest.predict(pu_do, distances), pipeline.predict(records), rtol=1e-9
+    )
+
+    print(
+        f"{'predictor':<14}{'batch size':>12}{'p50 ms':>10}{'p99 ms':>10}"
+        f"{'rows/s':>14}"
+    )
+    for batch_size in args.batch_sizes:
+        n_calls = max(3, min(args.calls, args.calls * 100 // batch_size))
+        candidates = {
+            "scikit-learn": lambda n=batch_size: pipeline.predict(records[:n]),
+            "flat forest": lambda n=batch_size: forest.predict(
+                pu_do[:n], distances[:n]
+            ),
+        }
+        for name, function in candidates.items():
+            latencies = time_calls(function, n_calls)
+            p50, p99 = np.percentile(latencies, [50, 99])
+            rate = batch_size / (latencies.mean() / 1000)
+            print(f"{name:<14}{batch_size:>12}{p50:>10.3f}{p99:>10.3f}{rate:>14,.0f}")
+
+
+if __name__ == "__main__":
+    main()
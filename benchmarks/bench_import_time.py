@@ -0,0 +1,117 @@
+"""
+Profile the import time of the entry points and check it against budgets.
+
+Each entry point is imported in a fresh interpreter with -X importtime, several
+times; the median cumulative import time is compared with its budget, and the
+heavy optional dependencies that it must not import at module level are checked.
+The script exits with status 1 when a budget is exceeded or a forbidden module
+is imported, so it can run as a regression check. Run it from the root of the
+repository:
+
+    python benchmarks/bench_import_time.py --repeat 5
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+# Imported by the entry points only where they are used
+OPTIONAL = ["boto3", "botocore", "neptune", "sagemaker", "hydra"]
+# Imported by the pipeline, but not needed to serve the flattened forest
+SERVING = ["sklearn", "scipy", "joblib"]
+
+# name: (sys.path entry, module, budget in ms, forbidden modules)
+ENTRY_POINTS = {
+    "flat_forest": ("deployment", "flat_forest", 300, [*OPTIONAL, *SERVING, "pandas"]),
+    "inference": ("deployment", "inference", 1500, [*OPTIONAL, *SERVING]),
+    "server": ("deployment", "server", 1500, [*OPTIONAL, *SERVING]),
+    "deploy": ("deployment", "deploy", 300, OPTIONAL),
+    "make_dataset": ("src/data", "make_dataset", 1500, OPTIONAL),
+    "train_model": ("src/models", "train_model", 4000, OPTIONAL),
+    "training_job": (".", "training_job", 4000, OPTIONAL),
+    "run_commands": (".", "run_commands", 4000, OPTIONAL),
+}
+
+
+def profile_import(path, module):
+    """
+    Import a module in a fresh interpreter with -X importtime.
+
+    Args:
+        path (str): The folder to add to sys.path.
+        module (str): The module to import.
+
+    Returns:
+        dict: The cumulative import time of the module in ms, the heaviest modules
+        it imports directly, and the list of modules loaded after the import.
+    """
+    code = (
+        f"import sys; sys.path.append({path!r}); import {module}; "
+        "import json; print(json.dumps(sorted(sys.modules)))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    total, children = 0.0, []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if not cumulative.strip().isdigit():
+            continue
+        depth = (len(name) - len(name.lstrip())) // 2
+        if name.strip() == module and depth == 0:
+            total = int(cumulative) / 1000
+        elif depth == 1:
+            children.append((int(cumulative) / 1000, name.strip()))
+    return {
+        "ms": total,
+        "children": sorted(children, reverse=True),
+        "modules": json.loads(result.stdout.splitlines()[-1]),
+    }
+
+
+def main():
+    """Profile every entry point and report the ones over budget."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--top", type=int, default=3)
+    parser.add_argument("entry_points", nargs="*", default=list(ENTRY_POINTS))
+    args = parser.parse_args()
+
+    failures = []
+    print(f"{'entry point':<14}{'ms':>9}{'budget':>9}  heaviest imports")
+    for name in args.entry_points:
+        path, module, budget, forbidden = ENTRY_POINTS[name]
+        runs = [profile_import(path, module) for _ in range(args.repeat)]
+        median = statistics.median(run["ms"] for run in runs)
+        heaviest = ", ".join(
+            f"{child} {ms:.0f}" for ms, child in runs[-1]["children"][: args.top]
+        )
+        print(f"{name:<14}{median:>9.0f}{budget:>9}  {heaviest}")
+
+        if median > budget:
+            failures.append(f"{name} imports in {median:.0f} ms (budget {budget} ms)")
+        loaded = sorted(
+            {
+                forbidden_module
+                for forbidden_module in forbidden
+                for loaded_module in runs[-1]["modules"]
+                if loaded_module.split(".")[0] == forbidden_module
+            }
+        )
+        if loaded:
+            failures.append(f"{name} imports {', '.join(loaded)}")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Compare incremental retraining (Trainer.train_incremental) with full retrains.
+
+A random forest with the config/model.yaml shape (50 trees of depth 10) is
+trained on a first synthetic month. Each following month then arrives: the full
+retrain fits a new forest on the whole history, while the incremental retrain
+adds trees fitted on the new month only to the previous pipeline, keeping the
+newest --max-estimators trees. Both are evaluated on the month after the last
+one. Run it from the root of the repository:
+
+    python benchmarks/bench_incremental.py --months 4 --rows 100000
+"""
+
+import argparse
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+sys.path.append("benchmarks")
+sys.path.append("src/data")
+sys.path.append("src/models")
+from make_dataset import transform_trips  # noqa: E402
+from synthetic import make_trips  # noqa: E402
+from train_model import Trainer  # noqa: E402
+
+PARAMS = {"n_estimators": 50, "max_depth": 10}
+
+
+def make_month(n_rows, month):
+    """
+    Make the transformed trips of a synthetic month, with their PU_DO pairs.
+
+    Args:
+        n_rows (int): The number of synthetic trips.
+        month (int): The month of 2022, also used as the random seed.
+
+    Returns:
+        pandas.DataFrame: The PU_DO, trip_distance and duration columns.
+    """
+    trips = transform_trips(make_trips(n_rows, month=month, seed=month))
+    trips["PU_DO"] = trips["PULocationID"] + "_" + trips["DOLocationID"]
+    return trips[["PU_DO", "trip_distance", "duration"]]
+
+
+def main():
+    """Retrain month after month, both ways, and report RMSE and wall time."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--months", type=int, default=4)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--n-estimators", type=int, default=25)
+    parser.add_argument("--max-estimators", type=int, default=100)
+    args = parser.parse_args()
+
+    months = [make_month(args.rows, month) for month in range(1, args.months + 2)]
+    test = months.pop()
+
+    print(
+        f"{'month':>5}{'history rows':>14}{'full s':>9}{'full rmse':>11}"
+        f"{'incr. s':>9}{'incr. rmse':>12}{'trees':>7}"
+    )
+    with tempfile.TemporaryDirectory() as root_folder:
+        for index in range(len(months)):
+            history = pd.concat(months[: index + 1], ignore_index=True)
+            full = Trainer(
+                history[["PU_DO", "trip_distance"]],
+                history["duration"].to_numpy(),
+                test[["PU_DO", "trip_distance"]],
+                test["duration"].to_numpy(),
+                params=PARAMS,
+                root_folder=root_folder,
+            )
+            start = time.perf_counter()
+            full.train()
+            full_seconds = time.perf_counter() - start
+            if index == 0:
+                full.save_pipeline()
+                print(f"{1:>5}{len(history):>14,}{full_seconds:>9.1f}")
+                continue
+
+            incremental = Trainer(
+                months[index][["PU_DO", "trip_distance"]],
+                months[index]["duration"].to_numpy(),
+                test[["PU_DO", "trip_distance"]],
+                test["duration"].to_numpy(),
+                params=PARAMS,
+                root_folder=root_folder,
+            )
+            start = time.perf_counter()
+            incremental.train_incremental(args.n_estimators, args.max_estimators)
+            incremental_seconds = time.perf_counter() - start
+            incremental.save_pipeline()
+            print(
+                f"{index + 1:>5}{len(history):>14,}{full_seconds:>9.1f}"
+                f"{full.evaluate():>11.4f}{incremental_seconds:>9.1f}"
+                f"{incremental.evaluate():>12.4f}"
+                f"{len(incremental.pipeline.steps[-1][1].estimators_):>7}"
+            )
+
+
+if __name__ == "__main__":
+    main()
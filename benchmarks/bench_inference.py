@@ -0,0 +1,149 @@
+"""
+Drive the SageMaker handlers of deployment/inference.py end to end, locally.
+
+A model is trained on a synthetic month and saved as model.joblib (or taken from
+--model-dir), loaded with model_fn, then requests of several batch sizes go
+through input_fn, predict_fn and output_fn, as the serving container chains
+them. Run it from the root of the repository:
+
+    python benchmarks/bench_inference.py --batch-sizes 1 10 100 1000
+
+Each request is sent and answered in the same encoding (--formats).
+"""
+
+import argparse
+import io
+import json
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pyarrow as pa
+
+sys.path.append("benchmarks")
+sys.path.append("deployment")
+from inference import input_fn, model_fn, output_fn, predict_fn  # noqa: E402
+from synthetic import make_trips  # noqa: E402
+
+FORMATS = {
+    "json": "application/json",
+    "jsonlines": "application/jsonlines",
+    "npy": "application/x-npy",
+    "csv": "text/csv",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+
+
+def invoke(model, body, content_type, accept=None):
+    """
+    Run one request through input_fn, predict_fn and output_fn.
+
+    Args:
+        model: The model returned by model_fn.
+        body (bytes): The request body.
+        content_type (str): The Content-Type of the request.
+        accept (str): The Accept of the request. Defaults to content_type.
+
+    Returns:
+        The response returned by output_fn.
+    """
+    prediction = predict_fn(input_fn(body, content_type), model)
+    return output_fn(prediction, accept or content_type)
+
+
+def encode_body(records, content_type):
+    """
+    Encode a batch of records as a request body.
+
+    Args:
+        records (pandas.DataFrame): The records of the batch.
+        content_type (str): The Content-Type of the request.
+
+    Returns:
+        bytes: The request body.
+    """
+    if content_type == "application/x-npy":
+        buffer = io.BytesIO()
+        np.save(buffer, records.to_numpy(dtype=np.float64))
+        return buffer.getvalue()
+    if content_type == "text/csv":
+        return records.to_csv(index=False, header=False).encode()
+    if content_type == "application/vnd.apache.arrow.stream":
+        table = pa.Table.from_pandas(records, preserve_index=False)
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes()
+    records = records.to_dict(orient="records")
+    if content_type == "application/jsonlines":
+        return "".join(json.dumps(record) + "\n" for record in records).encode()
+    if len(records) == 1:
+        return json.dumps({"Input": records[0]}).encode()
+    return json.dumps(records).encode()
+
+
+def save_model(model_dir, n_rows):
+    """
+    Train a model on synthetic trips and save it as model_dir/model.joblib.
+
+    Args:
+        model_dir (str): The model directory.
+        n_rows (int): The number of synthetic trips.
+    """
+    from bench_predict import train_trainer
+    from joblib import dump
+
+    trainer, _ = train_trainer(n_rows, model_dir)
+    trainer.save_pipeline()
+    dump(trainer.pipeline, f"{model_dir}/model.joblib")
+
+
+def main():
+    """Measure the throughput of the handler chain per batch size."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--model-dir", default=None)
+    parser.add_argument("--train-rows", type=int, default=100_000)
+    parser.add_argument("--rows", type=int, default=20_000)
+    parser.add_argument("--max-requests", type=int, default=200)
+    parser.add_argument(
+        "--batch-sizes", type=int, nargs="+", default=[1, 10, 100, 1000]
+    )
+    parser.add_argument("--formats", nargs="+", default=list(FORMATS), choices=FORMATS)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        model_dir = args.model_dir or workdir
+        if args.model_dir is None:
+            save_model(model_dir, args.train_rows)
+        model = model_fn(model_dir)
+
+    records = make_trips(args.rows, seed=1)[
+        ["PULocationID", "DOLocationID", "trip_distance"]
+    ]
+
+    print(
+        f"{'format':<12}{'batch size':>12}{'requests':>10}{'body bytes/row':>16}"
+        f"{'rows/s':>14}"
+    )
+    for name in args.formats:
+        content_type = FORMATS[name]
+        for batch_size in args.batch_sizes:
+            n_rows = min(len(records), batch_size * args.max_requests)
+            bodies = [
+                encode_body(records.iloc[i : i + batch_size], content_type)
+                for i in range(0, n_rows, batch_size)
+            ]
+            start = time.perf_counter()
+            for body in bodies:
+                invoke(model, body, content_type)
+            rate = n_rows / (time.perf_counter() - start)
+            size = sum(len(body) for body in bodies) / n_rows
+            print(
+                f"{name:<12}{batch_size:>12}{len(bodies):>10}{size:>16.1f}"
+                f"{rate:>14,.0f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
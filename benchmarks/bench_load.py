@@ -0,0 +1,339 @@
+"""
+Replay inference requests at a target rate against an endpoint or a local server.
+
+Each line of the --requests file is a request body, e.g. {"Input": {...}}, sent
+as is with Content-Type application/json; the lines are cycled through until
+--count requests were sent. Without a file, --synthetic single-record requests
+are made from synthetic trips (see synthetic).
+
+The load is open-loop: request i is due at start + i / --qps, whether or not the
+earlier ones were answered, and at most --concurrency requests are in flight. A
+request waiting for a free slot is late, and its latency is counted from the time
+it was due, so a saturated target shows up in the percentiles instead of being
+hidden by a slower sending rate. The service time, from the send to the answer,
+is reported apart.
+
+The target is either a SageMaker endpoint (--endpoint, through the pooled
+InferenceClient) or an HTTP server speaking POST /invocations, such as
+deployment/server.py (--url). Run it from the root of the repository:
+
+    python deployment/server.py --model-dir models --port 8080 &
+    python benchmarks/bench_load.py --url http://127.0.0.1:8080 --synthetic 1000 \
+        --qps 200 --count 5000 --concurrency 32 --output load.json
+
+Classes:
+        HttpTarget: Send requests to POST /invocations over keep-alive connections.
+        EndpointTarget: Send requests to a SageMaker endpoint.
+
+Functions:
+        run_load: Send requests at a target rate, with bounded concurrency.
+        summarize: Summarize the outcomes of a load run.
+
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import sys
+import time
+from urllib.parse import urlsplit
+
+import numpy as np
+
+sys.path.append("benchmarks")
+sys.path.append("deployment")
+from runtime_client import JSON_CONTENT_TYPE, InferenceClient  # noqa: E402
+
+PERCENTILES = (50, 90, 99)
+
+
+class TargetError(Exception):
+    """A request answered with an error, its kind being e.g. the HTTP status."""
+
+    def __init__(self, kind):
+        """Set the kind of the error."""
+        super().__init__(kind)
+        self.kind = kind
+
+
+class HttpTarget:
+    """
+    Send requests to POST /invocations over keep-alive connections.
+
+    Args:
+        url (str): The address of the server, e.g. http://127.0.0.1:8080.
+    """
+
+    def __init__(self, url):
+        """
+        Initialize the HttpTarget object.
+
+        Args:
+            url (str): The address of the server.
+        """
+        address = urlsplit(url)
+        self.host = address.hostname
+        self.port = address.port or 80
+        self.connections = []
+
+    async def send(self, body):
+        """
+        Send a request body, on an idle connection or a new one.
+
+        Args:
+            body (bytes): The request body.
+
+        Returns:
+            bytes: The response body.
+
+        Raises:
+            TargetError: If the response is not 200, its kind being the status.
+        """
+        if self.connections:
+            reader, writer = self.connections.pop()
+        else:
+            reader, writer = await asyncio.open_connection(self.host, self.port)
+        try:
+            writer.write(
+                (
+                    f"POST /invocations HTTP/1.1\r\nHost: {self.host}\r\n"
+                    f"Content-Type: {JSON_CONTENT_TYPE}\r\n"
+                    f"Content-Length: {len(body)}\r\n\r\n"
+                ).encode("latin-1")
+                + body
+            )
+            await writer.drain()
+            head = await reader.readuntil(b"\r\n\r\n")
+            status_line, *header_lines = head.decode("latin-1").split("\r\n")
+            headers = {}
+            for line in header_lines:
+                name, _, value = line.partition(":")
+                headers[name.strip().lower()] = value.strip()
+            payload = await reader.readexactly(int(headers.get("content-length", 0)))
+        except BaseException:
+            writer.close()
+            raise
+        if headers.get("connection", "").lower() == "close":
+            writer.close()
+        else:
+            self.connections.append((reader, writer))
+        status = status_line.split(" ")[1]
+        if status != "200":
+            raise TargetError(f"HTTP {status}")
+        return payload
+
+    async def close(self):
+        """Close the idle connections."""
+        while self.connections:
+            _, writer = self.connections.pop()
+            writer.close()
+
+
+class EndpointTarget:
+    """
+    Send requests to a SageMaker endpoint, through the pooled InferenceClient.
+
+    Args:
+        endpoint_name (str): The name of the endpoint.
+        concurrency (int): The requests in flight, which sizes the pools.
+        client (InferenceClient, optional): The client. Defaults to a new one.
+    """
+
+    def __init__(self, endpoint_name, concurrency, client=None):
+        """
+        Initialize the EndpointTarget object.
+
+        Args:
+            endpoint_name (str): The name of the endpoint.
+            concurrency (int): The requests in flight.
+            client (InferenceClient, optional): The client.
+        """
+        self.client = client or InferenceClient(
+            endpoint_name, max_pool_connections=concurrency
+        )
+
+    async def send(self, body):
+        """
+        Send a request body.
+
+        Args:
+            body (bytes): The request body.
+
+        Returns:
+            bytes: The response body.
+
+        Raises:
+            TargetError: If the endpoint answers with an error, its kind being the
+            error code.
+        """
+        try:
+            return await self.client.ainvoke_raw(body)
+        except Exception as e:
+            response = getattr(e, "response", None)
+            if isinstance(response, dict) and "Error" in response:
+                raise TargetError(response["Error"].get("Code", "ClientError")) from e
+            raise
+
+    async def close(self):
+        """Shut the thread pool of the client down."""
+        self.client.close()
+
+
+async def run_load(target, bodies, qps, count, concurrency, clock=time.perf_counter):
+    """
+    Send requests at a target rate, with bounded concurrency.
+
+    Args:
+        target (HttpTarget or EndpointTarget): Sends a body, see HttpTarget.send.
+        bodies (list): The request bodies, cycled through.
+        qps (float): The target rate, in requests per second.
+        count (int): The number of requests.
+        concurrency (int): The largest number of requests in flight.
+        clock (callable): Gets the time in seconds.
+
+    Returns:
+        list: An outcome dict per request, in the order they were due, with the
+        time it was due, sent and answered at, relative to the start, and the
+        kind of its error, None when it succeeded.
+    """
+    slots = asyncio.Semaphore(concurrency)
+    outcomes = []
+    tasks = []
+
+    async def send(outcome, body):
+        try:
+            await target.send(body)
+        except TargetError as e:
+            outcome["error"] = e.kind
+        except Exception as e:
+            outcome["error"] = type(e).__name__
+        finally:
+            outcome["done"] = clock() - start
+            slots.release()
+
+    start = clock()
+    for i, body in zip(range(count), itertools.cycle(bodies)):
+        due = i / qps
+        delay = due - (clock() - start)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        await slots.acquire()
+        outcome = {"due": due, "sent": clock() - start, "done": None, "error": None}
+        outcomes.append(outcome)
+        tasks.append(asyncio.create_task(send(outcome, body)))
+    await asyncio.gather(*tasks)
+    return outcomes
+
+
+def _percentiles(seconds):
+    """Get the percentiles and max of durations, in milliseconds."""
+    if len(seconds) == 0:
+        return {}
+    milliseconds = np.asarray(seconds) * 1e3
+    values = np.percentile(milliseconds, PERCENTILES)
+    summary = {f"p{p}": float(v) for p, v in zip(PERCENTILES, values, strict=True)}
+    summary["max"] = float(milliseconds.max())
+    return summary
+
+
+def summarize(outcomes, qps):
+    """
+    Summarize the outcomes of a load run.
+
+    Args:
+        outcomes (list): The outcomes returned by run_load.
+        qps (float): The target rate, in requests per second.
+
+    Returns:
+        dict: The counts of requests and errors per kind, the error rate, the
+        target and achieved rates, the latency percentiles of the successful
+        requests counted from the time they were due, and their service time
+        percentiles, counted from the time they were sent.
+    """
+    ok = [outcome for outcome in outcomes if outcome["error"] is None]
+    errors = {}
+    for outcome in outcomes:
+        if outcome["error"] is not None:
+            errors[outcome["error"]] = errors.get(outcome["error"], 0) + 1
+    wall = max((outcome["done"] for outcome in outcomes), default=0.0)
+    return {
+        "requests": len(outcomes),
+        "ok": len(ok),
+        "errors": errors,
+        "error_rate": (len(outcomes) - len(ok)) / len(outcomes) if outcomes else 0.0,
+        "target_qps": qps,
+        "achieved_qps": len(outcomes) / wall if wall else 0.0,
+        "wall_s": wall,
+        "latency_ms": _percentiles([o["done"] - o["due"] for o in ok]),
+        "service_ms": _percentiles([o["done"] - o["sent"] for o in ok]),
+    }
+
+
+def load_bodies(path=None, synthetic=1000):
+    """
+    Load the request bodies of a run.
+
+    Args:
+        path (str, optional): A file holding a request body per line.
+        synthetic (int): Without path, the number of synthetic requests made.
+
+    Returns:
+        list: The request bodies, as bytes.
+    """
+    if path is not None:
+        with open(path, "rb") as infile:
+            return [line.strip() for line in infile if line.strip()]
+    from synthetic import make_trips
+
+    records = make_trips(synthetic, seed=1)[
+        ["PULocationID", "DOLocationID", "trip_distance"]
+    ]
+    return [
+        json.dumps({"Input": record}).encode()
+        for record in records.to_dict(orient="records")
+    ]
+
+
+def main():
+    """Run the load, print its summary and save it as JSON."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--endpoint", default=None)
+    target.add_argument("--url", default=None)
+    parser.add_argument("--requests", default=None)
+    parser.add_argument("--synthetic", type=int, default=1000)
+    parser.add_argument("--qps", type=float, default=50.0)
+    parser.add_argument("--count", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    bodies = load_bodies(args.requests, args.synthetic)
+
+    async def run():
+        if args.url is not None:
+            target = HttpTarget(args.url)
+        else:
+            target = EndpointTarget(args.endpoint, args.concurrency)
+        try:
+            return await run_load(
+                target, bodies, args.qps, args.count, args.concurrency
+            )
+        finally:
+            await target.close()
+
+    summary = summarize(asyncio.run(run()), args.qps)
+    summary.update(
+        target=args.url or args.endpoint,
+        concurrency=args.concurrency,
+        created=time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+    )
+    print(json.dumps(summary, indent=2))
+    if args.output is not None:
+        with open(args.output, "w") as outfile:
+            json.dump(summary, outfile, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Report the accuracy, memory and latency of the lookup table per grid resolution.
+
+A random forest with the config/model.yaml shape (50 trees of depth 10) is
+trained on a synthetic month and evaluated on another one. For each number of
+distance buckets, the lookup table is built, then its RMSE (against the true
+durations and against the model), its memory footprint and its latency are
+compared with the model's. Run it from the root of the repository:
+
+    python benchmarks/bench_lookup.py --buckets 8 32 128 512
+"""
+
+import argparse
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.append("benchmarks")
+sys.path.append("src/data")
+from bench_predict import train_trainer  # noqa: E402
+from make_dataset import transform_trips  # noqa: E402
+from synthetic import make_trips  # noqa: E402
+
+
+def main():
+    """Build the lookup table at several resolutions and compare it with the model."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--train-rows", type=int, default=200_000)
+    parser.add_argument("--test-rows", type=int, default=100_000)
+    parser.add_argument("--buckets", type=int, nargs="+", default=[8, 32, 128, 512])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root_folder:
+        trainer, _ = train_trainer(args.train_rows, root_folder)
+        test = transform_trips(make_trips(args.test_rows, month=2, seed=1))
+        trainer.dict_test = test[["PULocationID", "DOLocationID", "trip_distance"]]
+        trainer.y_test = test["duration"].to_numpy()
+        pu_location = test["PULocationID"].to_numpy(np.float64)
+        do_location = test["DOLocationID"].to_numpy(np.float64)
+        distance = test["trip_distance"].to_numpy()
+
+        start = time.perf_counter()
+        trainer.predict_batch(trainer.dict_test)
+        model_batch = time.perf_counter() - start
+        start = time.perf_counter()
+        for _ in range(100):
+            trainer.predict_batch(trainer.dict_test[:1])
+        model_single = (time.perf_counter() - start) / 100
+        print(
+            f"model: rmse {trainer.evaluate():.4f}, single row "
+            f"{model_single * 1e3:.3f} ms, batch {len(test) / model_batch:,.0f} rows/s"
+        )
+
+        print(
+            f"{'buckets':>8}{'build s':>9}{'MB':>8}{'rmse':>9}{'vs model':>10}"
+            f"{'single ms':>11}{'rows/s':>14}"
+        )
+        for n_buckets in args.buckets:
+            start = time.perf_counter()
+            table = trainer.build_lookup_table(n_buckets=n_buckets)
+            build_seconds = time.perf_counter() - start
+            rmse, model_rmse = trainer.evaluate_lookup(table)
+
+            start = time.perf_counter()
+            table.predict(pu_location, do_location, distance)
+            batch_seconds = time.perf_counter() - start
+            start = time.perf_counter()
+            for _ in range(1000):
+                table.predict(pu_location[:1], do_location[:1], distance[:1])
+            single_seconds = (time.perf_counter() - start) / 1000
+            print(
+                f"{n_buckets:>8}{build_seconds:>9.1f}{table.nbytes / 2**20:>8.1f}"
+                f"{rmse:>9.4f}{model_rmse:>10.4f}{single_seconds * 1e3:>11.3f}"
+                f"{len(test) / batch_seconds:>14,.0f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Compare the peak memory, time and RMSE of in-memory and out-of-core training.
+
+Synthetic months are written as processed Arrow artifacts, then a random forest
+with the config/model.yaml shape (50 trees of depth 10) is trained on them with
+Trainer.train, from the concatenated artifacts, and with Trainer.train_out_of_core
+at several chunk sizes, each in its own process so that the peak RSS of one does
+not hide the other. The models are evaluated on another month. Run it from the
+root of the repository:
+
+    python benchmarks/bench_out_of_core.py --months 3 --rows 300000
+"""
+
+import argparse
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+
+sys.path.append("benchmarks")
+
+PARAMS = {"n_estimators": 50, "max_depth": 10}
+
+
+def _write_month(path, n_rows, month):
+    """Write the processed artifact of a synthetic month."""
+    sys.path.append("src/data")
+    import pyarrow as pa
+    from make_dataset import transform_trips
+    from pyarrow import feather
+    from synthetic import make_trips
+
+    trips = transform_trips(make_trips(n_rows, month=month, seed=month))
+    trips["PU_DO"] = trips["PULocationID"] + "_" + trips["DOLocationID"]
+    table = pa.Table.from_pandas(
+        trips[["PU_DO", "trip_distance", "duration"]], preserve_index=False
+    )
+    feather.write_feather(table, path, compression="uncompressed")
+
+
+def _train(train_paths, test_path, chunk_size, queue):
+    """Train in a fresh process and report its time, peak RSS and RMSE."""
+    sys.path.append("src/data")
+    sys.path.append("src/models")
+    import pyarrow as pa
+    from make_dataset import load_processed
+    from train_model import Trainer
+
+    baseline_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    test = load_processed(test_path)
+    trainer = Trainer(
+        dict_test=test.select(["PU_DO", "trip_distance"]),
+        y_test=test.column("duration").to_numpy(),
+        params=PARAMS,
+    )
+    start = time.perf_counter()
+    if chunk_size:
+        trainer.train_out_of_core(train_paths, chunk_size=chunk_size)
+    else:
+        train = pa.concat_tables([load_processed(path) for path in train_paths])
+        trainer.dict_train = train.select(["PU_DO", "trip_distance"])
+        trainer.y_train = train.column("duration").to_numpy()
+        trainer.train()
+    seconds = time.perf_counter() - start
+    queue.put(
+        {
+            "seconds": seconds,
+            "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+            "imports_rss_mb": baseline_kb / 1024,
+            "rmse": trainer.evaluate(),
+            "trees": len(trainer.pipeline.steps[-1][1].estimators_),
+        }
+    )
+
+
+def main():
+    """Write the synthetic months and train on them in memory and out of core."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--months", type=int, default=3)
+    parser.add_argument("--rows", type=int, default=300_000)
+    parser.add_argument(
+        "--chunk-sizes", type=int, nargs="+", default=[100_000, 250_000]
+    )
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as workdir:
+        paths = [
+            os.path.join(workdir, f"train_{month}.arrow")
+            for month in range(1, args.months + 2)
+        ]
+        for month, path in enumerate(paths, start=1):
+            # Write the months in child processes too: peak RSS is inherited
+            writer = context.Process(target=_write_month, args=(path, args.rows, month))
+            writer.start()
+            writer.join()
+        test_path = paths.pop()
+
+        print(
+            f"{'mode':<22}{'seconds':>9}{'peak RSS MB':>13}{'after imports':>15}"
+            f"{'rmse':>9}{'trees':>7}"
+        )
+        for chunk_size in [None, *args.chunk_sizes]:
+            queue = context.Queue()
+            process = context.Process(
+                target=_train, args=(paths, test_path, chunk_size, queue)
+            )
+            process.start()
+            result = queue.get()
+            process.join()
+            mode = f"out of core ({chunk_size:,})" if chunk_size else "in memory"
+            print(
+                f"{mode:<22}{result['seconds']:>9.1f}{result['peak_rss_mb']:>13.1f}"
+                f"{result['imports_rss_mb']:>15.1f}{result['rmse']:>9.4f}"
+                f"{result['trees']:>7}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Compare the per-row Trainer.predict loop with Trainer.predict_batch.
+
+A random forest with the config/model.yaml shape (50 trees of depth 10) is
+trained on a synthetic month, then scored row by row and in batches. Run it from
+the root of the repository:
+
+    python benchmarks/bench_predict.py --rows 200000
+"""
+
+import argparse
+import sys
+import tempfile
+import time
+
+sys.path.append("benchmarks")
+sys.path.append("src/data")
+sys.path.append("src/models")
+from make_dataset import transform_trips  # noqa: E402
+from synthetic import make_trips  # noqa: E402
+from train_model import Trainer  # noqa: E402
+
+
+def train_trainer(n_rows, root_folder, seed=0):
+    """
+    Train a Trainer on synthetic trips.
+
+    Args:
+        n_rows (int): The number of synthetic trips.
+        root_folder (str): The root folder of the Trainer.
+        seed (int): The random seed.
+
+    Returns:
+        tuple: The trained Trainer and the transformed trips.
+    """
+    trips = transform_trips(make_trips(n_rows, seed=seed))
+    trips["PU_DO"] = trips["PULocationID"] + "_" + trips["DOLocationID"]
+    trainer = Trainer(
+        trips[["PU_DO", "trip_distance"]],
+        trips["duration"].to_numpy(),
+        params={"n_estimators": 50, "max_depth": 10},
+        root_folder=root_folder,
+    )
+    trainer.train()
+    return trainer, trips
+
+
+def main():
+    """Train a model and measure the rows per second of both prediction paths."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--train-rows", type=int, default=200_000)
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--loop-rows", type=int, default=200)
+    parser.add_argument("--chunk-size", type=int, default=50_000)
+    parser.add_argument("--threads", type=int, default=4)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root_folder:
+        trainer, _ = train_trainer(args.train_rows, root_folder)
+    requests = make_trips(args.rows, seed=1)[
+        ["PULocationID", "DOLocationID", "trip_distance"]
+    ]
+
+    records = requests.head(args.loop_rows).to_dict(orient="records")
+    start = time.perf_counter()
+    for record in records:
+        trainer.predict(record)
+    loop_rate = len(records) / (time.perf_counter() - start)
+    print(f"{'per-row predict loop':<34}{loop_rate:>14,.0f} rows/s")
+
+    for n_threads in sorted({1, args.threads}):
+        start = time.perf_counter()
+        trainer.predict_batch(requests, chunk_size=args.chunk_size, n_threads=n_threads)
+        rate = len(requests) / (time.perf_counter() - start)
+        print(
+            f"{f'predict_batch ({n_threads} thread(s))':<34}{rate:>14,.0f} rows/s"
+            f"{rate / loop_rate:>10.0f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
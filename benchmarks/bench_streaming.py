@@ -0,0 +1,94 @@
+"""
+Compare the peak memory of the in-memory and streaming data preparation paths.
+
+A synthetic month is written to a local folder that stands in for BASE_URL, then
+each path runs in its own process so that the peak RSS of one does not
+hide the other. Run it from the root of the repository:
+
+    python benchmarks/bench_streaming.py --rows 2000000
+"""
+
+import argparse
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+
+sys.path.append("benchmarks")
+from synthetic import write_month  # noqa: E402
+
+
+def _run_mode(data_root, base_url, stream, queue):
+    """Run the data preparation in a fresh process and report its peak RSS."""
+    os.environ["DATA_ROOT_LOCAL_FOLDER"] = data_root
+    os.environ["BASE_URL"] = base_url
+    sys.path.append("src/data")
+    from make_dataset import Data
+
+    baseline_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    data = Data({"taxi_type": "green", "year": 2022, "month": 1}, mode="bench")
+    start = time.perf_counter()
+    if stream:
+        data.stream_data(upload_s3=False)
+    else:
+        data.download_data(upload_s3=False)
+        data.prepare_data(upload_s3=False)
+        data.prepare_dictionaries(upload_s3=False)
+    n_rows = len(data.get_target_values())
+    queue.put(
+        {
+            "seconds": time.perf_counter() - start,
+            "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+            "imports_rss_mb": baseline_kb / 1024,
+            "rows": n_rows,
+        }
+    )
+
+
+def main():
+    """Write a synthetic month and measure both data preparation paths."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--row-group-size", type=int, default=100_000)
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context("spawn")
+
+    with tempfile.TemporaryDirectory() as workdir:
+        base_url = os.path.join(workdir, "source") + os.sep
+        os.makedirs(base_url)
+        # Generate the month in a child process too: peak RSS is inherited across
+        # fork/exec, so the parent has to stay small.
+        writer = context.Process(
+            target=write_month,
+            args=(
+                os.path.join(base_url, "green_tripdata_2022-01.parquet"),
+                args.rows,
+            ),
+            kwargs={"row_group_size": args.row_group_size},
+        )
+        writer.start()
+        writer.join()
+        source_mb = os.path.getsize(os.path.join(base_url, os.listdir(base_url)[0]))
+        print(f"rows={args.rows} source={source_mb / 2**20:.1f} MB")
+        print(f"{'mode':<10}{'seconds':>10}{'peak RSS MB':>14}{'after imports':>15}")
+
+        for mode, stream in [("in-memory", False), ("streaming", True)]:
+            queue = context.Queue()
+            process = context.Process(
+                target=_run_mode,
+                args=(os.path.join(workdir, mode), base_url, stream, queue),
+            )
+            process.start()
+            result = queue.get()
+            process.join()
+            print(
+                f"{mode:<10}{result['seconds']:>10.2f}{result['peak_rss_mb']:>14.1f}"
+                f"{result['imports_rss_mb']:>15.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
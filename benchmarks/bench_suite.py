@@ -0,0 +1,259 @@
+"""
+Benchmark the data preparation, training and inference hot paths, offline.
+
+For each size, synthetic train and test months (see synthetic) are written as
+raw Parquet files to a local folder that stands in for BASE_URL, then the suite
+times, with the median of --repeat runs:
+
+- Data.prepare_data and Data.prepare_dictionaries on the train month,
+- Trainer.train on it (a random forest of the config/model.yaml shape),
+- Trainer.evaluate on the test month,
+- a single-row Trainer.predict,
+- the inference.py handler chain (model_fn once, then input_fn, predict_fn and
+  output_fn) on one JSON record and on the whole test month.
+
+The results are written as JSON with the commit and the machine they ran on.
+Given the results of an earlier run with --baseline, the suite exits with status
+1 when a case got slower than its baseline by more than --tolerance, so it can
+run as a regression check between commits. Run it from the root of the
+repository:
+
+    python benchmarks/bench_suite.py --sizes 10000 100000 --output after.json \
+        --baseline before.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.append("benchmarks")
+sys.path.append("deployment")
+sys.path.append("src/data")
+sys.path.append("src/models")
+from bench_inference import encode_body, invoke  # noqa: E402
+from synthetic import write_month  # noqa: E402
+
+PARAMS = {"n_estimators": 50, "max_depth": 10}
+SINGLE_ROWS = 200
+JSON = "application/json"
+
+
+def measure(func, repeat, setup=None):
+    """
+    Time a function, repeat times.
+
+    Args:
+        func (callable): The function timed.
+        repeat (int): The number of runs.
+        setup (callable, optional): Run before each run, untimed.
+
+    Returns:
+        dict: The median and min seconds of the runs.
+    """
+    seconds = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        func()
+        seconds.append(time.perf_counter() - start)
+    return {"median_s": statistics.median(seconds), "min_s": min(seconds)}
+
+
+def run_size(workdir, n_rows, repeat, params):
+    """
+    Run every case of the suite on synthetic months of n_rows trips.
+
+    Args:
+        workdir (str): The folder of the data, standing in for BASE_URL too.
+        n_rows (int): The number of trips of each month.
+        repeat (int): The number of runs of each case.
+        params (dict): The parameters of the Trainer.
+
+    Returns:
+        list: One {"case", "size", "rows", "median_s", "min_s"} dict per case,
+        "rows" being the number of rows it handles per run.
+    """
+    import make_dataset
+    from inference import model_fn
+    from joblib import dump
+    from train_model import Trainer
+
+    make_dataset.BASE_URL = workdir + os.sep
+    make_dataset.DATA_ROOT_LOCAL_FOLDER = os.path.join(workdir, str(n_rows))
+    for month in [1, 2]:
+        write_month(
+            os.path.join(workdir, f"green_tripdata_2022-{month:02d}.parquet"),
+            n_rows,
+            month=month,
+            seed=month,
+        )
+
+    results = []
+
+    def record(case, rows, timing):
+        results.append({"case": case, "size": n_rows, "rows": rows, **timing})
+        print(
+            f"{case:<30}{rows:>10,}{timing['median_s'] * 1e3:>12.2f}"
+            f"{rows / timing['median_s']:>14,.0f}"
+        )
+
+    train = make_dataset.Data(
+        {"taxi_type": "green", "year": 2022, "month": 1}, mode="bench"
+    )
+    record(
+        "Data.prepare_data",
+        n_rows,
+        measure(
+            lambda: train.prepare_data(upload_s3=False),
+            repeat,
+            setup=lambda: train.download_data(upload_s3=False),
+        ),
+    )
+    record(
+        "Data.prepare_dictionaries",
+        len(train.data_frame),
+        measure(lambda: train.prepare_dictionaries(upload_s3=False), repeat),
+    )
+
+    test = make_dataset.Data(
+        {"taxi_type": "green", "year": 2022, "month": 2}, mode="bench"
+    )
+    test.run(upload_s3=False)
+    model_dir = os.path.join(workdir, f"model_{n_rows}")
+    trainer = Trainer(
+        train.get_features(),
+        train.get_target_values(),
+        test.get_features(),
+        test.get_target_values(),
+        params=params,
+        root_folder=model_dir,
+    )
+    record("Trainer.train", len(trainer.y_train), measure(trainer.train, repeat))
+    record("Trainer.evaluate", len(trainer.y_test), measure(trainer.evaluate, repeat))
+
+    requests = test.data_frame[["PULocationID", "DOLocationID", "trip_distance"]]
+    requests = requests.astype({"PULocationID": int, "DOLocationID": int})
+    records = requests.head(SINGLE_ROWS).to_dict(orient="records")
+
+    def predict_rows():
+        for row in records:
+            trainer.predict(row)
+
+    timing = measure(predict_rows, repeat)
+    record("Trainer.predict (single row)", 1, _per_row(timing, len(records)))
+
+    trainer.save_pipeline()
+    dump(trainer.pipeline, os.path.join(model_dir, "model.joblib"))
+    model = model_fn(model_dir)
+    bodies = [encode_body(requests.iloc[i : i + 1], JSON) for i in range(len(records))]
+
+    def invoke_rows():
+        for body in bodies:
+            invoke(model, body, JSON)
+
+    timing = measure(invoke_rows, repeat)
+    record("inference chain (single row)", 1, _per_row(timing, len(bodies)))
+    body = encode_body(requests, JSON)
+    record(
+        "inference chain (batch)",
+        len(requests),
+        measure(lambda: invoke(model, body, JSON), repeat),
+    )
+    return results
+
+
+def _per_row(timing, n_rows):
+    """Turn the timing of a loop over n_rows rows into a timing per row."""
+    return {key: seconds / n_rows for key, seconds in timing.items()}
+
+
+def compare(results, baseline, tolerance):
+    """
+    Compare results with the ones of a baseline run.
+
+    Args:
+        results (list): The results of this run.
+        baseline (list): The results of the baseline run.
+        tolerance (float): The slowdown allowed, as a fraction of the baseline.
+
+    Returns:
+        list: A message per case slower than its baseline by more than tolerance.
+    """
+    before = {(result["case"], result["size"]): result for result in baseline}
+    regressions = []
+    for result in results:
+        previous = before.get((result["case"], result["size"]))
+        if previous is None:
+            continue
+        ratio = result["median_s"] / previous["median_s"]
+        if ratio > 1 + tolerance:
+            regressions.append(
+                f"{result['case']} (size {result['size']:,}): "
+                f"{previous['median_s'] * 1e3:.2f} -> "
+                f"{result['median_s'] * 1e3:.2f} ms ({ratio:.2f}x)"
+            )
+    return regressions
+
+
+def _commit():
+    """Get the commit of the working tree, or None outside of a git repository."""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    """Run the suite at every size, save its results and check for regressions."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--n-estimators", type=int, default=PARAMS["n_estimators"])
+    parser.add_argument("--max-depth", type=int, default=PARAMS["max_depth"])
+    parser.add_argument("--output", default="bench_suite.json")
+    parser.add_argument("--baseline", default=None)
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args()
+    params = {"n_estimators": args.n_estimators, "max_depth": args.max_depth}
+
+    results = []
+    print(f"{'case':<30}{'rows':>10}{'median ms':>12}{'rows/s':>14}")
+    with tempfile.TemporaryDirectory() as workdir:
+        for n_rows in args.sizes:
+            results += run_size(workdir, n_rows, args.repeat, params)
+
+    report = {
+        "commit": _commit(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "repeat": args.repeat,
+        "params": params,
+        "results": results,
+    }
+    with open(args.output, "w") as outfile:
+        json.dump(report, outfile, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.baseline is None:
+        return
+    with open(args.baseline) as infile:
+        baseline = json.load(infile)
+    regressions = compare(results, baseline["results"], args.tolerance)
+    for regression in regressions:
+        print(f"REGRESSION: {regression}")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Generate synthetic NYC-taxi-shaped trip data for offline benchmarks.
+
+The trips follow the schema of the green taxi monthly files: zone popularity is
+heavy-tailed (a few zones account for most pickups), dropoffs favour the pickup
+zone and its neighbours, distances are log-normal and durations are derived from
+the distance with a noisy speed, plus a small share of outliers that the
+duration filter removes.
+
+Functions:
+        make_trips: Generate a DataFrame of synthetic trips.
+        write_month: Write a month of synthetic trips to a Parquet file.
+
+"""
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+N_ZONES = 265
+
+
+def _zone_probabilities(rng):
+    """Return a heavy-tailed popularity distribution over the taxi zones."""
+    weights = 1.0 / np.arange(1, N_ZONES + 1) ** 1.1
+    return rng.permutation(weights / weights.sum())
+
+
+def make_trips(n_rows, year=2022, month=1, seed=0):
+    """
+    Generate a DataFrame of synthetic trips.
+
+    Args:
+        n_rows (int): The number of trips.
+        year (int): The year of the trips.
+        month (int): The month of the trips.
+        seed (int): The random seed.
+
+    Returns:
+        pandas.DataFrame: The trips, with the green taxi columns.
+    """
+    rng = np.random.default_rng(seed)
+    probabilities = _zone_probabilities(rng)
+
+    pickup_zone = rng.choice(np.arange(1, N_ZONES + 1), size=n_rows, p=probabilities)
+    # Half of the trips stay close to the pickup zone
+    local = rng.random(n_rows) < 0.5
+    dropoff_zone = np.where(
+        local,
+        np.clip(pickup_zone + rng.integers(-3, 4, n_rows), 1, N_ZONES),
+        rng.choice(np.arange(1, N_ZONES + 1), size=n_rows, p=probabilities),
+    )
+
+    trip_distance = np.round(rng.lognormal(mean=0.7, sigma=0.8, size=n_rows), 2)
+    speed_mph = np.clip(rng.normal(12, 4, n_rows), 3, 40)
+    duration_s = trip_distance / speed_mph * 3600 + rng.exponential(120, n_rows)
+    # Outliers: zero-length and multi-hour trips
+    outliers = rng.random(n_rows) < 0.02
+    duration_s[outliers] = rng.choice([0, 5, 4 * 3600, 20 * 3600], outliers.sum())
+
+    start = pd.Timestamp(year=year, month=month, day=1)
+    month_seconds = (start + pd.offsets.MonthBegin(1) - start).total_seconds()
+    pickup = start + pd.to_timedelta(rng.uniform(0, month_seconds, n_rows), unit="s")
+    dropoff = pickup + pd.to_timedelta(duration_s, unit="s")
+
+    fare_amount = np.round(2.5 + 2.5 * trip_distance + 0.5 * duration_s / 60, 2)
+    return pd.DataFrame(
+        {
+            "VendorID": rng.integers(1, 3, n_rows),
+            "lpep_pickup_datetime": pickup.astype("datetime64[us]"),
+            "lpep_dropoff_datetime": dropoff.astype("datetime64[us]"),
+            "store_and_fwd_flag": np.where(rng.random(n_rows) < 0.01, "Y", "N"),
+            "RatecodeID": np.ones(n_rows),
+            "PULocationID": pickup_zone.astype(np.int64),
+            "DOLocationID": dropoff_zone.astype(np.int64),
+            "passenger_count": rng.integers(1, 5, n_rows).astype(np.float64),
+            "trip_distance": trip_distance,
+            "fare_amount": fare_amount,
+            "tip_amount": np.round(fare_amount * rng.uniform(0, 0.25, n_rows), 2),
+            "total_amount": np.round(fare_amount * 1.2, 2),
+            "payment_type": rng.integers(1, 3, n_rows).astype(np.float64),
+        }
+    )
+
+
+def write_month(path, n_rows, year=2022, month=1, seed=0, row_group_size=100_000):
+    """
+    Write a month of synthetic trips to a Parquet file.
+
+    Args:
+        path (str): The location of the Parquet file.
+        n_rows (int): The number of trips.
+        year (int): The year of the trips.
+        month (int): The month of the trips.
+        seed (int): The random seed.
+        row_group_size (int): The number of rows per Parquet row group.
+
+    Returns:
+        str: The location of the Parquet file.
+    """
+    table = pa.Table.from_pandas(
+        make_trips(n_rows, year, month, seed), preserve_index=False
+    )
+    pq.write_table(table, path, row_group_size=row_group_size)
+    return path
@@ -1,16 +1,28 @@
-"""The Deployer class creates a serverless SageMaker endpoint."""
-import json
+"""
+The Deployer class creates a serverless SageMaker endpoint.
+
+neptune, sagemaker and boto3 are imported by the methods that use them, so
+importing the module stays cheap. Each phase of deploy is an instrumentation stage
+(see instrumentation), reported in deploy-report.md.
+"""
+import asyncio
 import logging
 import os
-import subprocess
+import sys
 import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from time import gmtime, strftime
 
-import boto3
-import neptune
-import sagemaker
 from dotenv import load_dotenv
 
+sys.path.append("src/utils")
+from endpoint_waiter import wait_for_endpoint  # noqa: E402
+from instrumentation import enable, stage, summary_table  # noqa: E402
+from model_archive import package_to_s3, write_archive  # noqa: E402
+from registry import ModelRegistry  # noqa: E402
+from runtime_client import InferenceClient  # noqa: E402
+
 load_dotenv()
 NEPTUNE_PROJECT = os.getenv("NEPTUNE_PROJECT")
 NPETUNE_API_TOKEN = os.getenv("NPETUNE_API_TOKEN")
@@ -18,6 +30,18 @@ MODEL_ID = os.getenv("MODEL_ID")
 AWS_SAGEMAKER_ROLE = os.getenv("AWS_SAGEMAKER_ROLE")
 AWS_REGION = os.getenv("AWS_REGION")
 S3_BUCKET = os.getenv("S3_BUCKET")
+# "model" serves the pipeline, "forest" its flattened forest and "lookup" its
+# precomputed lookup table (see inference.model_fn)
+PREDICTION_MODE = os.getenv("PREDICTION_MODE", "model")
+# The compression of the model artifacts archive: SageMaker serves gz archives
+ARTIFACT_COMPRESSION = os.getenv("ARTIFACT_COMPRESSION", "gz")
+ARTIFACT_COMPRESSION_LEVEL = int(os.getenv("ARTIFACT_COMPRESSION_LEVEL", "6"))
+# The wait for an endpoint to be in service (see wait_for_endpoint), in seconds
+ENDPOINT_WAIT_TIMEOUT = float(os.getenv("ENDPOINT_WAIT_TIMEOUT", "1800"))
+ENDPOINT_POLL_DELAY = float(os.getenv("ENDPOINT_POLL_DELAY", "2"))
+ENDPOINT_POLL_MAX_DELAY = float(os.getenv("ENDPOINT_POLL_MAX_DELAY", "30"))
+# The prediction modes deployed by the script, each to its own endpoint
+DEPLOY_VARIANTS = os.getenv("DEPLOY_VARIANTS", PREDICTION_MODE).split(",")
 
 
 class Deployer:
@@ -43,65 +67,86 @@ class Deployer:
         self.sagemaker_client = sagemaker_client
         self.model_artifacts_tar = model_artifacts_tar
         self.boto_session = boto_session
-
+        # The size and timings of the last upload of the model artifacts
+        self.artifact_report = None
+        # The inference client of each endpoint (see get_inference_client)
+        self.inference_clients = {}
+        # The timing of each phase of the last deployment
+        self.phases = []
+        self._origin = time.perf_counter()
+
+    @stage("Deployer.get_production_ready_model")
     def get_production_ready_model(self):
         """
         Retrieve the production-ready model from Neptune and downloads it.
 
+        Only the newest production version is downloaded, with its flattened
+        forest and lookup table when it has them, and verified and cached (see
+        ModelRegistry): redeploying the same version downloads nothing.
+
         Returns
             str: The ID of the downloaded model version.
         """
-        model = neptune.init_model(
-            project=NEPTUNE_PROJECT, api_token=NPETUNE_API_TOKEN, with_id=MODEL_ID
-        )
-
-        model_versions_df = model.fetch_model_versions_table().to_pandas()
-
-        production_models = model_versions_df[
-            model_versions_df["sys/stage"] == "production"
-        ]
-
-        for _, model_version in production_models.iterrows():
-            version_id = model_version["sys/id"]
-            model_version = neptune.init_model_version(
-                project=NEPTUNE_PROJECT, api_token=NPETUNE_API_TOKEN, with_id=version_id
-            )
-            model_version["model"].download("model.joblib")
+        registry = ModelRegistry(NEPTUNE_PROJECT, NPETUNE_API_TOKEN, MODEL_ID)
+        return registry.fetch_production_model()
 
-        model_version.stop()
-        model.stop()
-
-        return version_id
+    def get_artifact_files(self):
+        """
+        Get the files of the model artifacts archive.
 
+        Returns
+            list: The model and the inference code, with the flattened forest and
+            the lookup table and their code when the model version has them.
+        """
+        files = ["model.joblib", "inference.py", "pair_encoding.py"]
+        if os.path.exists("model.npz"):
+            files += ["model.npz", "flat_forest.py"]
+        if os.path.exists("lookup.npz"):
+            files += ["lookup.npz", "lookup_table.py"]
+        return files
+
+    @stage("Deployer.model_2_tar")
     def model_2_tar(self):
         """
         Convert the model and inference code into a tar file.
 
+        deploy streams the archive to S3 instead (see upload_model_artifact_to_s3):
+        this writes it to model_artifacts_tar, to inspect it locally.
+
         Returns
             None
         """
-        # Build tar file with model data + inference code
-        bashCommand = f"tar -cvpzf {self.model_artifacts_tar} model.joblib inference.py"
-        process = subprocess.Popen(bashCommand.split(), stdout=subprocess.PIPE)
-        output, error = process.communicate()
+        with open(self.model_artifacts_tar, "wb") as outfile:
+            write_archive(
+                self.get_artifact_files(),
+                outfile,
+                ARTIFACT_COMPRESSION,
+                ARTIFACT_COMPRESSION_LEVEL,
+            )
 
+    @stage("Deployer.upload_model_artifact_to_s3")
     def upload_model_artifact_to_s3(self):
         """
-        Upload the model artifact to an S3 bucket.
+        Package the model artifacts and upload them to an S3 bucket.
+
+        The archive is written in-process and streamed to S3 in parts while it is
+        being compressed, without an intermediate file (see package_to_s3). Its
+        size and timings are kept in artifact_report.
 
         Returns
             str: The S3 path of the uploaded model artifacts.
         """
-        s3 = self.boto_session.resource("s3")
-
-        model_artifacts = f"s3://{S3_BUCKET}/{self.model_artifacts_tar}"
-
-        response = s3.meta.client.upload_file(
-            self.model_artifacts_tar, S3_BUCKET, self.model_artifacts_tar
+        self.artifact_report = package_to_s3(
+            self.get_artifact_files(),
+            self.boto_session.client("s3"),
+            S3_BUCKET,
+            self.model_artifacts_tar,
+            ARTIFACT_COMPRESSION,
+            ARTIFACT_COMPRESSION_LEVEL,
         )
-        logging.info(response)
-        return model_artifacts
+        return f"s3://{S3_BUCKET}/{self.model_artifacts_tar}"
 
+    @stage("Deployer.get_sklearn_image")
     def get_sklearn_image(self):
         """
         Retrieve the image URI for the sklearn framework.
@@ -109,6 +154,8 @@ class Deployer:
         Returns
             str: The image URI for the sklearn framework.
         """
+        import sagemaker
+
         image_uri = sagemaker.image_uris.retrieve(
             framework="sklearn",
             region=AWS_REGION,
@@ -118,20 +165,24 @@ class Deployer:
         )
         return image_uri
 
-    def create_model(self, model_artifacts, image_uri):
+    @stage("Deployer.create_model")
+    def create_model(self, model_artifacts, image_uri, variant=PREDICTION_MODE):
         """
         Create a SageMaker model using the provided model artifacts and image URI.
 
         Args:
             model_artifacts (str): The S3 location of the model artifacts.
             image_uri (str): The URI of the Docker image containing the model.
+            variant (str): The prediction mode of the model (see PREDICTION_MODE).
 
         Returns:
             str: The name of the created model.
         """
         client = self.sagemaker_client
 
-        model_name = "NYCTAX-RFDV-38" + strftime("%Y-%m-%d-%H-%M-%S", gmtime())
+        model_name = (
+            "NYCTAX-RFDV-38" + strftime("%Y-%m-%d-%H-%M-%S", gmtime()) + f"-{variant}"
+        )
         create_model_response = client.create_model(
             ModelName=model_name,
             Containers=[
@@ -142,6 +193,7 @@ class Deployer:
                     "Environment": {
                         "SAGEMAKER_SUBMIT_DIRECTORY": model_artifacts,
                         "SAGEMAKER_PROGRAM": "inference.py",
+                        "PREDICTION_MODE": variant,
                     },
                 }
             ],
@@ -151,19 +203,25 @@ class Deployer:
 
         return model_name
 
-    def create_endpoint_config(self, model_name):
+    @stage("Deployer.create_endpoint_config")
+    def create_endpoint_config(self, model_name, variant=PREDICTION_MODE):
         """
         Create an endpoint configuration for deploying a model.
 
         Args:
             model_name (str): The name of the model to be deployed.
+            variant (str): The prediction mode of the model.
 
         Returns:
             str: The name of the created endpoint configuration.
         """
         client = self.sagemaker_client
 
-        epc_name = "NYCTAX-RFDV-38-epc" + strftime("%Y-%m-%d-%H-%M-%S", gmtime())
+        epc_name = (
+            "NYCTAX-RFDV-38-epc"
+            + strftime("%Y-%m-%d-%H-%M-%S", gmtime())
+            + f"-{variant}"
+        )
 
         client.create_endpoint_config(
             EndpointConfigName=epc_name,
@@ -179,19 +237,25 @@ class Deployer:
         )
         return epc_name
 
-    def create_endpoint(self, epc_name):
+    @stage("Deployer.create_endpoint")
+    def create_endpoint(self, epc_name, variant=PREDICTION_MODE):
         """
         Create an endpoint for the NY Taxi Web Service.
 
         Args:
             epc_name (str): The name of the endpoint configuration.
+            variant (str): The prediction mode of the model.
 
         Returns:
             str: The name of the created endpoint.
         """
         client = self.sagemaker_client
 
-        endpoint_name = "NYCTAX-RFDV-38-ep" + strftime("%Y-%m-%d-%H-%M-%S", gmtime())
+        endpoint_name = (
+            "NYCTAX-RFDV-38-ep"
+            + strftime("%Y-%m-%d-%H-%M-%S", gmtime())
+            + f"-{variant}"
+        )
 
         create_endpoint_response = client.create_endpoint(
             EndpointName=endpoint_name,
@@ -208,43 +272,156 @@ class Deployer:
         - endpoint_name (str): The name of the deployed endpoint.
         - model_version (str): The version of the deployed model.
         """
-        # Get latest prod-ready model from neptune.ai
-        model_version = self.get_production_ready_model()
+        endpoints, model_version = self.deploy_variants([PREDICTION_MODE])
+        return endpoints[PREDICTION_MODE], model_version
 
-        # Convert model file and inference.py to .tar
-        self.model_2_tar()
+    @stage("Deployer.deploy_variants")
+    def deploy_variants(self, variants):
+        """
+        Deploy the model to one SageMaker endpoint per variant, concurrently.
 
-        # Upload .tar file to S3
-        model_artifacts = self.upload_model_artifact_to_s3()
-        logging.info(f"model artifacts: {model_artifacts}")
+        The model version is downloaded and its artifacts uploaded once, then the
+        model, endpoint configuration and endpoint of every variant are created and
+        waited for concurrently (see wait_for_endpoint). The timing of each phase
+        is kept in phases (see phase_report). Not to be called from a running
+        event loop.
 
-        # Get appropriate sk-learn image
-        image_uri = self.get_sklearn_image()
+        Args:
+            variants (list): The prediction modes to deploy (see PREDICTION_MODE).
 
-        # Create model
-        model_name = self.create_model(model_artifacts, image_uri)
-        logging.info(f"model_name: {model_name}")
+        Returns:
+            dict: The name of the endpoint of each variant.
+            str: The version of the deployed model.
 
-        # Create endpoint configuration
-        epc_name = self.create_endpoint_config(model_name)
-        logging.info(f"epc_name: {epc_name}")
+        Raises:
+            RuntimeError: If an endpoint fails, once every variant is settled.
+            TimeoutError: If an endpoint is not in service in time.
+        """
+        self.phases = []
+        self._origin = time.perf_counter()
 
-        # Create endpoint
-        endpoint_name = self.create_endpoint(epc_name)
-        logging.info(f"endpoint_name: {endpoint_name}")
+        # Get latest prod-ready model from neptune.ai
+        with self._phase("all", "get_production_ready_model"):
+            model_version = self.get_production_ready_model()
+
+        # Package the model file and inference.py and stream them to S3, while the
+        # appropriate sk-learn image is retrieved
+        def upload():
+            with self._phase("all", "upload_model_artifact_to_s3"):
+                return self.upload_model_artifact_to_s3()
+
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            uploaded = pool.submit(upload)
+            with self._phase("all", "get_sklearn_image"):
+                image_uri = self.get_sklearn_image()
+            model_artifacts = uploaded.result()
+        logging.info(f"model artifacts: {model_artifacts}")
 
-        describe_endpoint_response = self.sagemaker_client.describe_endpoint(
-            EndpointName=endpoint_name
+        endpoints = asyncio.run(
+            self._deploy_all(model_artifacts, image_uri, list(variants))
         )
-        while describe_endpoint_response["EndpointStatus"] == "Creating":
-            describe_endpoint_response = self.sagemaker_client.describe_endpoint(
-                EndpointName=endpoint_name
+        return endpoints, model_version
+
+    async def _deploy_all(self, model_artifacts, image_uri, variants):
+        """Deploy every variant concurrently, then raise the first failure."""
+        results = await asyncio.gather(
+            *(
+                self._deploy_variant(model_artifacts, image_uri, variant)
+                for variant in variants
+            ),
+            return_exceptions=True,
+        )
+        failures = [
+            (variant, result)
+            for variant, result in zip(variants, results, strict=True)
+            if isinstance(result, BaseException)
+        ]
+        for variant, error in failures:
+            logging.error(f"Variant {variant} failed: {error}")
+        if failures:
+            raise failures[0][1]
+        return dict(zip(variants, results, strict=True))
+
+    async def _deploy_variant(self, model_artifacts, image_uri, variant):
+        """Create the model, endpoint configuration and endpoint of a variant."""
+        with self._phase(variant, "create_model"):
+            model_name = await asyncio.to_thread(
+                self.create_model, model_artifacts, image_uri, variant
+            )
+        logging.info(f"model_name: {model_name}")
+        with self._phase(variant, "create_endpoint_config"):
+            epc_name = await asyncio.to_thread(
+                self.create_endpoint_config, model_name, variant
+            )
+        logging.info(f"epc_name: {epc_name}")
+        with self._phase(variant, "create_endpoint"):
+            endpoint_name = await asyncio.to_thread(
+                self.create_endpoint, epc_name, variant
+            )
+        logging.info(f"endpoint_name: {endpoint_name}")
+        with self._phase(variant, "wait_for_endpoint"):
+            await wait_for_endpoint(
+                self.sagemaker_client,
+                endpoint_name,
+                timeout=ENDPOINT_WAIT_TIMEOUT,
+                initial_delay=ENDPOINT_POLL_DELAY,
+                max_delay=ENDPOINT_POLL_MAX_DELAY,
             )
-            logging.info(describe_endpoint_response["EndpointStatus"])
-            time.sleep(30)
         logging.info(f"Model endpoint: {endpoint_name}")
+        return endpoint_name
+
+    @contextmanager
+    def _phase(self, variant, phase):
+        """Record the timing of a phase of a variant."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            self.phases.append(
+                {
+                    "variant": variant,
+                    "phase": phase,
+                    "start": start - self._origin,
+                    "end": end - self._origin,
+                    "seconds": end - start,
+                }
+            )
+
+    def phase_report(self):
+        """
+        Format the timing of the phases of the last deployment as a Markdown table.
+
+        Returns
+            str: One row per phase, in start order, then the wall time.
+        """
+        phases = sorted(self.phases, key=lambda phase: phase["start"])
+        lines = [
+            "| Variant | Phase | Start (s) | End (s) | Duration (s) |",
+            "|---|---|---|---|---|",
+        ]
+        lines += [
+            f"| {p['variant']} | {p['phase']} | {p['start']:.2f} | {p['end']:.2f} "
+            f"| {p['seconds']:.2f} |"
+            for p in phases
+        ]
+        wall = max((phase["end"] for phase in phases), default=0.0)
+        lines.append(f"\nWall time: {wall:.2f} s")
+        return "\n".join(lines)
+
+    def get_inference_client(self, endpoint_name):
+        """
+        Get the inference client of an endpoint, created on first use.
+
+        Args:
+            endpoint_name (str): The name of the SageMaker endpoint.
 
-        return endpoint_name, model_version
+        Returns:
+            InferenceClient: The client, reused by every call to the endpoint.
+        """
+        if endpoint_name not in self.inference_clients:
+            self.inference_clients[endpoint_name] = InferenceClient(endpoint_name)
+        return self.inference_clients[endpoint_name]
 
     def infer(self, endpoint_name, test_sample):
         """
@@ -258,39 +435,45 @@ class Deployer:
             dict: The result of the inference.
 
         """
-        runtime_client = boto3.client("sagemaker-runtime", region_name=AWS_REGION)
-
-        content_type = "application/json"
-        request_body = {"Input": test_sample}
-
-        data = json.loads(json.dumps(request_body))
-        payload = json.dumps(data)
+        return self.get_inference_client(endpoint_name).invoke(test_sample)
 
-        response = runtime_client.invoke_endpoint(
-            EndpointName=endpoint_name, ContentType=content_type, Body=payload
-        )
-        result = json.loads(response["Body"].read().decode())["Output"]
 
-        return result
+if __name__ == "__main__":
+    import boto3
 
+    enable(os.getenv("INSTRUMENTATION_PATH", "instrumentation.jsonl"))
 
-if __name__ == "__main__":
     sagemaker_client = boto3.client(service_name="sagemaker", region_name=AWS_REGION)
     model_artifacts_tar = "model.tar.gz"
     boto_session = boto3.session.Session()
 
     deployer = Deployer(sagemaker_client, model_artifacts_tar, boto_session)
 
-    endpoint_name, model_version = deployer.deploy()
+    endpoints, model_version = deployer.deploy_variants(DEPLOY_VARIANTS)
 
     test_sample = {"PULocationID": 9, "DOLocationID": 70, "trip_distance": 20}
-    result = deployer.infer(endpoint_name, test_sample)
-
+    results = {
+        variant: deployer.infer(endpoint_name, test_sample)
+        for variant, endpoint_name in endpoints.items()
+    }
+
+    artifacts = deployer.artifact_report
+    endpoint_lines = "".join(
+        f"\nEndpoint: {endpoint_name} ({variant}) deployed correctly."
+        f"\nRMSE:\n{results[variant]}\n"
+        for variant, endpoint_name in endpoints.items()
+    )
     report = f"""Deployment Job Report:
-                    \nEndpoint: {endpoint_name} deployed correctly.
+                    \n{endpoint_lines}
                     \nModel version deployed from Neptune.AI is: {model_version}.
-                    \nEndpoint was tested with {test_sample}.
-                    \n\nRMSE:\n{result}\n"""
+                    \nEndpoints were tested with {test_sample}.
+                    \nModel artifacts: {artifacts["bytes"] / 2**20:.1f} MB
+                    ({artifacts["raw_bytes"] / 2**20:.1f} MB uncompressed,
+                    {ARTIFACT_COMPRESSION or "uncompressed"}), packed and uploaded
+                    in {artifacts["seconds"]:.1f} s, {artifacts["parts"]} parts,
+                    {artifacts["upload_wait_s"]:.1f} s waiting for the upload.
+                    \nPhases:\n{deployer.phase_report()}\n
+                    \nInstrumentation:\n{summary_table()}\n"""
 
     # Write metrics to file
     with open("deploy-report.md", "w") as outfile:
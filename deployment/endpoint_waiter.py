@@ -0,0 +1,100 @@
+"""
+Wait for SageMaker endpoints to be in service, without blocking the event loop.
+
+wait_for_endpoint polls describe_endpoint on a thread with an adaptive backoff:
+the first polls come quickly, the delay then grows geometrically up to a cap,
+and starts again from the first delay whenever the status changes. It returns as
+soon as the endpoint is in service, raises as soon as it reaches a terminal
+failure status, and gives up after an overall timeout. Several endpoints can be
+waited for concurrently, e.g. with asyncio.gather.
+
+Functions:
+        backoff_delays: Generate the delays between two polls.
+        wait_for_endpoint: Wait for an endpoint to be in service.
+
+"""
+
+import asyncio
+import logging
+import random
+import time
+
+IN_SERVICE = "InService"
+# The statuses an endpoint being created does not leave by itself
+TERMINAL_FAILURES = {"Failed", "OutOfService", "UpdateRollbackFailed", "Deleting"}
+
+
+def backoff_delays(initial_delay=2.0, max_delay=30.0, factor=1.5, jitter=0.1):
+    """
+    Generate the delays between two polls.
+
+    Args:
+        initial_delay (float): The first delay, in seconds.
+        max_delay (float): The longest delay, in seconds.
+        factor (float): The growth of the delay from one poll to the next.
+        jitter (float): The random spread of each delay, as a fraction of it, so
+        concurrent waiters do not poll in lockstep.
+
+    Yields:
+        float: The delay before the next poll, in seconds.
+    """
+    delay = initial_delay
+    while True:
+        yield delay * random.uniform(1 - jitter, 1 + jitter)
+        delay = min(delay * factor, max_delay)
+
+
+async def wait_for_endpoint(
+    client,
+    endpoint_name,
+    timeout=1800.0,
+    initial_delay=2.0,
+    max_delay=30.0,
+    factor=1.5,
+    jitter=0.1,
+    sleep=asyncio.sleep,
+    clock=time.monotonic,
+):
+    """
+    Wait for an endpoint to be in service.
+
+    Args:
+        client (SageMaker.Client): The SageMaker client.
+        endpoint_name (str): The name of the endpoint.
+        timeout (float): The longest wait, in seconds.
+        initial_delay (float): The first delay between two polls, in seconds.
+        max_delay (float): The longest delay between two polls, in seconds.
+        factor (float): The growth of the delay from one poll to the next.
+        jitter (float): The random spread of each delay (see backoff_delays).
+        sleep (coroutine function): Waits for a number of seconds.
+        clock (callable): Gets the time in seconds, for the timeout.
+
+    Returns:
+        dict: The last describe_endpoint response.
+
+    Raises:
+        RuntimeError: If the endpoint reaches a terminal failure status.
+        TimeoutError: If the endpoint is not in service after timeout seconds.
+    """
+    deadline = clock() + timeout
+    previous_status = None
+    while True:
+        response = await asyncio.to_thread(
+            client.describe_endpoint, EndpointName=endpoint_name
+        )
+        status = response["EndpointStatus"]
+        if status == IN_SERVICE:
+            return response
+        if status in TERMINAL_FAILURES:
+            reason = response.get("FailureReason", "no reason given")
+            raise RuntimeError(f"Endpoint {endpoint_name} is {status}: {reason}")
+        if status != previous_status:
+            logging.info(f"Endpoint {endpoint_name} is {status}")
+            delays = backoff_delays(initial_delay, max_delay, factor, jitter)
+            previous_status = status
+        remaining = deadline - clock()
+        if remaining <= 0:
+            raise TimeoutError(
+                f"Endpoint {endpoint_name} is still {status} after {timeout:.0f} s"
+            )
+        await sleep(min(next(delays), remaining))
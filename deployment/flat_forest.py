@@ -0,0 +1,330 @@
+"""
+FlatForest: a NumPy-only predictor for the trained random forest.
+
+The trees of the fitted RandomForestRegressor are flattened into contiguous node
+arrays (feature, threshold, children, leaf value), and the PU_DO
+vocabulary of the DictVectorizer step into a sorted key array with the column of
+each key. Predicting walks every tree at once, vectorized over a batch of rows,
+without scikit-learn's per-call validation and dispatch. The predictor only
+imports NumPy, so it can be served without scikit-learn.
+
+A row of the training pipeline's feature space holds a single PU_DO indicator
+and trip_distance, so the value of a split feature is computed from the row's
+PU_DO column and distance instead of building the sparse matrix.
+
+The forest is saved as an uncompressed .npz file, whose arrays can be
+memory-mapped in place at load time (see load_npz), so loading a forest at cold
+start neither unpickles nor copies its nodes.
+
+Location IDs are looked up as integer pairs, with the pair encoding shared with
+the training encoder (see pair_encoding.py), instead of building the PU_DO
+strings.
+
+Functions:
+        load_npz: Load the arrays of an uncompressed .npz file, memory-mapped.
+
+Classes:
+        FlatForest: The flattened forest and vocabulary.
+
+"""
+
+import zipfile
+
+import numpy as np
+from pair_encoding import pair_columns, pair_index
+
+CATEGORICAL = "PU_DO"
+NUMERICAL = "trip_distance"
+ARRAYS = ["feature", "threshold", "children", "value", "roots", "keys", "columns"]
+# The size of the fixed part of a zip local file header
+ZIP_HEADER_SIZE = 30
+
+
+def load_npz(path, mmap_mode=None):
+    """
+    Load the arrays of an uncompressed .npz file, memory-mapped.
+
+    np.load ignores mmap_mode for .npz files, but the members of a file written by
+    np.savez are stored as is, so each .npy member can be mapped at its offset.
+
+    Args:
+        path (str): The path of the .npz file.
+        mmap_mode (str): The memmap mode, such as "r", or None to read the arrays.
+
+    Returns:
+        dict: The arrays, by name.
+    """
+    if mmap_mode is None:
+        with np.load(path, allow_pickle=False) as arrays:
+            return {name: arrays[name] for name in arrays.files}
+
+    arrays = {}
+    with open(path, "rb") as file, zipfile.ZipFile(file) as archive:
+        for member in archive.infolist():
+            if member.compress_type != zipfile.ZIP_STORED:
+                raise ValueError(f"{member.filename} is compressed")
+            # The local header repeats the name and has its own extra field
+            file.seek(member.header_offset + 26)
+            name_length, extra_length = np.frombuffer(file.read(4), dtype="<u2")
+            file.seek(
+                member.header_offset + ZIP_HEADER_SIZE + name_length + extra_length
+            )
+            version = np.lib.format.read_magic(file)
+            if version == (1, 0):
+                header = np.lib.format.read_array_header_1_0(file)
+            else:
+                header = np.lib.format.read_array_header_2_0(file)
+            shape, fortran_order, dtype = header
+            name = member.filename.removesuffix(".npy")
+            if dtype.hasobject:
+                raise ValueError(f"{name} holds Python objects")
+            arrays[name] = np.memmap(
+                path,
+                dtype=dtype,
+                mode=mmap_mode,
+                offset=file.tell(),
+                shape=shape,
+                order="F" if fortran_order else "C",
+            )
+    return arrays
+
+
+class FlatForest:
+    """
+    Define the FlatForest class.
+
+    Args:
+        feature (numpy.ndarray): The split feature of each node.
+        threshold (numpy.ndarray): The split threshold of each node.
+        children (numpy.ndarray): The left (2 * node) and right (2 * node + 1)
+        children of each node, the node itself for leaves.
+        value (numpy.ndarray): The value of each node.
+        roots (numpy.ndarray): The root node of each tree.
+        keys (numpy.ndarray): The sorted PU_DO values of the vocabulary.
+        columns (numpy.ndarray): The feature column of each key.
+        distance_column (int): The feature column of trip_distance.
+        max_depth (int): The depth of the deepest tree.
+    """
+
+    def __init__(
+        self,
+        feature,
+        threshold,
+        children,
+        value,
+        roots,
+        keys,
+        columns,
+        distance_column,
+        max_depth,
+    ):
+        """
+        Initialize the FlatForest object.
+
+        Args:
+            feature (numpy.ndarray): The split feature of each node.
+            threshold (numpy.ndarray): The split threshold of each node.
+            children (numpy.ndarray): The left and right children of each node.
+            value (numpy.ndarray): The value of each node.
+            roots (numpy.ndarray): The root node of each tree.
+            keys (numpy.ndarray): The sorted PU_DO values of the vocabulary.
+            columns (numpy.ndarray): The feature column of each key.
+            distance_column (int): The feature column of trip_distance.
+            max_depth (int): The depth of the deepest tree.
+        """
+        self.feature = feature
+        self.threshold = threshold
+        self.children = children
+        self.value = value
+        self.roots = roots
+        self.keys = keys
+        self.columns = columns
+        self.distance_column = int(distance_column)
+        self.max_depth = int(max_depth)
+        # The columns of the keys by location ID pair, built once at load time
+        self.pair_index = pair_index(keys, columns)
+
+    @classmethod
+    def from_pipeline(cls, pipeline):
+        """
+        Flatten a fitted (vectorizer, random forest) pipeline.
+
+        The vectorizer may be a DictVectorizer or a PUDOEncoder fitted on PU_DO and
+        trip_distance.
+
+        Args:
+            pipeline (sklearn.pipeline.Pipeline): The fitted pipeline.
+
+        Returns:
+            FlatForest: The flattened forest.
+
+        Raises:
+            ValueError: If the pipeline is not a vectorizer followed by a forest.
+        """
+        if len(pipeline.steps) != 2 or not hasattr(pipeline.steps[1][1], "estimators_"):
+            raise ValueError("Expected a vectorizer followed by a fitted forest")
+        vectorizer, forest = pipeline.steps[0][1], pipeline.steps[1][1]
+        prefix = CATEGORICAL + getattr(vectorizer, "separator", "=")
+        if NUMERICAL not in vectorizer.vocabulary_:
+            raise ValueError("The vectorizer was not fitted on PU_DO/trip_distance")
+
+        vocabulary = sorted(
+            (name[len(prefix) :], column)
+            for name, column in vectorizer.vocabulary_.items()
+            if name.startswith(prefix)
+        )
+        keys = np.asarray([key for key, _ in vocabulary], dtype=str)
+        columns = np.asarray([column for _, column in vocabulary], dtype=np.int32)
+        distance_column = vectorizer.vocabulary_[NUMERICAL]
+
+        arrays = {name: [] for name in ["feature", "threshold", "left", "right"]}
+        values, roots = [], []
+        offset = 0
+        for estimator in forest.estimators_:
+            tree = estimator.tree_
+            nodes = np.arange(tree.node_count, dtype=np.int32) + offset
+            leaf = tree.children_left < 0
+            # Leaves point to themselves, so every row can take max_depth steps
+            arrays["left"].append(np.where(leaf, nodes, tree.children_left + offset))
+            arrays["right"].append(np.where(leaf, nodes, tree.children_right + offset))
+            arrays["feature"].append(np.where(leaf, distance_column, tree.feature))
+            arrays["threshold"].append(np.where(leaf, np.inf, tree.threshold))
+            values.append(tree.value[:, 0, 0])
+            roots.append(offset)
+            offset += tree.node_count
+
+        children = np.stack(
+            [np.concatenate(arrays["left"]), np.concatenate(arrays["right"])], axis=1
+        )
+        return cls(
+            feature=np.concatenate(arrays["feature"]).astype(np.int32),
+            threshold=np.concatenate(arrays["threshold"]).astype(np.float64),
+            children=children.ravel().astype(np.int32),
+            value=np.concatenate(values).astype(np.float64),
+            roots=np.asarray(roots, dtype=np.int32),
+            keys=keys,
+            columns=columns,
+            distance_column=distance_column,
+            max_depth=max(
+                estimator.tree_.max_depth for estimator in forest.estimators_
+            ),
+        )
+
+    def save(self, path):
+        """
+        Save the forest as an uncompressed .npz file.
+
+        Args:
+            path (str): The path of the .npz file.
+        """
+        np.savez(
+            path,
+            **{name: getattr(self, name) for name in ARRAYS},
+            meta=np.asarray([self.distance_column, self.max_depth], dtype=np.int64),
+        )
+
+    @classmethod
+    def load(cls, path, mmap_mode=None):
+        """
+        Load a forest saved by save.
+
+        Args:
+            path (str): The path of the .npz file.
+            mmap_mode (str): Memory-map the arrays with this mode (such as "r")
+            instead of reading them. Defaults to None.
+
+        Returns:
+            FlatForest: The forest.
+        """
+        arrays = load_npz(path, mmap_mode)
+        distance_column, max_depth = arrays.pop("meta")
+        return cls(
+            **arrays,
+            distance_column=distance_column,
+            max_depth=max_depth,
+        )
+
+    @property
+    def nbytes(self):
+        """
+        Get the memory footprint of the arrays.
+
+        Returns
+            int: The number of bytes of the node and vocabulary arrays.
+        """
+        return sum(getattr(self, name).nbytes for name in ARRAYS)
+
+    def encode(self, pu_do):
+        """
+        Map PU_DO values to their feature column.
+
+        Args:
+            pu_do (array-like): The PU_DO value of each row.
+
+        Returns:
+            numpy.ndarray: The column of each value, -1 for values not in the
+            vocabulary.
+        """
+        pu_do = np.asarray(pu_do, dtype=str)
+        if len(self.keys) == 0:
+            return np.full(len(pu_do), -1, dtype=np.int64)
+        positions = np.minimum(np.searchsorted(self.keys, pu_do), len(self.keys) - 1)
+        return np.where(self.keys[positions] == pu_do, self.columns[positions], -1)
+
+    def predict(self, pu_do, trip_distance, chunk_size=10_000):
+        """
+        Predict the duration of trips.
+
+        Args:
+            pu_do (array-like): The PU_DO value of each row.
+            trip_distance (array-like): The trip_distance of each row.
+            chunk_size (int): The number of rows walked at once, which bounds the
+            (rows, trees) working arrays.
+
+        Returns:
+            numpy.ndarray: The predictions.
+        """
+        return self._predict_columns(
+            self.encode(np.atleast_1d(pu_do)), trip_distance, chunk_size
+        )
+
+    def predict_locations(self, pu_location, do_location, trip_distance):
+        """
+        Predict the duration of trips from their location IDs.
+
+        Args:
+            pu_location (array-like): The PULocationID of each row.
+            do_location (array-like): The DOLocationID of each row.
+            trip_distance (array-like): The trip_distance of each row.
+
+        Returns:
+            numpy.ndarray: The predictions.
+        """
+        columns = pair_columns(
+            self.pair_index, np.atleast_1d(pu_location), np.atleast_1d(do_location)
+        )
+        return self._predict_columns(columns, trip_distance)
+
+    def _predict_columns(self, columns, trip_distance, chunk_size=10_000):
+        """Walk the trees for the PU_DO column and trip_distance of the rows."""
+        # The trees compare float32 features with float64 thresholds
+        distances = np.atleast_1d(np.asarray(trip_distance, dtype=np.float32))
+        predictions = np.empty(len(columns), dtype=np.float64)
+        for start in range(0, len(columns), chunk_size):
+            end = start + chunk_size
+            predictions[start:end] = self._walk(
+                columns[start:end], distances[start:end]
+            )
+        return predictions
+
+    def _walk(self, columns, distances):
+        """Walk every tree for a chunk of rows and average the leaf values."""
+        nodes = np.broadcast_to(self.roots, (len(columns), len(self.roots)))
+        columns, distances = columns[:, None], distances[:, None]
+        for _ in range(self.max_depth):
+            feature = self.feature[nodes]
+            values = np.where(
+                feature == self.distance_column, distances, feature == columns
+            )
+            nodes = self.children[2 * nodes + (values > self.threshold[nodes])]
+        return self.value[nodes].mean(axis=1)
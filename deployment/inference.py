@@ -1,39 +1,183 @@
-"""summary."""
+"""
+The SageMaker inference handlers: model_fn, input_fn, predict_fn and output_fn.
+
+Only NumPy, pandas and the NumPy-only pair_encoding are imported with the module:
+joblib, scikit-learn, SciPy and pyarrow are imported by the functions that need
+them, so serving the flattened forest never loads them.
+"""
+import io
 import json
 import os
 
-import joblib
+import numpy as np
+import pandas as pd
+from pair_encoding import csr_arrays, pair_columns, pair_index
+
+JSON_CONTENT_TYPE = "application/json"
+JSONLINES_CONTENT_TYPES = ["application/jsonlines", "application/x-ndjson"]
+NPY_CONTENT_TYPE = "application/x-npy"
+CSV_CONTENT_TYPE = "text/csv"
+ARROW_CONTENT_TYPE = "application/vnd.apache.arrow.stream"
+CONTENT_TYPES = [
+    JSON_CONTENT_TYPE,
+    *JSONLINES_CONTENT_TYPES,
+    NPY_CONTENT_TYPE,
+    CSV_CONTENT_TYPE,
+    ARROW_CONTENT_TYPE,
+]
+LOCATIONS = ["PULocationID", "DOLocationID"]
+COLUMNS = [*LOCATIONS, "trip_distance"]
+# The pipeline as the model archive names it, then as Trainer.save_pipeline does
+MODEL_FILES = ["model.joblib", "pipeline.joblib"]
 
 
 def model_fn(model_dir):
-    """Deserialize fitted model."""
-    model = joblib.load(os.path.join(model_dir, "model.joblib"))
+    """
+    Deserialize fitted model.
+
+    With the PREDICTION_MODE environment variable set to "forest", and the
+    flattened forest (model.npz) shipped next to model.joblib, the forest is
+    memory-mapped instead of unpickling the pipeline, which is much faster at cold
+    start. With PREDICTION_MODE set to "lookup", and a lookup.npz table shipped
+    next to model.joblib, predictions are looked up in the table and the model only
+    answers the rows the table cannot.
+
+    The pipeline is read from model.joblib, or from pipeline.joblib when there is
+    none, so the models folder the Trainer saves to can be served as is.
+
+    The PU_DO columns of a DictVectorizer step are indexed by location ID pair
+    here, once, so the request threads only read the index.
+    """
+    mode = os.getenv("PREDICTION_MODE", "model")
+    forest_path = os.path.join(model_dir, "model.npz")
+    if mode == "forest" and os.path.exists(forest_path):
+        from flat_forest import FlatForest
+
+        return FlatForest.load(forest_path, mmap_mode="r")
+
+    import joblib
+
+    paths = [os.path.join(model_dir, name) for name in MODEL_FILES]
+    model = joblib.load(next((p for p in paths if os.path.exists(p)), paths[0]))
+    steps = getattr(model, "steps", None)
+    if steps and _is_pu_do_vectorizer(steps[0][1]):
+        steps[0][1].pair_index_ = _vectorizer_pair_index(steps[0][1])
+    lookup_path = os.path.join(model_dir, "lookup.npz")
+    if mode == "lookup" and os.path.exists(lookup_path):
+        from lookup_table import LookupTable
+
+        return LookupModel(LookupTable.load(lookup_path), model)
     return model
 
 
+class LookupModel:
+    """
+    A model served from its precomputed lookup table.
+
+    Args:
+        table (LookupTable): The predictions of every PU_DO pair over a distance
+        grid.
+        model: The model, for the rows the table cannot answer.
+    """
+
+    def __init__(self, table, model):
+        """
+        Initialize the LookupModel object.
+
+        Args:
+            table (LookupTable): The precomputed predictions.
+            model: The model, for the rows the table cannot answer.
+        """
+        self.table = table
+        self.model = model
+
+    def predict(self, records):
+        """
+        Look the predictions of a DataFrame of records up.
+
+        Args:
+            records (pandas.DataFrame): The records, with their location IDs or
+            PU_DO, and trip_distance.
+
+        Returns:
+            numpy.ndarray: The predictions.
+        """
+        from lookup_table import split_pu_do
+
+        if set(LOCATIONS) <= set(records):
+            pu_location, do_location = (
+                pd.to_numeric(records[location], errors="coerce").to_numpy(float)
+                for location in LOCATIONS
+            )
+        elif "PU_DO" in records:
+            pu_location, do_location = split_pu_do(records["PU_DO"].astype(str))
+        else:
+            return predict_records(records, self.model)
+
+        distance = pd.to_numeric(records["trip_distance"], errors="coerce")
+        predictions = self.table.predict(
+            pu_location, do_location, distance.to_numpy(float)
+        )
+        missing = np.isnan(predictions)
+        if missing.any():
+            predictions[missing] = predict_records(records[missing], self.model)
+        return predictions
+
+
 def input_fn(request_body, request_content_type):
     """
     input_fn.
 
     request_body: The body of the request sent to the model.
     request_content_type: (string) specifies the format/variable type of the request
+
+    A JSON body holds either {"Input": record}, {"Input": [records]} or a JSON array
+    of records; a JSON Lines body holds one record per line. A single record is
+    returned as a dict, several records as a DataFrame.
+
+    The binary and columnar encodings hold (PULocationID, DOLocationID,
+    trip_distance) rows: a 2D .npy array (or a structured one with these fields),
+    CSV rows with an optional header, or an Arrow IPC stream with these columns.
+    They are decoded into column arrays without going through Python objects.
     """
-    if request_content_type == "application/json":
+    content_type = request_content_type.split(";")[0].strip()
+
+    if content_type == NPY_CONTENT_TYPE:
+        return _read_npy(request_body)
+    if content_type == CSV_CONTENT_TYPE:
+        return _read_csv(request_body)
+    if content_type == ARROW_CONTENT_TYPE:
+        return _read_arrow(request_body)
+
+    if isinstance(request_body, bytes | bytearray | memoryview):
+        request_body = bytes(request_body).decode()
+    if content_type == JSON_CONTENT_TYPE:
         request_body = json.loads(request_body)
-        inpVar = request_body["Input"]
-        return inpVar
-    else:
-        raise ValueError("This model only supports application/json input")
+        inpVar = (
+            request_body["Input"] if isinstance(request_body, dict) else request_body
+        )
+        if isinstance(inpVar, dict):
+            return inpVar
+        return pd.DataFrame.from_records(inpVar)
+    if content_type in JSONLINES_CONTENT_TYPES:
+        records = [json.loads(line) for line in request_body.splitlines() if line]
+        return pd.DataFrame.from_records(records)
+    raise ValueError(f"This model does not support {content_type} input")
 
 
 def predict_fn(input_data, model):
     """
     predict_fn.
 
-    input_data: returned array from input_fn above
+    input_data: returned record or records from input_fn above
     model (sklearn model) returned model loaded from model_fn above
+
+    Every record is predicted in one vectorized call. A single record returns a
+    scalar, several records return an array in the input order.
     """
-    return model.predict(input_data)
+    if isinstance(input_data, dict):
+        return predict_records(pd.DataFrame([input_data]), model)[0]
+    return predict_records(input_data, model)
 
 
 def output_fn(prediction, content_type):
@@ -42,7 +186,254 @@ def output_fn(prediction, content_type):
 
     prediction: the returned value from predict_fn above
     content_type: the content type the endpoint expects to be returned. Ex: JSON, string
+
+    content_type is the Accept header of the request, and may list several types
+    with q-values; the preferred supported one is used, JSON for */*. JSON
+    responses hold integer outputs, like they always did; the .npy, CSV and Arrow
+    responses hold the float predictions.
     """
-    res = int(prediction[0])
+    accept = negotiate(content_type)
+    if accept == JSON_CONTENT_TYPE and np.ndim(prediction) == 0:
+        res = int(prediction)
+        respJSON = {"Output": res}
+        return respJSON
+
+    prediction = np.atleast_1d(np.asarray(prediction, dtype=np.float64))
+    if accept == NPY_CONTENT_TYPE:
+        buffer = io.BytesIO()
+        np.save(buffer, prediction, allow_pickle=False)
+        return buffer.getvalue()
+    if accept == CSV_CONTENT_TYPE:
+        return "".join(f"{value!r}\n" for value in prediction.tolist())
+    if accept == ARROW_CONTENT_TYPE:
+        import pyarrow as pa
+
+        table = pa.table({"Output": prediction})
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes()
+
+    res = [int(value) for value in prediction]
+    if accept in JSONLINES_CONTENT_TYPES:
+        return "".join(json.dumps({"Output": value}) + "\n" for value in res)
     respJSON = {"Output": res}
     return respJSON
+
+
+def negotiate(accept):
+    """
+    Pick the response content type from an Accept header.
+
+    Args:
+        accept (str): The Accept header, e.g. "application/x-npy, */*;q=0.1".
+
+    Returns:
+        str: The supported content type with the highest q-value, JSON for */*.
+
+    Raises:
+        ValueError: If none of the accepted content types is supported.
+    """
+    if not accept:
+        return JSON_CONTENT_TYPE
+    candidates = []
+    for position, item in enumerate(accept.split(",")):
+        media_type, *parameters = (part.strip() for part in item.split(";"))
+        quality = 1.0
+        for parameter in parameters:
+            name, _, value = parameter.partition("=")
+            if name.strip() == "q":
+                quality = float(value)
+        if quality > 0:
+            candidates.append((-quality, position, media_type.lower()))
+
+    for _, _, media_type in sorted(candidates):
+        if media_type in CONTENT_TYPES:
+            return media_type
+        if media_type in ("*/*", "application/*"):
+            return JSON_CONTENT_TYPE
+    raise ValueError(f"This model does not support {accept} output")
+
+
+def predict_records(records, model):
+    """
+    Predict a DataFrame of records in one call.
+
+    The PU_DO feature is built from the location IDs when it is missing. When the
+    first step of the pipeline is a DictVectorizer fitted on PU_DO and
+    trip_distance, the records are encoded column-wise instead of dict by dict.
+    A pipeline fitted on the location ID columns (the hist_gradient_boosting
+    backend) is given them as numbers, parsed from PU_DO when they are missing.
+    A LookupModel looks the predictions up instead, and a FlatForest walks its
+    node arrays.
+    """
+    records = records.reset_index(drop=True)
+    if isinstance(model, LookupModel):
+        return model.predict(records)
+    if hasattr(model, "predict_locations"):
+        return _predict_flat_forest(records, model)
+    steps = getattr(model, "steps", None)
+    if steps and len(steps) == 2 and _is_pu_do_vectorizer(steps[0][1]):
+        return steps[1][1].predict(_encode(records, steps[0][1]))
+    columns = getattr(steps[0][1], "feature_names_in_", None) if steps else None
+    if columns is not None and set(LOCATIONS) <= set(columns):
+        return model.predict(_with_locations(records)[list(columns)])
+    records = _with_pu_do(records)
+    return model.predict(records[["PU_DO", "trip_distance"]].to_dict("records"))
+
+
+def _predict_flat_forest(records, forest):
+    """Predict records with a FlatForest (see model_fn)."""
+    if (
+        "PU_DO" not in records
+        and set(LOCATIONS) <= set(records)
+        and all(pd.api.types.is_numeric_dtype(records[c]) for c in LOCATIONS)
+        and not records[LOCATIONS].isna().to_numpy().any()
+    ):
+        return forest.predict_locations(
+            records["PULocationID"].to_numpy(),
+            records["DOLocationID"].to_numpy(),
+            records["trip_distance"].to_numpy(np.float64),
+        )
+    records = _with_pu_do(records)
+    return forest.predict(
+        records["PU_DO"].astype(str).to_numpy(),
+        records["trip_distance"].to_numpy(np.float64),
+    )
+
+
+def _read_npy(body):
+    """Decode a .npy body into columns, as a view of the request buffer."""
+    buffer = io.BytesIO(body)
+    version = np.lib.format.read_magic(buffer)
+    if version == (1, 0):
+        shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(buffer)
+    else:
+        shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(buffer)
+    if dtype.hasobject:
+        raise ValueError("Object arrays are not supported")
+    array = np.frombuffer(
+        body, dtype=dtype, count=int(np.prod(shape)), offset=buffer.tell()
+    ).reshape(shape, order="F" if fortran_order else "C")
+
+    if dtype.names:
+        return pd.DataFrame({name: array[name] for name in dtype.names}, copy=False)
+    array = np.atleast_2d(array)
+    if array.shape[1] != len(COLUMNS):
+        raise ValueError(f"Expected rows of {', '.join(COLUMNS)}")
+    return pd.DataFrame(
+        {name: array[:, i] for i, name in enumerate(COLUMNS)}, copy=False
+    )
+
+
+def _read_csv(body):
+    """Decode CSV rows, with or without a header, into columns."""
+    if isinstance(body, str):
+        body = body.encode()
+    first = bytes(body[:64]).lstrip()
+    has_header = bool(first) and not (first[:1].isdigit() or first[:1] in b"-.")
+    return pd.read_csv(
+        io.BytesIO(body),
+        header=0 if has_header else None,
+        names=None if has_header else COLUMNS,
+    )
+
+
+def _read_arrow(body):
+    """Decode an Arrow IPC stream into columns, sharing the request buffer."""
+    import pyarrow as pa
+
+    table = pa.ipc.open_stream(pa.py_buffer(body)).read_all()
+    names = [name for name in ["PU_DO", *COLUMNS] if name in table.column_names]
+    return pd.DataFrame(
+        {name: table.column(name).to_numpy() for name in names}, copy=False
+    )
+
+
+def _with_pu_do(records):
+    """Build the PU_DO column from the location IDs when it is missing."""
+    if "PU_DO" in records or not set(LOCATIONS) <= set(records):
+        return records
+    locations = [
+        records[location].astype("Int64").astype(str)
+        if pd.api.types.is_float_dtype(records[location])
+        else records[location].astype(str)
+        for location in LOCATIONS
+    ]
+    return records.assign(PU_DO=locations[0] + "_" + locations[1])
+
+
+def _with_locations(records):
+    """Get the location IDs as numbers, parsed from PU_DO when they are missing."""
+    if set(LOCATIONS) <= set(records):
+        locations = [records[location] for location in LOCATIONS]
+    else:
+        from lookup_table import split_pu_do
+
+        locations = split_pu_do(records["PU_DO"].astype(str))
+    return records.assign(
+        **{
+            name: pd.to_numeric(
+                pd.Series(location, index=records.index), errors="coerce"
+            )
+            for name, location in zip(LOCATIONS, locations, strict=True)
+        }
+    )
+
+
+def _is_pu_do_vectorizer(vectorizer):
+    """Check if a step is a DictVectorizer fitted on PU_DO and trip_distance."""
+    from sklearn.feature_extraction import DictVectorizer
+
+    return (
+        isinstance(vectorizer, DictVectorizer)
+        and "trip_distance" in vectorizer.vocabulary_
+        and all(
+            name == "trip_distance" or name.startswith("PU_DO" + vectorizer.separator)
+            for name in vectorizer.feature_names_
+        )
+    )
+
+
+def _vectorizer_pair_index(vectorizer):
+    """Index the PU_DO columns of a DictVectorizer by location ID pair."""
+    prefix = "PU_DO" + vectorizer.separator
+    categories, columns = [], []
+    for name, column in vectorizer.vocabulary_.items():
+        if name.startswith(prefix):
+            categories.append(name[len(prefix) :])
+            columns.append(column)
+    return pair_index(categories, columns)
+
+
+def _encode(records, vectorizer):
+    """Encode PU_DO and trip_distance into the vectorizer's sparse feature space."""
+    import scipy.sparse as sp
+
+    if (
+        "PU_DO" not in records
+        and set(LOCATIONS) <= set(records)
+        and all(pd.api.types.is_numeric_dtype(records[c]) for c in LOCATIONS)
+        and not records[LOCATIONS].isna().to_numpy().any()
+    ):
+        index = getattr(vectorizer, "pair_index_", None)
+        if index is None:
+            index = _vectorizer_pair_index(vectorizer)
+        columns = pair_columns(index, records["PULocationID"], records["DOLocationID"])
+    else:
+        records = _with_pu_do(records)
+        columns = (
+            ("PU_DO" + vectorizer.separator + records["PU_DO"].astype(str))
+            .map(vectorizer.vocabulary_)
+            .to_numpy(dtype=np.float64, na_value=-1)
+            .astype(np.int64)
+        )
+    return sp.csr_matrix(
+        csr_arrays(
+            columns,
+            records["trip_distance"].to_numpy(dtype=vectorizer.dtype),
+            vectorizer.vocabulary_["trip_distance"],
+            vectorizer.dtype,
+        ),
+        shape=(len(records), len(vectorizer.feature_names_)),
+    )
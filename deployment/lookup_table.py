@@ -0,0 +1,259 @@
+"""
+LookupTable: precomputed predictions for every PU_DO pair and trip distance.
+
+The model only sees the PU_DO pair and trip_distance, and there are only about
+265 x 265 zone pairs, so its predictions can be precomputed at training time for
+each known pair over a uniform grid of trip distances. Serving a row is then an
+O(1) lookup of its pair's row, indexed by the zone IDs, and a linear
+interpolation between the two nearest distances of the grid.
+
+Pairs that were not seen during training all share the row of the model's
+prediction without a PU_DO indicator, like the model does. A model encoding each
+location ID on its own (hist_gradient_boosting) instead predicts a pair with one
+known side from that side: such a table also has a row per known PULocationID
+with an unknown DOLocationID, and per known DOLocationID with an unknown
+PULocationID. Distances beyond the grid are clamped to its last point. The table
+only imports NumPy.
+
+Functions:
+        split_pu_do: Split PU_DO values into their location IDs.
+
+Classes:
+        LookupTable: The precomputed predictions.
+
+"""
+
+import numpy as np
+
+UNKNOWN_PAIR = "unknown"
+
+
+def split_pu_do(pu_do):
+    """
+    Split PU_DO values into their location IDs.
+
+    Args:
+        pu_do (array-like): "PU_DO" strings, such as "9_70".
+
+    Returns:
+        tuple: The PULocationID and DOLocationID arrays, as floats, NaN where the
+        value is not a pair of location IDs.
+    """
+    parts = np.char.partition(np.asarray(pu_do, dtype=str), "_")
+    locations = []
+    for part in [parts[:, 0], parts[:, 2]]:
+        valid = np.char.isdigit(part) & (parts[:, 1] == "_")
+        location = np.full(len(part), np.nan)
+        location[valid] = part[valid].astype(np.float64)
+        locations.append(location)
+    return tuple(locations)
+
+
+class LookupTable:
+    """
+    Define the LookupTable class.
+
+    Args:
+        pair_index (numpy.ndarray): The values row of each (PULocationID,
+        DOLocationID) pair, 0 for the pairs not seen during training.
+        values (numpy.ndarray): The predictions of each row over the distance grid.
+        step (float): The distance between two points of the grid.
+        pu_index (numpy.ndarray, optional): The values row of each PULocationID
+        with an unknown DOLocationID, used for the pairs without a row of their
+        own, 0 when there is none. Defaults to none.
+        do_index (numpy.ndarray, optional): The same for each DOLocationID with an
+        unknown PULocationID. Defaults to none.
+    """
+
+    def __init__(self, pair_index, values, step, pu_index=None, do_index=None):
+        """
+        Initialize the LookupTable object.
+
+        Args:
+            pair_index (numpy.ndarray): The values row of each zone ID pair.
+            values (numpy.ndarray): The predictions of each row over the grid.
+            step (float): The distance between two points of the grid.
+            pu_index (numpy.ndarray, optional): The values row of each
+            PULocationID with an unknown DOLocationID.
+            do_index (numpy.ndarray, optional): The values row of each
+            DOLocationID with an unknown PULocationID.
+        """
+        n_zones = pair_index.shape[0]
+        self.pair_index = pair_index
+        self.values = values
+        self.step = float(step)
+        self.pu_index = (
+            np.zeros(n_zones, dtype=pair_index.dtype) if pu_index is None else pu_index
+        )
+        self.do_index = (
+            np.zeros(n_zones, dtype=pair_index.dtype) if do_index is None else do_index
+        )
+
+    @classmethod
+    def build(
+        cls,
+        predict,
+        pu_do,
+        n_buckets=64,
+        max_distance=50.0,
+        pu_locations=(),
+        do_locations=(),
+    ):
+        """
+        Precompute the predictions of a model.
+
+        Args:
+            predict (callable): Predict an array of PU_DO values and an array of
+            distances.
+            pu_do (array-like): The PU_DO values known to the model.
+            n_buckets (int): The number of distance intervals of the grid.
+            max_distance (float): The last distance of the grid.
+            pu_locations (array-like): The PULocationIDs the model knows on their
+            own, each getting a row for the pairs with an unknown DOLocationID.
+            Every pair of a known PULocationID and DOLocationID must be in pu_do.
+            Defaults to none.
+            do_locations (array-like): The same for the DOLocationIDs. Defaults to
+            none.
+
+        Returns:
+            LookupTable: The table.
+        """
+        pu_location, do_location = split_pu_do(pu_do)
+        known = ~(np.isnan(pu_location) | np.isnan(do_location))
+        pu_location = pu_location[known].astype(np.int64)
+        do_location = do_location[known].astype(np.int64)
+        pairs = np.asarray(pu_do, dtype=str)[known]
+        pu_locations = np.asarray(pu_locations, dtype=np.int64)
+        do_locations = np.asarray(do_locations, dtype=np.int64)
+
+        n_zones = (
+            max(
+                pu_location.max(initial=0),
+                do_location.max(initial=0),
+                pu_locations.max(initial=0),
+                do_locations.max(initial=0),
+            )
+            + 1
+        )
+        n_rows = 1 + len(pairs) + len(pu_locations) + len(do_locations)
+        index_dtype = np.uint16 if n_rows <= 2**16 else np.uint32
+        pair_index = np.zeros((n_zones, n_zones), dtype=index_dtype)
+        pair_index[pu_location, do_location] = np.arange(1, len(pairs) + 1)
+        # The rows of the half-known pairs follow those of the pairs. Their
+        # unknown side is left empty, which the model reads as a missing value.
+        pu_start = 1 + len(pairs)
+        do_start = pu_start + len(pu_locations)
+        pu_index = np.zeros(n_zones, dtype=index_dtype)
+        pu_index[pu_locations] = np.arange(pu_start, do_start)
+        do_index = np.zeros(n_zones, dtype=index_dtype)
+        do_index[do_locations] = np.arange(do_start, n_rows)
+
+        grid = np.linspace(0, max_distance, n_buckets + 1)
+        rows = np.concatenate(
+            [
+                [UNKNOWN_PAIR],
+                pairs,
+                [f"{location}_" for location in pu_locations],
+                [f"_{location}" for location in do_locations],
+            ]
+        )
+        values = predict(np.repeat(rows, len(grid)), np.tile(grid, len(rows)))
+        values = np.asarray(values, dtype=np.float32).reshape(len(rows), len(grid))
+        return cls(pair_index, values, max_distance / n_buckets, pu_index, do_index)
+
+    def save(self, path):
+        """
+        Save the table as an uncompressed .npz file.
+
+        Args:
+            path (str): The path of the .npz file.
+        """
+        np.savez(
+            path,
+            pair_index=self.pair_index,
+            values=self.values,
+            step=self.step,
+            pu_index=self.pu_index,
+            do_index=self.do_index,
+        )
+
+    @classmethod
+    def load(cls, path):
+        """
+        Load a table saved by save.
+
+        Args:
+            path (str): The path of the .npz file.
+
+        Returns:
+            LookupTable: The table.
+        """
+        with np.load(path, allow_pickle=False) as arrays:
+            # Tables saved before the half-known pair rows have no such rows
+            return cls(
+                arrays["pair_index"],
+                arrays["values"],
+                arrays["step"],
+                arrays["pu_index"] if "pu_index" in arrays.files else None,
+                arrays["do_index"] if "do_index" in arrays.files else None,
+            )
+
+    @property
+    def nbytes(self):
+        """
+        Get the memory footprint of the table.
+
+        Returns
+            int: The number of bytes of the index and values arrays.
+        """
+        return (
+            self.pair_index.nbytes
+            + self.pu_index.nbytes
+            + self.do_index.nbytes
+            + self.values.nbytes
+        )
+
+    def predict(self, pu_location, do_location, trip_distance):
+        """
+        Look the predictions of trips up.
+
+        Args:
+            pu_location (array-like): The PULocationID of each row.
+            do_location (array-like): The DOLocationID of each row.
+            trip_distance (array-like): The trip_distance of each row.
+
+        Returns:
+            numpy.ndarray: The predictions, NaN for the rows the table cannot
+            answer (missing values or zone IDs beyond the index).
+        """
+        pu_location = np.atleast_1d(np.asarray(pu_location, dtype=np.float64))
+        do_location = np.atleast_1d(np.asarray(do_location, dtype=np.float64))
+        distance = np.atleast_1d(np.asarray(trip_distance, dtype=np.float64))
+        n_zones = self.pair_index.shape[0]
+        valid = (
+            (pu_location >= 0)
+            & (pu_location < n_zones)
+            & (do_location >= 0)
+            & (do_location < n_zones)
+            & np.isfinite(distance)
+        )
+        predictions = np.full(len(distance), np.nan)
+        pu_location = pu_location[valid].astype(np.intp)
+        do_location = do_location[valid].astype(np.intp)
+        rows = self.pair_index[pu_location, do_location]
+        # A pair without a row of its own is predicted from its known side, if any
+        unmatched = rows == 0
+        rows[unmatched] = np.where(
+            self.pu_index[pu_location[unmatched]] > 0,
+            self.pu_index[pu_location[unmatched]],
+            self.do_index[do_location[unmatched]],
+        )
+
+        last = self.values.shape[1] - 1
+        position = np.clip(distance[valid] / self.step, 0, last)
+        low = np.minimum(position.astype(np.intp), last - 1)
+        weight = position - low
+        predictions[valid] = (1 - weight) * self.values[rows, low] + weight * (
+            self.values[rows, low + 1]
+        )
+        return predictions
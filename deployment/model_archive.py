@@ -0,0 +1,252 @@
+"""
+Package the model artifacts in-process and stream the archive to S3.
+
+The archive is written with tarfile into an S3MultipartWriter, which cuts it into
+parts as it is produced and uploads them on a thread pool while the next ones are
+compressed: no archive is written to disk and at most max_concurrency parts are
+held in memory. An archive smaller than one part is sent with a single
+put_object.
+
+Classes:
+        S3MultipartWriter: A write-only file uploading to S3 in parts.
+
+Functions:
+        write_archive: Write files as a tar archive to a file object.
+        package_to_s3: Stream a tar archive of files to S3.
+
+"""
+
+import logging
+import os
+import tarfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# The tarfile compression algorithms, "" being no compression
+COMPRESSIONS = ["gz", "bz2", "xz", ""]
+# S3 parts, but the last one, are 5 MB at least
+PART_SIZE = 16 * 2**20
+
+
+class S3MultipartWriter:
+    """
+    Define the S3MultipartWriter class, a write-only file uploading to S3 in parts.
+
+    Used as a context manager, the upload is completed on exit, or aborted if the
+    block raised an error.
+
+    Args:
+        client (botocore.client.S3): The S3 client.
+        bucket (str): The name of the S3 bucket.
+        key (str): The key of the object.
+        part_size (int, optional): The size of the parts. Defaults to PART_SIZE.
+        max_concurrency (int, optional): The number of parts uploaded at once.
+        Defaults to 4.
+
+    Attributes:
+        bytes (int): The number of bytes written.
+        parts (int): The number of parts uploaded, 0 for a single put_object.
+        upload_wait (float): The seconds spent waiting for the uploads.
+    """
+
+    def __init__(self, client, bucket, key, part_size=PART_SIZE, max_concurrency=4):
+        """
+        Initialize the S3MultipartWriter object.
+
+        Args:
+            client (botocore.client.S3): The S3 client.
+            bucket (str): The name of the S3 bucket.
+            key (str): The key of the object.
+            part_size (int, optional): The size of the parts.
+            max_concurrency (int, optional): The number of parts uploaded at once.
+        """
+        self.client = client
+        self.bucket = bucket
+        self.key = key
+        self.part_size = part_size
+        self.bytes = 0
+        self.parts = 0
+        self.upload_wait = 0.0
+        self._buffer = bytearray()
+        self._upload_id = None
+        self._futures = []
+        self._pool = ThreadPoolExecutor(
+            max_workers=max_concurrency, thread_name_prefix="s3-part"
+        )
+        # Bound the parts held in memory: the queued ones and the running ones
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+
+    def write(self, data):
+        """
+        Write bytes, uploading every full part.
+
+        Args:
+            data (bytes): The bytes.
+
+        Returns:
+            int: The number of bytes written.
+        """
+        self._buffer += data
+        self.bytes += len(data)
+        while len(self._buffer) >= self.part_size:
+            self._submit(bytes(self._buffer[: self.part_size]))
+            del self._buffer[: self.part_size]
+        return len(data)
+
+    def tell(self):
+        """
+        Get the position in the object, for tarfile.
+
+        Returns
+            int: The number of bytes written.
+        """
+        return self.bytes
+
+    def _submit(self, body):
+        """Upload a part on the thread pool, once a slot is free."""
+        if self._upload_id is None:
+            self._upload_id = self.client.create_multipart_upload(
+                Bucket=self.bucket, Key=self.key
+            )["UploadId"]
+        start = time.perf_counter()
+        self._slots.acquire()
+        self.upload_wait += time.perf_counter() - start
+        self.parts += 1
+        self._futures.append(self._pool.submit(self._upload_part, self.parts, body))
+
+    def _upload_part(self, number, body):
+        """Upload a part and release its slot."""
+        try:
+            response = self.client.upload_part(
+                Bucket=self.bucket,
+                Key=self.key,
+                UploadId=self._upload_id,
+                PartNumber=number,
+                Body=body,
+            )
+            return {"PartNumber": number, "ETag": response["ETag"]}
+        finally:
+            self._slots.release()
+
+    def close(self):
+        """Upload the last part and complete the upload."""
+        start = time.perf_counter()
+        try:
+            if self._upload_id is None:
+                self.client.put_object(
+                    Bucket=self.bucket, Key=self.key, Body=bytes(self._buffer)
+                )
+                return
+            if self._buffer:
+                self._submit(bytes(self._buffer))
+            parts = [future.result() for future in self._futures]
+            self.client.complete_multipart_upload(
+                Bucket=self.bucket,
+                Key=self.key,
+                UploadId=self._upload_id,
+                MultipartUpload={"Parts": parts},
+            )
+        except Exception:
+            self.abort()
+            raise
+        finally:
+            self._buffer = bytearray()
+            self._pool.shutdown()
+            self.upload_wait += time.perf_counter() - start
+
+    def abort(self):
+        """Abort the upload, so S3 does not keep its parts."""
+        self._pool.shutdown(cancel_futures=True)
+        if self._upload_id is not None:
+            self.client.abort_multipart_upload(
+                Bucket=self.bucket, Key=self.key, UploadId=self._upload_id
+            )
+            self._upload_id = None
+
+    def __enter__(self):
+        """Return the writer."""
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """Complete the upload, or abort it on an error."""
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+
+def write_archive(files, fileobj, compression="gz", level=6):
+    """
+    Write files as a tar archive to a file object.
+
+    Args:
+        files (list): The files, added under their base name.
+        fileobj: A binary file object with write and tell.
+        compression (str, optional): One of COMPRESSIONS. Defaults to "gz".
+        level (int, optional): The compression level, 1 (fastest) to 9 (smallest).
+        Defaults to 6.
+
+    Returns:
+        int: The number of bytes of the files.
+
+    Raises:
+        ValueError: If the compression is unknown.
+    """
+    if compression not in COMPRESSIONS:
+        raise ValueError(f"Unknown compression {compression!r}: {COMPRESSIONS}")
+    if compression == "":
+        options = {}
+    elif compression == "xz":
+        options = {"preset": level}
+    else:
+        options = {"compresslevel": level}
+    with tarfile.open(fileobj=fileobj, mode=f"w:{compression}", **options) as archive:
+        for path in files:
+            archive.add(path, arcname=os.path.basename(path))
+    return sum(os.path.getsize(path) for path in files)
+
+
+def package_to_s3(
+    files,
+    client,
+    bucket,
+    key,
+    compression="gz",
+    level=6,
+    part_size=PART_SIZE,
+    max_concurrency=4,
+):
+    """
+    Stream a tar archive of files to S3.
+
+    Args:
+        files (list): The files, added under their base name.
+        client (botocore.client.S3): The S3 client.
+        bucket (str): The name of the S3 bucket.
+        key (str): The key of the archive.
+        compression (str, optional): One of COMPRESSIONS. Defaults to "gz".
+        level (int, optional): The compression level. Defaults to 6.
+        part_size (int, optional): The size of the parts. Defaults to PART_SIZE.
+        max_concurrency (int, optional): The number of parts uploaded at once.
+        Defaults to 4.
+
+    Returns:
+        dict: The "files", their "raw_bytes", the "bytes" and "parts" of the
+        archive, the "seconds" of the whole upload and how many of them were
+        spent waiting for the uploads ("upload_wait_s") rather than packing.
+    """
+    start = time.perf_counter()
+    with S3MultipartWriter(client, bucket, key, part_size, max_concurrency) as writer:
+        raw_bytes = write_archive(files, writer, compression, level)
+    report = {
+        "files": [os.path.basename(path) for path in files],
+        "raw_bytes": raw_bytes,
+        "bytes": writer.bytes,
+        "parts": writer.parts,
+        "seconds": time.perf_counter() - start,
+        "upload_wait_s": writer.upload_wait,
+    }
+    logging.info(f"Uploaded s3://{bucket}/{key}: {report}")
+    return report
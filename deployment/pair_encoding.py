@@ -0,0 +1,132 @@
+"""
+The encoding of the location ID pairs into the PU_DO feature.
+
+A PU_DO value is the "PULocationID_DOLocationID" string of a trip. When the
+locations are given as numbers, the pairs are looked up as the integer keys
+PULocationID * PAIR_BASE + DOLocationID in a sorted key array instead of
+building the strings. The training encoder (build_features.PUDOEncoder) and the
+inference code (inference.py and flat_forest.py) both encode the pairs with this
+module, and build their sparse feature rows with it too (see csr_arrays). It
+only imports NumPy, so it can be served without scikit-learn.
+
+Functions:
+        location_keys: Build the PU_DO keys from the location IDs.
+        pair_index: Index the PU_DO columns of a vocabulary by location ID pair.
+        pair_columns: Look the PU_DO column of location ID pairs up.
+        csr_arrays: Build the sparse rows of the PU_DO and trip_distance features.
+
+"""
+
+import numpy as np
+
+# Location ID pairs are looked up as PULocationID * PAIR_BASE + DOLocationID
+PAIR_BASE = 1 << 20
+# The longest location ID part parsed, so the keys fit in an int64
+MAX_DIGITS = 12
+
+
+def location_keys(pu_location, do_location):
+    """
+    Build the PU_DO keys from the location IDs.
+
+    Args:
+        pu_location (array-like): The PULocationID of each row.
+        do_location (array-like): The DOLocationID of each row.
+
+    Returns:
+        numpy.ndarray: The "PU_DO" string of each row.
+    """
+    parts = []
+    for location in [pu_location, do_location]:
+        location = np.asarray(location)
+        if location.dtype.kind == "f":
+            location = location.astype(np.int64)
+        parts.append(location.astype(str))
+    return np.char.add(np.char.add(parts[0], "_"), parts[1])
+
+
+def pair_index(categories, columns):
+    """
+    Index the PU_DO columns of a vocabulary by location ID pair.
+
+    Only the categories made of two location IDs, written the way location_keys
+    writes them ("9_12", not "09_12" nor "9.0_12"), get a key.
+
+    Args:
+        categories (array-like): The PU_DO values of the vocabulary.
+        columns (array-like): The feature column of each value.
+
+    Returns:
+        tuple: The sorted pair keys, and the column of each key, as int64 arrays.
+    """
+    categories = np.asarray(categories, dtype=str).reshape(-1)
+    columns = np.asarray(columns, dtype=np.int64).reshape(-1)
+    parts = np.char.partition(categories, "_").reshape(-1, 3)
+    known = parts[:, 1] == "_"
+    locations = []
+    for part in (parts[:, 0], parts[:, 2]):
+        length = np.char.str_len(part)
+        known &= (length > 0) & (length <= MAX_DIGITS)
+        known &= np.char.strip(part, "0123456789") == ""
+        location = np.zeros(len(part), dtype=np.int64)
+        location[known] = part[known].astype(np.int64)
+        # "09" is not the key of location 9
+        known &= location.astype(str) == part
+        locations.append(location)
+
+    keys = locations[0][known] * PAIR_BASE + locations[1][known]
+    order = np.argsort(keys, kind="stable")
+    return keys[order], columns[known][order]
+
+
+def pair_columns(index, pu_location, do_location):
+    """
+    Look the PU_DO column of location ID pairs up.
+
+    Args:
+        index (tuple): The pair keys and columns returned by pair_index.
+        pu_location (array-like): The PULocationID of each row.
+        do_location (array-like): The DOLocationID of each row.
+
+    Returns:
+        numpy.ndarray: The column of each pair, -1 for the pairs not in the index.
+    """
+    pair_keys, columns = index
+    keys = np.asarray(pu_location).astype(np.int64) * PAIR_BASE + np.asarray(
+        do_location
+    ).astype(np.int64)
+    if len(pair_keys) == 0:
+        return np.full(len(keys), -1, dtype=np.int64)
+    positions = np.minimum(np.searchsorted(pair_keys, keys), len(pair_keys) - 1)
+    return np.where(pair_keys[positions] == keys, columns[positions], -1)
+
+
+def csr_arrays(columns, distances, distance_column, dtype=np.float64):
+    """
+    Build the sparse rows of the PU_DO and trip_distance features.
+
+    Each row holds its PU_DO indicator (when known) followed by trip_distance.
+
+    Args:
+        columns (numpy.ndarray): The PU_DO column of each row, -1 if unknown.
+        distances (array-like): The trip_distance of each row.
+        distance_column (int): The feature column of trip_distance.
+        dtype (type): The dtype of the values. Defaults to np.float64.
+
+    Returns:
+        tuple: The data, indices and indptr arrays of the CSR matrix.
+    """
+    known = columns >= 0
+    indptr = np.zeros(len(columns) + 1, dtype=np.int64)
+    np.cumsum(known.astype(np.int64) + 1, out=indptr[1:])
+    indices = np.empty(indptr[-1], dtype=np.int32)
+    data = np.empty(indptr[-1], dtype=dtype)
+
+    categorical_positions = indptr[:-1][known]
+    indices[categorical_positions] = columns[known]
+    data[categorical_positions] = 1
+
+    numerical_positions = indptr[1:] - 1
+    indices[numerical_positions] = distance_column
+    data[numerical_positions] = np.asarray(distances, dtype=dtype)
+    return data, indices, indptr
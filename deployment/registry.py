@@ -0,0 +1,236 @@
+"""
+ModelRegistry: a client of the Neptune model registry for the deployment.
+
+The production model is found in one request: the model versions table is fetched
+with only the columns needed, and the newest "production" row is selected with a
+vectorized filter. Its artifacts (the pipeline, and the flattened forest and the
+lookup table when the version has them) are then verified against the SHA-256
+digests recorded by Trainer.upload_to_neptune and kept in a content-addressed
+local cache (see ArtifactCache), so redeploying a version downloads nothing and
+does not even open the version. The missing artifacts are downloaded
+concurrently.
+
+Functions:
+        file_sha256: Hash the content of a file.
+        select_production_version: Select the newest production version of a table.
+
+"""
+
+import hashlib
+import logging
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append("src/data")
+from artifact_cache import ArtifactCache  # noqa: E402
+
+# The artifact fields of a model version, and their local file names
+ARTIFACTS = {"model": "model.joblib", "forest": "model.npz", "lookup": "lookup.npz"}
+# The namespace of the SHA-256 digests of the artifacts, e.g. "hashes/model"
+HASHES = "hashes"
+MODEL_CACHE_DIR = os.getenv(
+    "MODEL_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "nyc-taxi")
+)
+
+
+def file_sha256(path, chunk_size=2**20):
+    """
+    Hash the content of a file.
+
+    Args:
+        path (str): The location of the file.
+        chunk_size (int): The number of bytes read at once.
+
+    Returns:
+        str: The hex SHA-256 digest of the file.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as infile:
+        while chunk := infile.read(chunk_size):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def select_production_version(table):
+    """
+    Select the newest production version of a model versions table.
+
+    Args:
+        table (pandas.DataFrame): The model versions, with the sys/id, sys/stage
+        and sys/creation_time columns, and the hashes of the artifacts if any.
+
+    Returns:
+        dict: The "id" of the version and the digest of each of its artifacts,
+        None for an artifact without a recorded digest.
+
+    Raises:
+        ValueError: If no version is in production.
+    """
+    production = table[table["sys/stage"] == "production"]
+    if production.empty:
+        raise ValueError("No model version is in production")
+    latest = production.loc[production["sys/creation_time"].idxmax()]
+    hashes = {}
+    for field in ARTIFACTS:
+        digest = latest.get(f"{HASHES}/{field}")
+        # Missing values of the table are NaN
+        hashes[field] = digest if isinstance(digest, str) else None
+    return {"id": latest["sys/id"], "hashes": hashes}
+
+
+class ModelRegistry:
+    """
+    Define the ModelRegistry class.
+
+    Args:
+        project (str): The Neptune project.
+        api_token (str): The Neptune API token.
+        model_id (str): The ID of the registered model.
+        cache (ArtifactCache, optional): The cache of the artifacts. Defaults to
+        an ArtifactCache in MODEL_CACHE_DIR.
+        client (module, optional): The neptune module, or a stand-in with its
+        init_model and init_model_version functions. Defaults to neptune,
+        imported on first use.
+    """
+
+    def __init__(self, project, api_token, model_id, cache=None, client=None):
+        """
+        Initialize the ModelRegistry object.
+
+        Args:
+            project (str): The Neptune project.
+            api_token (str): The Neptune API token.
+            model_id (str): The ID of the registered model.
+            cache (ArtifactCache, optional): The cache of the artifacts.
+            client (module, optional): The neptune module, or a stand-in.
+        """
+        self.project = project
+        self.api_token = api_token
+        self.model_id = model_id
+        self.cache = cache or ArtifactCache(root=MODEL_CACHE_DIR)
+        self.client = client
+
+    def _neptune(self):
+        """Get the neptune module, importing it on first use."""
+        if self.client is None:
+            import neptune
+
+            self.client = neptune
+        return self.client
+
+    def get_production_version(self):
+        """
+        Find the newest production version of the model.
+
+        Returns
+            dict: The "id" of the version and the digests of its artifacts (see
+            select_production_version).
+        """
+        model = self._neptune().init_model(
+            project=self.project, api_token=self.api_token, with_id=self.model_id
+        )
+        try:
+            table = model.fetch_model_versions_table(
+                columns=[
+                    "sys/id",
+                    "sys/stage",
+                    "sys/creation_time",
+                    *(f"{HASHES}/{field}" for field in ARTIFACTS),
+                ]
+            ).to_pandas()
+        finally:
+            model.stop()
+        return select_production_version(table)
+
+    def download(self, version, destination="."):
+        """
+        Download the artifacts of a model version, unless they are cached.
+
+        The files of the artifacts the version does not have are removed from
+        destination, so none of a previous version is left behind. A version
+        without recorded digests (uploaded before they were) is downloaded every
+        time, unverified.
+
+        Args:
+            version (dict): The version, as returned by get_production_version.
+            destination (str): The folder of the artifacts. Defaults to ".".
+
+        Returns:
+            list: The locations of the artifacts.
+
+        Raises:
+            ValueError: If a downloaded artifact does not match its digest.
+        """
+        hashes = version["hashes"]
+        fields = [field for field, digest in hashes.items() if digest]
+        missing = [
+            field
+            for field in fields
+            if not self.cache.restore(
+                hashes[field], os.path.join(destination, ARTIFACTS[field])
+            )
+        ]
+        if fields and not missing:
+            logging.info(f"Model version {version['id']} restored from the cache")
+        else:
+            model_version = self._neptune().init_model_version(
+                project=self.project, api_token=self.api_token, with_id=version["id"]
+            )
+            try:
+                if not fields:
+                    logging.warning(
+                        f"Model version {version['id']} has no digests: its "
+                        "artifacts are not verified nor cached"
+                    )
+                    fields = missing = [
+                        field for field in ARTIFACTS if model_version.exists(field)
+                    ]
+                with ThreadPoolExecutor(max_workers=max(len(missing), 1)) as pool:
+                    list(
+                        pool.map(
+                            lambda field: self._download_artifact(
+                                model_version, field, hashes[field], destination
+                            ),
+                            missing,
+                        )
+                    )
+            finally:
+                model_version.stop()
+
+        for field in set(ARTIFACTS) - set(fields):
+            path = os.path.join(destination, ARTIFACTS[field])
+            if os.path.exists(path):
+                os.remove(path)
+        return [os.path.join(destination, ARTIFACTS[field]) for field in fields]
+
+    def _download_artifact(self, model_version, field, digest, destination):
+        """Download an artifact, verify it against its digest and cache it."""
+        path = os.path.join(destination, ARTIFACTS[field])
+        tmp = f"{path}.{os.getpid()}.download"
+        model_version[field].download(tmp)
+        if digest is not None:
+            actual = file_sha256(tmp)
+            if actual != digest:
+                os.remove(tmp)
+                raise ValueError(
+                    f"The downloaded {field} artifact has the digest {actual}, "
+                    f"not {digest}"
+                )
+        os.replace(tmp, path)
+        if digest is not None:
+            self.cache.store(digest, path)
+
+    def fetch_production_model(self, destination="."):
+        """
+        Download the artifacts of the newest production version of the model.
+
+        Args:
+            destination (str): The folder of the artifacts. Defaults to ".".
+
+        Returns:
+            str: The ID of the version.
+        """
+        version = self.get_production_version()
+        self.download(version, destination)
+        return version["id"]
@@ -0,0 +1,202 @@
+"""
+InferenceClient: a reusable client of a SageMaker endpoint.
+
+The sagemaker-runtime client is created once, on first use, with a connection
+pool of max_pool_connections and botocore's retries, and shared by every call,
+so each request reuses a warm connection instead of building a client and doing
+a TLS handshake. Requests are JSON {"Input": ...} bodies, answered with
+{"Output": ...} (see inference.input_fn and output_fn). Besides single calls, a
+batch of records is split into requests sent concurrently over the pool, and the
+async API runs the calls on the same pool.
+
+boto3 is imported on first use, so importing the module stays cheap.
+
+Classes:
+        InferenceClient: A pooled client of a SageMaker endpoint.
+
+"""
+
+import asyncio
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+AWS_REGION = os.getenv("AWS_REGION")
+RUNTIME_MAX_POOL_CONNECTIONS = int(os.getenv("RUNTIME_MAX_POOL_CONNECTIONS", "10"))
+RUNTIME_MAX_ATTEMPTS = int(os.getenv("RUNTIME_MAX_ATTEMPTS", "3"))
+# "standard" or "adaptive", which also rate-limits the client when throttled
+RUNTIME_RETRY_MODE = os.getenv("RUNTIME_RETRY_MODE", "adaptive")
+JSON_CONTENT_TYPE = "application/json"
+
+
+class InferenceClient:
+    """
+    Define the InferenceClient class.
+
+    Args:
+        endpoint_name (str): The name of the SageMaker endpoint.
+        region (str, optional): The AWS region. Defaults to AWS_REGION.
+        max_pool_connections (int, optional): The size of the connection pool, and
+        of the thread pool of the batch and async calls. Defaults to
+        RUNTIME_MAX_POOL_CONNECTIONS.
+        max_attempts (int, optional): The attempts of a call, retries included.
+        Defaults to RUNTIME_MAX_ATTEMPTS.
+        retry_mode (str, optional): The botocore retry mode. Defaults to
+        RUNTIME_RETRY_MODE.
+        client (SageMakerRuntime.Client, optional): The runtime client, e.g. a
+        stand-in. Defaults to one created on first use.
+    """
+
+    def __init__(
+        self,
+        endpoint_name,
+        region=AWS_REGION,
+        max_pool_connections=RUNTIME_MAX_POOL_CONNECTIONS,
+        max_attempts=RUNTIME_MAX_ATTEMPTS,
+        retry_mode=RUNTIME_RETRY_MODE,
+        client=None,
+    ):
+        """
+        Initialize the InferenceClient object.
+
+        Args:
+            endpoint_name (str): The name of the SageMaker endpoint.
+            region (str, optional): The AWS region.
+            max_pool_connections (int, optional): The size of the connection pool.
+            max_attempts (int, optional): The attempts of a call, retries included.
+            retry_mode (str, optional): The botocore retry mode.
+            client (SageMakerRuntime.Client, optional): The runtime client.
+        """
+        self.endpoint_name = endpoint_name
+        self.region = region
+        self.max_pool_connections = max_pool_connections
+        self.max_attempts = max_attempts
+        self.retry_mode = retry_mode
+        self._client = client
+        self._executor = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        """The sagemaker-runtime client, created on first use."""
+        with self._lock:
+            if self._client is None:
+                import boto3
+                from botocore.config import Config
+
+                self._client = boto3.client(
+                    "sagemaker-runtime",
+                    region_name=self.region,
+                    config=Config(
+                        max_pool_connections=self.max_pool_connections,
+                        retries={
+                            "max_attempts": self.max_attempts,
+                            "mode": self.retry_mode,
+                        },
+                    ),
+                )
+            return self._client
+
+    @property
+    def executor(self):
+        """The thread pool of the batch and async calls, created on first use."""
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_pool_connections,
+                    thread_name_prefix="invoke",
+                )
+            return self._executor
+
+    def invoke_raw(self, body, content_type=JSON_CONTENT_TYPE, accept=None):
+        """
+        Send a request body to the endpoint.
+
+        Args:
+            body (bytes or str): The request body.
+            content_type (str, optional): Its Content-Type. Defaults to JSON.
+            accept (str, optional): The Accept of the response. Defaults to
+            content_type.
+
+        Returns:
+            bytes: The response body.
+        """
+        response = self.client.invoke_endpoint(
+            EndpointName=self.endpoint_name,
+            ContentType=content_type,
+            Accept=accept or content_type,
+            Body=body,
+        )
+        return response["Body"].read()
+
+    def invoke(self, records):
+        """
+        Predict a record, or a list of records in one request.
+
+        Args:
+            records (dict or list): The record, or records.
+
+        Returns:
+            The "Output" of the response: a prediction, or a list of them.
+        """
+        body = json.dumps({"Input": records})
+        return json.loads(self.invoke_raw(body))["Output"]
+
+    def invoke_batch(self, records, batch_size=100):
+        """
+        Predict many records, in requests of batch_size records sent concurrently.
+
+        Args:
+            records (list): The records.
+            batch_size (int, optional): The records per request. Defaults to 100.
+
+        Returns:
+            list: The predictions, in the order of the records.
+        """
+        batches = [
+            records[start : start + batch_size]
+            for start in range(0, len(records), batch_size)
+        ]
+        return [
+            prediction
+            for predictions in self.executor.map(self.invoke, batches)
+            for prediction in predictions
+        ]
+
+    async def ainvoke(self, records):
+        """
+        Predict a record, or a list of records, without blocking the event loop.
+
+        Args:
+            records (dict or list): The record, or records.
+
+        Returns:
+            The "Output" of the response.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self.invoke, records)
+
+    async def ainvoke_raw(self, body, content_type=JSON_CONTENT_TYPE, accept=None):
+        """
+        Send a request body to the endpoint, without blocking the event loop.
+
+        Args:
+            body (bytes or str): The request body.
+            content_type (str, optional): Its Content-Type. Defaults to JSON.
+            accept (str, optional): The Accept of the response.
+
+        Returns:
+            bytes: The response body.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.executor, self.invoke_raw, body, content_type, accept
+        )
+
+    def close(self):
+        """Shut the thread pool down."""
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
@@ -0,0 +1,379 @@
+"""
+A local HTTP prediction server with micro-batching.
+
+The pipeline is loaded once with model_fn, the same way the SageMaker container
+loads it, and kept warm. Requests are decoded with input_fn and answered with
+output_fn, so the server speaks the same Content-Type/Accept encodings as the
+endpoint. Concurrent requests are gathered into micro-batches: a batch is closed
+when it holds max_batch_size rows or max_wait seconds after its first request,
+then predicted in a single call on a worker thread, and the predictions are fanned
+back out to each caller.
+
+It runs fully offline, with the standard library's asyncio only, from the models
+folder the training job saves to (pipeline.joblib, and model.npz and lookup.npz
+when they were built) or from an unpacked model archive (model.joblib):
+
+    python deployment/server.py --model-dir models --port 8080
+
+Routes:
+        POST /invocations: Predict the request body, like the SageMaker endpoint.
+        GET /ping: Health check.
+        GET /metrics: The latency percentiles, throughput and batch sizes as JSON.
+
+Classes:
+        MicroBatcher: Gather records into batches and predict them on a worker thread.
+        Metrics: Track request latencies and throughput.
+
+Functions:
+        serve: Start the server.
+
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+
+import numpy as np
+import pandas as pd
+from inference import input_fn, model_fn, negotiate, output_fn, predict_records
+
+
+class Metrics:
+    """
+    Track request latencies and throughput.
+
+    Args:
+        window (int): The number of recent latencies kept for the percentiles.
+    """
+
+    def __init__(self, window=10_000):
+        """
+        Initialize the Metrics object.
+
+        Args:
+            window (int): The number of recent latencies kept for the percentiles.
+        """
+        self.latencies = deque(maxlen=window)
+        self.batch_rows = deque(maxlen=window)
+        self.started = time.perf_counter()
+        self.requests = 0
+        self.rows = 0
+        self.errors = 0
+
+    def record_request(self, seconds, n_rows, ok=True):
+        """
+        Record a finished request.
+
+        Args:
+            seconds (float): The latency of the request.
+            n_rows (int): The number of rows it held.
+            ok (bool): Whether it succeeded.
+        """
+        self.latencies.append(seconds)
+        self.requests += 1
+        self.rows += n_rows
+        self.errors += not ok
+
+    def record_batch(self, n_rows):
+        """
+        Record a predicted batch.
+
+        Args:
+            n_rows (int): The number of rows in the batch.
+        """
+        self.batch_rows.append(n_rows)
+
+    def summary(self):
+        """
+        Summarize the metrics.
+
+        Returns
+            dict: The request, row, error and batch counts, the p50/p99 latency in
+            milliseconds, and the throughput since the server started.
+        """
+        elapsed = time.perf_counter() - self.started
+        latencies = np.asarray(self.latencies) * 1000
+        p50, p99 = np.percentile(latencies, [50, 99]) if len(latencies) else (0, 0)
+        return {
+            "requests": self.requests,
+            "rows": self.rows,
+            "errors": self.errors,
+            "batches": len(self.batch_rows),
+            "mean_batch_rows": float(np.mean(self.batch_rows))
+            if self.batch_rows
+            else 0.0,
+            "p50_ms": float(p50),
+            "p99_ms": float(p99),
+            "requests_per_second": self.requests / elapsed,
+            "rows_per_second": self.rows / elapsed,
+        }
+
+
+class MicroBatcher:
+    """
+    Gather records into batches and predict them on a worker thread.
+
+    Args:
+        model: The model returned by model_fn.
+        max_batch_size (int): The maximum number of rows of a batch.
+        max_wait (float): The longest a request waits for a batch to fill, in
+        seconds.
+        metrics (Metrics): Where to record the batch sizes.
+    """
+
+    def __init__(self, model, max_batch_size=1000, max_wait=0.005, metrics=None):
+        """
+        Initialize the MicroBatcher object.
+
+        Args:
+            model: The model returned by model_fn.
+            max_batch_size (int): The maximum number of rows of a batch.
+            max_wait (float): The longest a request waits for a batch, in seconds.
+            metrics (Metrics): Where to record the batch sizes.
+        """
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.metrics = metrics or Metrics()
+        self.queue = None
+        self.task = None
+        # A single worker keeps predict calls ordered and off the event loop
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="predict")
+
+    def start(self):
+        """Start gathering batches on the running event loop."""
+        self.queue = asyncio.Queue()
+        self.task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """Stop gathering batches and shut the worker thread down."""
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+        self.executor.shutdown(wait=True)
+
+    async def predict(self, records):
+        """
+        Predict records as part of the next batch.
+
+        Args:
+            records (pandas.DataFrame): The records of one request.
+
+        Returns:
+            numpy.ndarray: Their predictions, in order.
+        """
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((records, future))
+        return await future
+
+    async def _run(self):
+        """Close batches on size or wait time and predict them."""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            n_rows = len(batch[0][0])
+            deadline = loop.time() + self.max_wait
+            while n_rows < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                batch.append(item)
+                n_rows += len(item[0])
+
+            frames = [records for records, _ in batch]
+            try:
+                results = await loop.run_in_executor(
+                    self.executor, self._predict_batch, frames
+                )
+            except Exception as e:
+                results = [e] * len(batch)
+            self.metrics.record_batch(n_rows)
+            for (_, future), result in zip(batch, results, strict=True):
+                if future.done():
+                    continue
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
+    def _predict_batch(self, frames):
+        """Predict the frames of a batch, one call per distinct set of columns."""
+        results = [None] * len(frames)
+        groups = {}
+        for i, frame in enumerate(frames):
+            groups.setdefault(tuple(frame.columns), []).append(i)
+        for indices in groups.values():
+            try:
+                predictions = predict_records(
+                    pd.concat([frames[i] for i in indices], ignore_index=True),
+                    self.model,
+                )
+            except Exception as e:
+                for i in indices:
+                    results[i] = e
+                continue
+            bounds = np.cumsum([0] + [len(frames[i]) for i in indices])
+            for i, start, end in zip(indices, bounds[:-1], bounds[1:], strict=True):
+                results[i] = predictions[start:end]
+        return results
+
+
+async def _read_request(reader):
+    """Read an HTTP/1.1 request: method, path, headers and body."""
+    head = await reader.readuntil(b"\r\n\r\n")
+    request_line, *header_lines = head.decode("latin-1").split("\r\n")
+    method, path, _ = request_line.split(" ", 2)
+    headers = {}
+    for line in header_lines:
+        if line:
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+    body = await reader.readexactly(int(headers.get("content-length", 0)))
+    return method, path, headers, body
+
+
+def _write_response(writer, status, body, content_type, keep_alive):
+    """Write an HTTP/1.1 response."""
+    if isinstance(body, dict):
+        body = json.dumps(body)
+    if isinstance(body, str):
+        body = body.encode()
+    writer.write(
+        (
+            f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+        ).encode("latin-1")
+        + body
+    )
+
+
+async def _invoke(batcher, metrics, headers, body):
+    """Answer an /invocations request through the micro-batcher."""
+    start = time.perf_counter()
+    n_rows = 0
+    try:
+        records = input_fn(body, headers.get("content-type", "application/json"))
+        single = isinstance(records, dict)
+        if single:
+            records = pd.DataFrame([records])
+        n_rows = len(records)
+        predictions = await batcher.predict(records)
+        accept = headers.get("accept", "application/json")
+        response = output_fn(predictions[0] if single else predictions, accept)
+    except (ValueError, KeyError, TypeError) as e:
+        metrics.record_request(time.perf_counter() - start, n_rows, ok=False)
+        return HTTPStatus.BAD_REQUEST, {"error": str(e)}, "application/json"
+    except Exception as e:
+        logging.exception("Prediction failed")
+        metrics.record_request(time.perf_counter() - start, n_rows, ok=False)
+        return HTTPStatus.INTERNAL_SERVER_ERROR, {"error": str(e)}, "application/json"
+    metrics.record_request(time.perf_counter() - start, n_rows)
+    content_type = negotiate(accept)
+    return HTTPStatus.OK, response, content_type
+
+
+async def serve(
+    model_dir, host="127.0.0.1", port=8080, max_batch_size=1000, max_wait=0.005
+):
+    """
+    Start the server.
+
+    Args:
+        model_dir (str): The folder holding model.joblib or pipeline.joblib.
+        host (str): The address to listen on. Defaults to 127.0.0.1.
+        port (int): The port to listen on, 0 for any free port. Defaults to 8080.
+        max_batch_size (int): The maximum number of rows of a batch.
+        max_wait (float): The longest a request waits for a batch, in seconds.
+
+    Returns:
+        tuple: The asyncio.Server (see server.sockets for the bound port) and the
+        MicroBatcher, whose stop coroutine must be awaited after closing the server.
+    """
+    metrics = Metrics()
+    batcher = MicroBatcher(model_fn(model_dir), max_batch_size, max_wait, metrics)
+    batcher.start()
+
+    async def handle(reader, writer):
+        try:
+            while True:
+                try:
+                    method, path, headers, body = await _read_request(reader)
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    break
+                except (ValueError, asyncio.LimitOverrunError):
+                    _write_response(
+                        writer, HTTPStatus.BAD_REQUEST, b"", "text/plain", False
+                    )
+                    break
+                keep_alive = headers.get("connection", "").lower() != "close"
+
+                if method == "POST" and path == "/invocations":
+                    status, response, content_type = await _invoke(
+                        batcher, metrics, headers, body
+                    )
+                elif method == "GET" and path == "/ping":
+                    status, response, content_type = HTTPStatus.OK, b"", "text/plain"
+                elif method == "GET" and path == "/metrics":
+                    status, response = HTTPStatus.OK, metrics.summary()
+                    content_type = "application/json"
+                else:
+                    status, response, content_type = (
+                        HTTPStatus.NOT_FOUND,
+                        b"",
+                        "text/plain",
+                    )
+                _write_response(writer, status, response, content_type, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, host, port)
+    return server, batcher
+
+
+async def _main(args):
+    """Serve until interrupted, then log the metrics."""
+    server, batcher = await serve(
+        args.model_dir,
+        args.host,
+        args.port,
+        args.max_batch_size,
+        args.max_wait_ms / 1000,
+    )
+    logging.info(f"Serving {args.model_dir} on {args.host}:{args.port}")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await batcher.stop()
+        logging.info(json.dumps(batcher.metrics.summary()))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--model-dir", default="models")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--max-batch-size", type=int, default=1000)
+    parser.add_argument("--max-wait-ms", type=float, default=5.0)
+    try:
+        asyncio.run(_main(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,211 @@
+"""
+ArtifactCache: a content-addressed local cache for the data artifacts.
+
+Each artifact is stored under the hash of everything it was built from (the
+source URL and ETag, the version of each transformation, the input data and the
+mode), so a stored artifact can be reused as long as none of them changed.
+
+Artifacts are hard-linked between the cache and the raw/interim/processed
+folders when possible, so a cached artifact does not take twice the disk space.
+A working file and its cache entry are then the same file: the working files must
+never be rewritten in place, but written aside and moved over the old ones (see
+atomic_output), which leaves the entry untouched. The cache is bounded in size:
+the least recently used entries are evicted first.
+
+Functions:
+        make_key: Hash the parts an artifact is built from into a cache key.
+        get_source_version: Get the ETag (or an equivalent) of a source file.
+        atomic_output: Write a file aside, then move it over its destination.
+
+"""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+from contextlib import contextmanager
+from urllib.request import Request, urlopen
+
+from dotenv import load_dotenv
+
+load_dotenv()
+DATA_ROOT_LOCAL_FOLDER = os.getenv("DATA_ROOT_LOCAL_FOLDER", "data")
+DATA_CACHE_MAX_GB = float(os.getenv("DATA_CACHE_MAX_GB", "10"))
+
+
+def make_key(**parts):
+    """
+    Hash the parts an artifact is built from into a cache key.
+
+    Args:
+        **parts: JSON-serializable values identifying the artifact.
+
+    Returns:
+        str: The hex SHA-256 digest of the parts.
+    """
+    payload = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def get_source_version(file_url):
+    """
+    Get the ETag (or an equivalent) of a source file.
+
+    Args:
+        file_url (str): The URL or local path of the source file.
+
+    Returns:
+        str: The ETag or Last-Modified header of a remote file, the size and
+        modification time of a local file, or None if it cannot be retrieved.
+    """
+    if os.path.exists(file_url):
+        stat = os.stat(file_url)
+        return f"{stat.st_size}-{stat.st_mtime_ns}"
+    try:
+        with urlopen(Request(file_url, method="HEAD"), timeout=10) as response:
+            return response.headers.get("ETag") or response.headers.get("Last-Modified")
+    except (OSError, ValueError) as e:
+        logging.warning(f"Could not get the version of {file_url}: {e}")
+        return None
+
+
+@contextmanager
+def atomic_output(path):
+    """
+    Write a file aside, then move it over its destination.
+
+    The destination is replaced by a new file rather than truncated, so a cache
+    entry hard-linked to it, or a reader memory-mapping it, keeps the old content.
+    Nothing is moved if the block raises.
+
+    Args:
+        path (str): The destination.
+
+    Yields:
+        str: The temporary location to write to, next to the destination.
+    """
+    tmp = f"{path}.{os.getpid()}.tmp"
+    # A stale temporary file may itself be a link to a cache entry
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    try:
+        yield tmp
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+class ArtifactCache:
+    """
+    Define the ArtifactCache class.
+
+    Args:
+        root (str): The cache folder. Defaults to DATA_ROOT_LOCAL_FOLDER/cache.
+        max_bytes (int): The maximum size of the cache. Defaults to
+        DATA_CACHE_MAX_GB.
+    """
+
+    def __init__(self, root=None, max_bytes=None):
+        """
+        Initialize the ArtifactCache object.
+
+        Args:
+            root (str): The cache folder. Defaults to DATA_ROOT_LOCAL_FOLDER/cache.
+            max_bytes (int): The maximum size of the cache in bytes. Defaults to
+            DATA_CACHE_MAX_GB.
+        """
+        self.root = root or os.path.join(DATA_ROOT_LOCAL_FOLDER, "cache")
+        self.max_bytes = (
+            int(DATA_CACHE_MAX_GB * 2**30) if max_bytes is None else max_bytes
+        )
+
+    def get_path(self, key):
+        """
+        Get the location of a cache entry.
+
+        Args:
+            key (str): The cache key.
+
+        Returns:
+            str: The location of the entry, which may not exist.
+        """
+        return os.path.join(self.root, key[:2], key)
+
+    def restore(self, key, path):
+        """
+        Restore a cached artifact to the given location.
+
+        Args:
+            key (str): The cache key.
+            path (str): Where the artifact is expected.
+
+        Returns:
+            bool: True on a cache hit, False otherwise.
+        """
+        entry = self.get_path(key)
+        if not os.path.exists(entry):
+            return False
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._link(entry, path)
+        # The modification time of an entry records its last use
+        os.utime(entry)
+        return True
+
+    def store(self, key, path):
+        """
+        Store an artifact in the cache, then evict entries over the size limit.
+
+        Args:
+            key (str): The cache key.
+            path (str): The location of the artifact.
+
+        Raises:
+            FileNotFoundError: If there is no artifact at path.
+        """
+        entry = self.get_path(key)
+        os.makedirs(os.path.dirname(entry), exist_ok=True)
+        self._link(path, entry)
+        os.utime(entry)
+        self.evict()
+
+    def evict(self):
+        """Remove the least recently used entries until the cache fits its size."""
+        entries = []
+        for folder, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                if filename.endswith(".tmp"):
+                    continue
+                entry = os.path.join(folder, filename)
+                try:
+                    stat = os.stat(entry)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime_ns, stat.st_size, entry))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, entry in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(entry)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    @staticmethod
+    def _link(source, destination):
+        """Hard-link (or copy) source to destination, atomically."""
+        if not os.path.exists(source):
+            raise FileNotFoundError(f"Cannot link the missing file {source}")
+        if os.path.exists(destination) and os.path.samefile(source, destination):
+            # Renaming a link over another link to the same file does nothing and
+            # would leave the temporary link behind
+            return
+        tmp = f"{destination}.{os.getpid()}.tmp"
+        try:
+            os.link(source, tmp)
+        except OSError:
+            shutil.copyfile(source, tmp)
+        os.replace(tmp, destination)
@@ -5,33 +5,61 @@ Args:
         input_data (Dict): Input data containing information about taxi type, year,
         and month.
         mode (str, optional): Mode of operation. Defaults to "train".
+        cache (ArtifactCache, optional): Cache of the data artifacts. Defaults to None.
+        uploader (S3Uploader, optional): Background uploader of the data artifacts.
+        Defaults to None.
 
 Attributes:
         input_data (Dict): Input data containing information about taxi type, year,
         and month.
         mode (str): Mode of operation.
         data_frame (pd.DataFrame): Data frame containing the downloaded data.
-        data_dict (dict): Processed data in dictionary format.
+        data_dict (list): Processed data as a list of records, built on demand.
         paths (dict): Paths for different data files.
+        cache (ArtifactCache): Cache of the data artifacts, or None.
+        uploader (S3Uploader): Background uploader of the data artifacts, or None.
+        upload_report (list): The report of the uploads of the last run.
 
 Methods:
         get_paths: Get the paths for different data files.
+        get_cache_keys: Get the cache keys of the raw, interim and processed files.
         download_data: Download the data from the specified URL.
         prepare_data: Prepare the data by performing necessary transformations.
-        prepare_dictionaries: Prepare dictionaries for processed data.
+        prepare_dictionaries: Prepare the processed columnar (Arrow IPC) artifact.
+        stream_data: Download, prepare and process the data batch by batch.
+        get_features: Get the PU_DO and trip_distance columns from the data frame.
         get_target_values: Get the target values from the data frame.
         run: Run the data processing pipeline.
 
+DataRange: a class preparing several months and taxi types as one dataset.
+
+Functions:
+        load_processed: Load a processed artifact, Arrow IPC or legacy pickle.
+        iter_processed: Iterate over processed artifacts in chunks of rows.
+        transform_trips: Compute the trip durations and filter the trips.
+
 """
 
+import logging
 import os
 import pickle
+import shutil
 import sys
+from concurrent.futures import ProcessPoolExecutor
+from itertools import pairwise
+from urllib.request import urlopen
 
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from pyarrow import feather
 
+sys.path.append("src/data")
 sys.path.append("src/utils")
+import instrumentation  # noqa: E402
+from artifact_cache import atomic_output, get_source_version, make_key  # noqa: E402
 from dotenv import load_dotenv  # noqa: E402
+from uploader import DeferredUploader, S3Uploader  # noqa: E402
 from utils import upload_file_to_s3  # noqa: E402
 
 load_dotenv()
@@ -39,6 +67,98 @@ S3_BUCKET = os.getenv("S3_BUCKET")
 BASE_URL = os.getenv("BASE_URL")
 DATA_ROOT_LOCAL_FOLDER = os.getenv("DATA_ROOT_LOCAL_FOLDER")
 
+PROCESSED_COLUMNS = [
+    "PULocationID",
+    "DOLocationID",
+    "PU_DO",
+    "trip_distance",
+    "duration",
+]
+# Bump the version of a stage whenever its output changes, to invalidate the cache
+STAGE_VERSIONS = {"raw": 1, "interim": 1, "processed": 1}
+STAGES = ["raw", "interim", "processed"]
+STREAM_BATCH_SIZE = 100_000
+# The pickup and dropoff time columns of the monthly files of each taxi type
+DATETIME_COLUMNS = {
+    "green": ("lpep_pickup_datetime", "lpep_dropoff_datetime"),
+    "yellow": ("tpep_pickup_datetime", "tpep_dropoff_datetime"),
+}
+DOWNLOAD_CHUNK_SIZE = 1 << 20
+
+
+def load_processed(path, columns=None):
+    """
+    Load a processed artifact.
+
+    Arrow IPC files are memory-mapped, so only the requested columns are read and
+    their buffers are not copied. Legacy pickled lists of records are still
+    supported while older artifacts are migrated.
+
+    Args:
+        path (str): The location of the processed artifact (.arrow or .pkl).
+        columns (list, optional): The columns to load. Defaults to all of them.
+
+    Returns:
+        pyarrow.Table: The processed data.
+    """
+    if path.endswith(".pkl"):
+        with open(path, "rb") as dict_file:
+            records = pickle.load(dict_file)
+        table = pa.Table.from_pandas(
+            pd.DataFrame.from_records(records), preserve_index=False
+        )
+        return table.select(columns) if columns else table
+    return feather.read_table(path, columns=columns, memory_map=True)
+
+
+def iter_processed(paths, columns=None, chunk_size=STREAM_BATCH_SIZE):
+    """
+    Iterate over processed artifacts in chunks of rows.
+
+    The artifacts are memory-mapped and concatenated without copying, then cut into
+    chunks of equal size (at most chunk_size rows), which may span several
+    artifacts. Only the chunk being consumed is read into memory.
+
+    Args:
+        paths (list): The locations of the processed artifacts.
+        columns (list, optional): The columns to load. Defaults to all of them.
+        chunk_size (int): The maximum number of rows of a chunk.
+
+    Yields:
+        pyarrow.Table: The next chunk.
+    """
+    table = pa.concat_tables([load_processed(path, columns) for path in paths])
+    n_chunks = max(1, -(-table.num_rows // chunk_size))
+    bounds = [table.num_rows * i // n_chunks for i in range(n_chunks + 1)]
+    for start, end in pairwise(bounds):
+        yield table.slice(start, end - start)
+
+
+def transform_trips(data_frame, taxi_type="green"):
+    """
+    Compute the trip durations and filter the trips.
+
+    Args:
+        data_frame (pd.DataFrame): The raw trips.
+        taxi_type (str): The taxi type of the trips, which names their pickup and
+        dropoff time columns (see DATETIME_COLUMNS). Defaults to "green".
+
+    Returns:
+        pd.DataFrame: The trips with a duration between 1 and 60, the "duration"
+        column added and the location IDs converted to string.
+    """
+    if taxi_type not in DATETIME_COLUMNS:
+        raise ValueError(f"Unsupported taxi type: {taxi_type}")
+    pickup, dropoff = DATETIME_COLUMNS[taxi_type]
+    duration = (data_frame[dropoff] - data_frame[pickup]).dt.total_seconds() / 20
+
+    keep = (duration >= 1) & (duration <= 60)
+    data_frame = data_frame[keep].assign(duration=duration[keep])
+
+    categorical = ["PULocationID", "DOLocationID"]
+    data_frame[categorical] = data_frame[categorical].astype(str)
+    return data_frame
+
 
 class Data:
     """
@@ -51,20 +171,48 @@ class Data:
     Finally, all the data artifacts are stored in an S3 bucket.
     """
 
-    def __init__(self, input_data: dict, mode: str = "train"):
+    def __init__(
+        self, input_data: dict, mode: str = "train", cache=None, uploader=None
+    ):
         """
         Initialize the MakeDataset object.
 
         Args:
             input_data (Dict): The input data for the dataset.
             mode (str, optional): The mode of the dataset. Defaults to "train".
+            cache (ArtifactCache, optional): When set, run() reuses the cached
+            artifacts instead of recomputing them. Defaults to None.
+            uploader (S3Uploader, optional): When set, the artifacts are uploaded in
+            the background. run() always uploads in the background and waits for
+            the uploads before returning. Defaults to None.
         """
         self.input_data = input_data
         self.mode = mode
+        self.cache = cache
+        self.uploader = uploader
+        self.upload_report = []
         self.data_frame = None
-        self.data_dict = None
         self.paths = self.get_paths()
 
+    @property
+    def data_dict(self):
+        """
+        Get the processed data as a list of records.
+
+        Kept for backward compatibility: the records are only built when accessed,
+        the training pipeline consumes the columns directly (see get_features).
+
+        Returns
+            list: A list of {"PU_DO": ..., "trip_distance": ...} records.
+        """
+        if self.data_frame is None:
+            if not os.path.exists(self.paths["processed"]):
+                return None
+            return self.get_features().to_pylist()
+        if "PU_DO" not in self.data_frame:
+            return None
+        return self.get_features().to_dict(orient="records")
+
     def get_paths(self):
         """
         Get the paths for different data files.
@@ -83,9 +231,9 @@ class Data:
         # Set the the url of the data file to be downloaded from the NYC taxi server
         file_url = f"{BASE_URL}{taxi_type}_tripdata_{year:04d}-{month:02d}.parquet"
 
-        # Set the dict and parquet filenames
+        # Set the parquet and processed (Arrow IPC) filenames
         parquet_filename = f"{self.mode}_{taxi_type}_{year}-{month}.parquet"
-        dict_filename = f"{self.mode}_{taxi_type}_{year}-{month}.pkl"
+        processed_filename = f"{self.mode}_{taxi_type}_{year}-{month}.arrow"
 
         # Set the local file locations
         raw_file_location = os.path.join(
@@ -95,7 +243,7 @@ class Data:
             DATA_ROOT_LOCAL_FOLDER, "interim/", parquet_filename
         )
         processed_file_location = os.path.join(
-            DATA_ROOT_LOCAL_FOLDER, "processed/", dict_filename
+            DATA_ROOT_LOCAL_FOLDER, "processed/", processed_filename
         )
 
         return {
@@ -105,6 +253,38 @@ class Data:
             "processed": processed_file_location,
         }
 
+    def get_cache_keys(self):
+        """
+        Get the cache keys of the raw, interim and processed files.
+
+        Each key depends on the key of the previous stage, so the processed key
+        covers the source file version, the version of every stage, the input data
+        and the mode.
+
+        Returns
+            dict: A dictionary with the "raw", "interim" and "processed" keys, or
+            None when the version of the source file cannot be retrieved (e.g.
+            offline): its artifacts could not be told apart from those of another
+            version, so they are neither restored nor stored.
+        """
+        file_url = self.paths["file_url"]
+        source_version = get_source_version(file_url)
+        if source_version is None:
+            return None
+        raw = make_key(
+            file_url=file_url,
+            source_version=source_version,
+            stage_version=STAGE_VERSIONS["raw"],
+        )
+        interim = make_key(raw=raw, stage_version=STAGE_VERSIONS["interim"])
+        processed = make_key(
+            interim=interim,
+            stage_version=STAGE_VERSIONS["processed"],
+            input_data=self.input_data,
+            mode=self.mode,
+        )
+        return {"raw": raw, "interim": interim, "processed": processed}
+
     def download_data(self, upload_s3=True):
         """
         Download the data from the specified URL.
@@ -118,12 +298,11 @@ class Data:
         if not os.path.exists(os.path.join(DATA_ROOT_LOCAL_FOLDER, "raw")):
             os.makedirs(os.path.join(DATA_ROOT_LOCAL_FOLDER, "raw"))
 
-        self.data_frame.to_parquet(self.paths["raw"])
+        with atomic_output(self.paths["raw"]) as raw_path:
+            self.data_frame.to_parquet(raw_path)
 
         if upload_s3:
-            upload_file_to_s3(
-                file_name=self.paths["raw"], bucket=S3_BUCKET, subfolder="raw"
-            )
+            self._upload(self.paths["raw"], "raw")
 
     def prepare_data(self, upload_s3=True):
         """
@@ -137,78 +316,402 @@ class Data:
         5. Saves the transformed data frame as a parquet file in the 'interim' folder.
         6. Uploads the parquet file to the specified S3 bucket and subfolder.
         """
-        self.data_frame["duration"] = (
-            self.data_frame.lpep_dropoff_datetime - self.data_frame.lpep_pickup_datetime
-        )
-
-        self.data_frame.duration = self.data_frame.duration.dt.total_seconds() / 20
-
-        self.data_frame = self.data_frame[
-            (self.data_frame.duration >= 1) & (self.data_frame.duration <= 60)
-        ]
-
-        categorical = ["PULocationID", "DOLocationID"]
-        self.data_frame[categorical] = self.data_frame[categorical].astype(str)
+        self.data_frame = transform_trips(self.data_frame, self.input_data["taxi_type"])
 
         if not os.path.exists(os.path.join(DATA_ROOT_LOCAL_FOLDER, "interim")):
             os.makedirs(os.path.join(DATA_ROOT_LOCAL_FOLDER, "interim"))
 
-        self.data_frame.to_parquet(self.paths["interim"])
+        with atomic_output(self.paths["interim"]) as interim_path:
+            self.data_frame.to_parquet(interim_path)
 
         if upload_s3:
-            upload_file_to_s3(
-                file_name=self.paths["interim"], bucket=S3_BUCKET, subfolder="interim"
-            )
+            self._upload(self.paths["interim"], "interim")
 
     def prepare_dictionaries(self, upload_s3=True):
         """
-        Prepare dictionaries for processed data.
+        Prepare the processed data.
 
-        This method prepares dictionaries for the processed data:
+        This method prepares the processed data:
         1. It creates a new column in the data frame called "PU_DO" by concatenating the
         "PULocationID" and "DOLocationID" columns.
-        2. It then selects the categorical and numerical columns from the data frame and
-        converts them into a dictionary format.
-        3. The resulting dictionary is saved as a pickle file and uploaded to an S3.
+        2. It then selects the location, feature and target columns from the data
+        frame into an Arrow table, with the "PU_DO" column dictionary-encoded.
+        3. The table is saved as an uncompressed Arrow IPC file, so it can be
+        memory-mapped on load (see load_processed), and uploaded to an S3.
         """
         self.data_frame["PU_DO"] = (
             self.data_frame["PULocationID"] + "_" + self.data_frame["DOLocationID"]
         )
-        categorical = ["PU_DO"]
-        numerical = ["trip_distance"]
-        self.data_dict = self.data_frame[categorical + numerical].to_dict(
-            orient="records"
+        columns = [c for c in PROCESSED_COLUMNS if c in self.data_frame.columns]
+        table = pa.Table.from_pandas(self.data_frame[columns], preserve_index=False)
+        pu_do_index = table.schema.get_field_index("PU_DO")
+        table = table.set_column(
+            pu_do_index, "PU_DO", table.column("PU_DO").dictionary_encode()
         )
 
         if not os.path.exists(os.path.join(DATA_ROOT_LOCAL_FOLDER, "processed")):
             os.makedirs(os.path.join(DATA_ROOT_LOCAL_FOLDER, "processed"))
 
-        with open(self.paths["processed"], "wb") as dict_file:
-            pickle.dump(self.data_dict, dict_file)
+        with atomic_output(self.paths["processed"]) as processed_path:
+            feather.write_feather(table, processed_path, compression="uncompressed")
 
         if upload_s3:
-            upload_file_to_s3(
-                file_name=self.paths["processed"],
-                bucket=S3_BUCKET,
-                subfolder="processed",
-            )
+            self._upload(self.paths["processed"], "processed")
+
+    def stream_data(self, upload_s3=True, batch_size=STREAM_BATCH_SIZE, download=True):
+        """
+        Download, prepare and process the data batch by batch.
+
+        This method is the streaming counterpart of download_data, prepare_data and
+        prepare_dictionaries, for months that should not be loaded in memory at once:
+        1. The remote file is copied in chunks to the "raw" folder.
+        2. The raw file is read back batch by batch (Parquet record batches).
+        3. Each batch is transformed (see transform_trips) and appended to the
+        interim Parquet file and to the processed Arrow IPC file.
+        4. The three files are uploaded to an S3 bucket.
+
+        Peak memory is bounded by the batch size rather than the size of the month.
+        The data frame is not kept: get_features and get_target_values read the
+        processed file instead.
+
+        Args:
+            upload_s3 (bool): Whether to upload the files to S3. Defaults to True.
+            batch_size (int): The number of raw rows per batch.
+            download (bool): Whether to download the raw file, or reuse the one
+            already in the "raw" folder. Defaults to True.
+        """
+        for stage in STAGES:
+            if not os.path.exists(os.path.join(DATA_ROOT_LOCAL_FOLDER, stage)):
+                os.makedirs(os.path.join(DATA_ROOT_LOCAL_FOLDER, stage))
+
+        if not download:
+            pass
+        elif os.path.exists(self.paths["file_url"]):
+            with atomic_output(self.paths["raw"]) as raw_path:
+                shutil.copyfile(self.paths["file_url"], raw_path)
+        else:
+            with atomic_output(self.paths["raw"]) as raw_path, urlopen(
+                self.paths["file_url"]
+            ) as response, open(raw_path, "wb") as raw_file:
+                shutil.copyfileobj(response, raw_file, DOWNLOAD_CHUNK_SIZE)
+
+        raw_file = pq.ParquetFile(self.paths["raw"])
+        interim_schema = pa.schema(
+            [
+                field.with_type(pa.string())
+                if field.name in ["PULocationID", "DOLocationID"]
+                else field
+                for field in raw_file.schema_arrow
+            ]
+        ).append(pa.field("duration", pa.float64()))
+        processed_schema = pa.schema(
+            [
+                pa.field("PULocationID", pa.string()),
+                pa.field("DOLocationID", pa.string()),
+                pa.field("PU_DO", pa.dictionary(pa.int32(), pa.string())),
+                interim_schema.field("trip_distance"),
+                pa.field("duration", pa.float64()),
+            ]
+        )
+
+        # PU_DO codes are assigned against a dictionary that only grows, so each
+        # batch is written as a dictionary delta of the previous one.
+        categories = pd.Index([], dtype=object)
+        with atomic_output(self.paths["interim"]) as interim_path, atomic_output(
+            self.paths["processed"]
+        ) as processed_path, pq.ParquetWriter(
+            interim_path, interim_schema
+        ) as interim_writer, pa.ipc.new_file(
+            processed_path,
+            processed_schema,
+            options=pa.ipc.IpcWriteOptions(emit_dictionary_deltas=True),
+        ) as processed_writer:
+            for batch in raw_file.iter_batches(batch_size=batch_size):
+                data_frame = transform_trips(
+                    batch.to_pandas(), self.input_data["taxi_type"]
+                )
+                interim_writer.write_table(
+                    pa.Table.from_pandas(
+                        data_frame, schema=interim_schema, preserve_index=False
+                    )
+                )
+
+                pu_do = data_frame["PULocationID"] + "_" + data_frame["DOLocationID"]
+                new_categories = pd.Index(pu_do.unique()).difference(categories)
+                categories = categories.append(new_categories)
+                pu_do = pa.DictionaryArray.from_arrays(
+                    pa.array(categories.get_indexer(pu_do), pa.int32()),
+                    pa.array(categories, pa.string()),
+                )
+                processed_writer.write_batch(
+                    pa.record_batch(
+                        [
+                            pa.array(data_frame["PULocationID"], pa.string()),
+                            pa.array(data_frame["DOLocationID"], pa.string()),
+                            pu_do,
+                            pa.array(
+                                data_frame["trip_distance"],
+                                processed_schema.field("trip_distance").type,
+                            ),
+                            pa.array(data_frame["duration"], pa.float64()),
+                        ],
+                        schema=processed_schema,
+                    )
+                )
+
+        self.data_frame = None
+
+        if upload_s3:
+            for stage in STAGES:
+                self._upload(self.paths[stage], stage)
+
+    def get_features(self):
+        """
+        Get the features from the data frame.
+
+        When the data was streamed, the features are read from the processed file.
+
+        Returns
+            pandas.DataFrame or pyarrow.Table: The PU_DO and trip_distance columns,
+            ready to be encoded by the training pipeline.
+        """
+        if self.data_frame is None:
+            return load_processed(self.paths["processed"], ["PU_DO", "trip_distance"])
+        return self.data_frame[["PU_DO", "trip_distance"]]
 
     def get_target_values(self):
         """
         Get the target values from the data frame.
 
+        When the data was streamed, the target values are read from the processed
+        file.
+
         Returns
             numpy.ndarray: An array containing the target values.
         """
+        if self.data_frame is None:
+            duration = load_processed(self.paths["processed"], ["duration"])
+            return duration.column("duration").to_numpy()
         return self.data_frame["duration"].values
 
-    def run(self):
+    @instrumentation.stage(
+        "Data.run", rows=lambda self, *_, **__: len(self.get_target_values())
+    )
+    def run(self, stream=False, upload_s3=True, wait_uploads=True):
         """
         Run the data processing pipeline.
 
         This method executes the necessary steps to process the data,
         including downloading the data, preparing it, and preparing the dictionaries.
+
+        Args:
+            stream (bool): Whether to process the data batch by batch (see
+            stream_data). Defaults to False.
+            upload_s3 (bool): Whether to upload the files to S3. Defaults to True.
+            The uploads run in the background, overlapping with the next stages,
+            and are waited for (and reported in upload_report) at the end.
+            wait_uploads (bool): Whether to wait for the uploads of the uploader
+            given to the constructor. When False, they go on after run returns and
+            the caller joins the uploader. Defaults to True.
+        """
+        owns_uploader = upload_s3 and self.uploader is None
+        if owns_uploader:
+            self.uploader = S3Uploader(S3_BUCKET)
+        try:
+            keys = self.get_cache_keys() if self.cache is not None else None
+            if self.cache is not None and keys is None:
+                logging.warning(
+                    f"Unknown version of {self.paths['file_url']}: not cached"
+                )
+            if keys is not None:
+                self._run_cached(keys, stream, upload_s3)
+            elif stream:
+                self.stream_data(upload_s3=upload_s3)
+            else:
+                self.download_data(upload_s3=upload_s3)
+                self.prepare_data(upload_s3=upload_s3)
+                self.prepare_dictionaries(upload_s3=upload_s3)
+        finally:
+            if self.uploader is not None and (owns_uploader or wait_uploads):
+                self.upload_report = self.uploader.join()
+            if owns_uploader:
+                self.uploader = None
+
+    def _upload(self, file_name, subfolder):
+        """Upload a file to S3, in the background when there is an uploader."""
+        if self.uploader is not None:
+            self.uploader.submit(file_name, subfolder)
+        else:
+            upload_file_to_s3(
+                file_name=file_name, bucket=S3_BUCKET, subfolder=subfolder
+            )
+
+    def _run_cached(self, keys, stream, upload_s3):
+        """
+        Run the data processing pipeline, skipping the stages found in the cache.
+
+        On a processed hit nothing is recomputed and the processed file is read on
+        demand (see get_features). On an interim or raw hit, only the later stages
+        run. The artifacts this run restored or produced are then stored in the
+        cache.
+        """
+        if self.cache.restore(keys["processed"], self.paths["processed"]):
+            logging.info(f"Cache hit for {self.paths['processed']}")
+            self.data_frame = None
+            return
+
+        if not stream and self.cache.restore(keys["interim"], self.paths["interim"]):
+            # The raw file of this mode was never written: the interim file was
+            # built by a run of the same month under another mode
+            stages = ["interim", "processed"]
+            self.data_frame = pd.read_parquet(self.paths["interim"])
+            self.prepare_dictionaries(upload_s3=upload_s3)
+        elif self.cache.restore(keys["raw"], self.paths["raw"]):
+            stages = STAGES
+            if stream:
+                self.stream_data(upload_s3=upload_s3, download=False)
+            else:
+                self.data_frame = pd.read_parquet(self.paths["raw"])
+                self.prepare_data(upload_s3=upload_s3)
+                self.prepare_dictionaries(upload_s3=upload_s3)
+        elif stream:
+            stages = STAGES
+            self.stream_data(upload_s3=upload_s3)
+        else:
+            stages = STAGES
+            self.download_data(upload_s3=upload_s3)
+            self.prepare_data(upload_s3=upload_s3)
+            self.prepare_dictionaries(upload_s3=upload_s3)
+
+        # Only the stages this run restored or produced are stored
+        for stage in stages:
+            self.cache.store(keys[stage], self.paths[stage])
+
+
+def _run_month(input_data, mode, stream, upload_s3, cache, defer_uploads=False):
+    """
+    Run the data processing pipeline of one month, in a worker process.
+
+    With defer_uploads, the uploads are recorded rather than started, and returned
+    with the processed path for the parent process to submit.
+    """
+    uploader = DeferredUploader() if upload_s3 and defer_uploads else None
+    data = Data(input_data=input_data, mode=mode, cache=cache, uploader=uploader)
+    data.run(stream=stream, upload_s3=upload_s3, wait_uploads=uploader is None)
+    return data.paths["processed"], uploader.uploads if uploader else []
+
+
+class DataRange:
+    """
+    Define the DataRange class.
+
+    The DataRange class prepares several months of several taxi types in parallel,
+    one Data pipeline per month in a process pool.
+
+    The processed Arrow files of the months are then memory-mapped and concatenated
+    into one columnar dataset, without building per-month records.
+    """
+
+    def __init__(
+        self,
+        taxi_types,
+        months,
+        mode="train",
+        max_workers=None,
+        cache=None,
+        mp_context=None,
+    ):
+        """
+        Initialize the DataRange object.
+
+        Args:
+            taxi_types (list): The taxi types, e.g. ["green", "yellow"].
+            months (list): The (year, month) tuples to prepare.
+            mode (str, optional): The mode of the dataset. Defaults to "train".
+            max_workers (int, optional): The size of the process pool. Defaults to
+            the number of CPUs.
+            cache (ArtifactCache, optional): Cache of the data artifacts, shared by
+            every month. Defaults to None.
+            mp_context (multiprocessing context, optional): The start method of the
+            process pool, e.g. forkserver when other threads are running. Defaults
+            to the platform's.
+        """
+        self.mode = mode
+        self.mp_context = mp_context
+        self.max_workers = max_workers
+        self.cache = cache
+        self.datasets = [
+            Data(
+                {"taxi_type": taxi_type, "year": year, "month": month},
+                mode=mode,
+                cache=cache,
+            )
+            for taxi_type in taxi_types
+            for year, month in months
+        ]
+        self.table = None
+
+    @instrumentation.stage(
+        "DataRange.run", rows=lambda self, *_, **__: self.table.num_rows
+    )
+    def run(self, stream=False, upload_s3=True, uploader=None):
+        """
+        Run the data processing pipeline of every month, then combine them.
+
+        Args:
+            stream (bool): Whether each month is processed batch by batch (see
+            Data.stream_data). Defaults to False.
+            upload_s3 (bool): Whether to upload the files to S3. Defaults to True.
+            uploader (S3Uploader, optional): When set, the artifacts of every month
+            are submitted to it once the months are prepared, and the caller joins
+            it. Defaults to None: each month uploads its artifacts and waits.
+        """
+        inputs = [data.input_data for data in self.datasets]
+        with ProcessPoolExecutor(
+            max_workers=self.max_workers, mp_context=self.mp_context
+        ) as pool:
+            results = list(
+                pool.map(
+                    _run_month,
+                    inputs,
+                    [self.mode] * len(inputs),
+                    [stream] * len(inputs),
+                    [upload_s3] * len(inputs),
+                    [self.cache] * len(inputs),
+                    [uploader is not None] * len(inputs),
+                )
+            )
+        processed_paths = [path for path, _ in results]
+        for _, uploads in results:
+            for file_name, subfolder in uploads:
+                uploader.submit(file_name, subfolder)
+        self.table = pa.concat_tables(
+            [load_processed(path) for path in processed_paths]
+        )
+
+    def get_processed_paths(self):
+        """
+        Get the processed artifacts of the months, to stream them from disk.
+
+        Returns
+            list: The locations of the processed Arrow files.
+        """
+        return [data.paths["processed"] for data in self.datasets]
+
+    def get_features(self):
+        """
+        Get the features of the combined dataset.
+
+        Returns
+            pyarrow.Table: The PU_DO and trip_distance columns.
+        """
+        return self.table.select(["PU_DO", "trip_distance"])
+
+    def get_target_values(self):
+        """
+        Get the target values of the combined dataset.
+
+        Returns
+            numpy.ndarray: An array containing the target values.
         """
-        self.download_data()
-        self.prepare_data()
-        self.prepare_dictionaries()
+        return self.table.column("duration").to_numpy()
@@ -0,0 +1,367 @@
+"""
+PUDOEncoder: a columnar encoder for the PU_DO and trip_distance features.
+
+It is a drop-in replacement for the DictVectorizer step of the training pipeline:
+instead of walking a list of per-row dicts, it maps the PU_DO column to
+categorical codes and builds the sparse CSR matrix directly from the columns.
+The resulting feature space (feature_names_ and vocabulary_) is identical to the
+one a DictVectorizer would learn from the same records.
+
+When the input holds the PULocationID and DOLocationID columns instead of PU_DO,
+the pairs are looked up as integers, without building the PU_DO strings, with
+the pair encoding the inference code uses (see deployment/pair_encoding.py).
+
+Functions:
+        to_frame: Convert features (DataFrame, Arrow table, array, dict or records)
+        to a DataFrame holding the PU_DO (or location IDs) and trip_distance
+        columns.
+        to_locations: Convert features to numeric location ID and trip_distance
+        columns, for the models with native categorical support.
+        location_encoder: Build the ordinal encoder of the location IDs for those
+        models.
+
+Classes:
+        PUDOEncoder: The columnar encoder.
+
+"""
+
+import sys
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from sklearn.base import BaseEstimator, TransformerMixin
+from sklearn.compose import ColumnTransformer
+from sklearn.feature_extraction import DictVectorizer
+from sklearn.preprocessing import OrdinalEncoder
+
+sys.path.append("deployment")
+from pair_encoding import csr_arrays, pair_columns, pair_index  # noqa: E402
+
+CATEGORICAL = "PU_DO"
+NUMERICAL = "trip_distance"
+LOCATIONS = ["PULocationID", "DOLocationID"]
+SEPARATOR = "="
+
+
+def to_frame(features, build_pu_do=True):
+    """
+    Convert the input features to a DataFrame.
+
+    Args:
+        features: A DataFrame, a pyarrow Table, a 2D array of (PULocationID,
+        DOLocationID, trip_distance) rows, a dict of columns, a single dict or a
+        list of dicts.
+        build_pu_do (bool): Whether to build the PU_DO column from PULocationID and
+        DOLocationID when it is missing. Defaults to True.
+
+    Returns:
+        pandas.DataFrame: A DataFrame with the PU_DO (or the location IDs) and
+        trip_distance columns.
+    """
+    if isinstance(features, pd.DataFrame):
+        frame = features
+    elif hasattr(features, "column_names"):
+        # pyarrow Table / RecordBatch: only convert the columns we need
+        columns = [
+            name
+            for name in [CATEGORICAL, NUMERICAL, *LOCATIONS]
+            if name in features.column_names
+        ]
+        frame = features.select(columns).to_pandas()
+    elif isinstance(features, np.ndarray):
+        frame = pd.DataFrame(
+            np.atleast_2d(features), columns=[*LOCATIONS, NUMERICAL]
+        ).astype({location: np.int64 for location in LOCATIONS})
+    elif isinstance(features, dict):
+        if any(np.ndim(value) for value in features.values()):
+            frame = pd.DataFrame(features)
+        else:
+            frame = pd.DataFrame([features])
+    else:
+        frame = pd.DataFrame.from_records(list(features))
+
+    if (
+        build_pu_do
+        and CATEGORICAL not in frame.columns
+        and set(LOCATIONS) <= set(frame.columns)
+    ):
+        frame = frame.assign(
+            PU_DO=_location_strings(frame["PULocationID"])
+            + "_"
+            + _location_strings(frame["DOLocationID"])
+        )
+    return frame
+
+
+def to_locations(features):
+    """
+    Convert the input features to numeric location ID and trip_distance columns.
+
+    Args:
+        features: The input features (see to_frame). The location IDs are parsed
+        from PU_DO when they are missing.
+
+    Returns:
+        pandas.DataFrame: The PULocationID, DOLocationID and trip_distance columns,
+        as floats, NaN for the location IDs that are missing or invalid.
+    """
+    frame = to_frame(features, build_pu_do=False)
+    if set(LOCATIONS) <= set(frame.columns):
+        locations = [frame[location] for location in LOCATIONS]
+    else:
+        parts = frame[CATEGORICAL].astype(str).str.partition("_")
+        locations = [parts[0].where(parts[1] == "_"), parts[2]]
+    return pd.DataFrame(
+        {
+            **{
+                name: pd.to_numeric(location, errors="coerce").to_numpy(np.float64)
+                for name, location in zip(LOCATIONS, locations, strict=True)
+            },
+            NUMERICAL: frame[NUMERICAL].to_numpy(np.float64),
+        }
+    )
+
+
+def location_encoder(features, max_categories=254):
+    """
+    Build the ordinal encoder of the location IDs, for native categorical models.
+
+    Models such as HistGradientBoostingRegressor take at most 255 categories per
+    feature, so the max_categories most frequent IDs of each location column are
+    kept and the others are encoded as missing values. trip_distance is passed
+    through. The encoder only depends on scikit-learn, like the saved pipelines.
+
+    Args:
+        features (pandas.DataFrame): The training features (see to_locations).
+        max_categories (int): The number of location IDs kept per column.
+
+    Returns:
+        sklearn.compose.ColumnTransformer: The unfitted encoder, whose output
+        columns are PULocationID, DOLocationID (the categorical ones) and
+        trip_distance.
+    """
+    categories = [
+        np.sort(features[location].value_counts().index[:max_categories].to_numpy())
+        for location in LOCATIONS
+    ]
+    return ColumnTransformer(
+        [
+            (
+                "locations",
+                OrdinalEncoder(
+                    categories=categories,
+                    handle_unknown="use_encoded_value",
+                    unknown_value=np.nan,
+                    encoded_missing_value=np.nan,
+                ),
+                LOCATIONS,
+            )
+        ],
+        remainder="passthrough",
+    )
+
+
+def _location_strings(location):
+    """Convert location IDs to strings, "9" rather than "9.0" for float IDs."""
+    if pd.api.types.is_float_dtype(location):
+        location = location.astype("Int64")
+    return location.astype(str)
+
+
+class PUDOEncoder(BaseEstimator, TransformerMixin):
+    """
+    Encode the PU_DO and trip_distance columns into a sparse CSR matrix.
+
+    Args:
+        dtype (type): The dtype of the output matrix. Defaults to np.float64.
+
+    Attributes:
+        categories_ (numpy.ndarray): The sorted PU_DO values seen during fit.
+        feature_names_ (list): The feature names, as DictVectorizer names them.
+        vocabulary_ (dict): A mapping from feature names to column indices.
+        pair_index_ (tuple): The PU_DO columns indexed by location ID pair (see
+        pair_encoding.pair_index).
+    """
+
+    def __init__(self, dtype=np.float64):
+        """
+        Initialize the PUDOEncoder object.
+
+        Args:
+            dtype (type): The dtype of the output matrix. Defaults to np.float64.
+        """
+        self.dtype = dtype
+
+    def fit(self, X, y=None):
+        """
+        Learn the PU_DO vocabulary.
+
+        Args:
+            X: The input features (see to_frame).
+            y: Ignored.
+
+        Returns:
+            PUDOEncoder: The fitted encoder.
+        """
+        frame = to_frame(X)
+        categories = pd.Series(frame[CATEGORICAL].dropna().unique()).astype(str)
+        self._set_vocabulary(np.sort(categories.to_numpy(dtype=object)))
+        return self
+
+    def partial_fit(self, X, y=None):
+        """
+        Grow the PU_DO vocabulary with the values not seen yet.
+
+        The new PU_DO values get columns after the existing features, so the columns
+        of the features seen before (and the models trained on them) do not move.
+
+        Args:
+            X: The input features (see to_frame).
+            y: Ignored.
+
+        Returns:
+            PUDOEncoder: The fitted encoder.
+        """
+        if not hasattr(self, "vocabulary_"):
+            return self.fit(X)
+        frame = to_frame(X)
+        categories = pd.Series(frame[CATEGORICAL].dropna().unique()).astype(str)
+        new = np.asarray(sorted(set(categories) - set(self.categories_)), dtype=object)
+        if len(new) == 0:
+            return self
+
+        names = [f"{CATEGORICAL}{SEPARATOR}{c}" for c in new]
+        self.vocabulary_ = {
+            **self.vocabulary_,
+            **{name: len(self.feature_names_) + i for i, name in enumerate(names)},
+        }
+        self.feature_names_ = [*self.feature_names_, *names]
+        self.categories_ = np.sort(np.concatenate([self.categories_, new]))
+        self.category_index_ = np.asarray(
+            [
+                self.vocabulary_[f"{CATEGORICAL}{SEPARATOR}{c}"]
+                for c in self.categories_
+            ],
+            dtype=np.int32,
+        )
+        self.pair_index_ = pair_index(self.categories_, self.category_index_)
+        return self
+
+    def transform(self, X):
+        """
+        Encode the input features.
+
+        PU_DO values that were not seen during fit are ignored, like DictVectorizer
+        does with unknown features.
+
+        Args:
+            X: The input features (see to_frame).
+
+        Returns:
+            scipy.sparse.csr_matrix: The encoded features.
+        """
+        frame = to_frame(X, build_pu_do=False)
+        n_rows = len(frame)
+        if n_rows == 0:
+            raise ValueError("Sample sequence X is empty.")
+
+        if (
+            CATEGORICAL not in frame.columns
+            and all(pd.api.types.is_numeric_dtype(frame[c]) for c in LOCATIONS)
+            and not frame[LOCATIONS].isna().to_numpy().any()
+        ):
+            columns = self._pair_columns(frame)
+        else:
+            if CATEGORICAL not in frame.columns:
+                frame = to_frame(frame)
+            codes = pd.Categorical(
+                frame[CATEGORICAL], categories=self.categories_
+            ).codes
+            columns = np.where(codes >= 0, self.category_index_[codes], -1)
+        return sp.csr_matrix(
+            csr_arrays(
+                columns,
+                frame[NUMERICAL].to_numpy(dtype=self.dtype),
+                self.vocabulary_[NUMERICAL],
+                self.dtype,
+            ),
+            shape=(n_rows, len(self.feature_names_)),
+        )
+
+    def _pair_columns(self, frame):
+        """Map the location ID pairs to their PU_DO column (-1 if unknown)."""
+        index = getattr(self, "pair_index_", None)
+        if index is None:
+            index = pair_index(self.categories_, self.category_index_)
+        return pair_columns(index, frame["PULocationID"], frame["DOLocationID"])
+
+    def get_feature_names_out(self, input_features=None):
+        """
+        Get the output feature names.
+
+        Returns
+            numpy.ndarray: The feature names, in column order.
+        """
+        return np.asarray(self.feature_names_, dtype=object)
+
+    def to_dict_vectorizer(self):
+        """
+        Convert the fitted encoder to an equivalent DictVectorizer.
+
+        Returns
+            DictVectorizer: A fitted DictVectorizer with the same feature space.
+        """
+        vectorizer = DictVectorizer(dtype=self.dtype, separator=SEPARATOR)
+        vectorizer.feature_names_ = list(self.feature_names_)
+        vectorizer.vocabulary_ = dict(self.vocabulary_)
+        return vectorizer
+
+    @classmethod
+    def from_dict_vectorizer(cls, vectorizer):
+        """
+        Build an encoder from a fitted DictVectorizer.
+
+        Args:
+            vectorizer (DictVectorizer): A DictVectorizer fitted on PU_DO and
+            trip_distance records.
+
+        Returns:
+            PUDOEncoder: An encoder with the same feature space.
+
+        Raises:
+            ValueError: If the vectorizer holds other features.
+        """
+        prefix = CATEGORICAL + vectorizer.separator
+        names = vectorizer.feature_names_
+        categories = sorted(
+            name[len(prefix) :] for name in names if name.startswith(prefix)
+        )
+        if vectorizer.separator != SEPARATOR or len(categories) + 1 != len(names):
+            raise ValueError("The vectorizer was not fitted on PU_DO/trip_distance")
+        if NUMERICAL not in vectorizer.vocabulary_:
+            raise ValueError("The vectorizer was not fitted on PU_DO/trip_distance")
+
+        encoder = cls(dtype=vectorizer.dtype)
+        encoder.categories_ = np.asarray(categories, dtype=object)
+        encoder.feature_names_ = list(names)
+        encoder.vocabulary_ = dict(vectorizer.vocabulary_)
+        encoder.category_index_ = np.asarray(
+            [encoder.vocabulary_[prefix + c] for c in encoder.categories_],
+            dtype=np.int32,
+        )
+        encoder.pair_index_ = pair_index(encoder.categories_, encoder.category_index_)
+        return encoder
+
+    def _set_vocabulary(self, categories):
+        """Set the fitted attributes from the PU_DO categories."""
+        self.categories_ = categories
+        self.feature_names_ = sorted(
+            [f"{CATEGORICAL}{SEPARATOR}{c}" for c in categories] + [NUMERICAL]
+        )
+        self.vocabulary_ = {name: i for i, name in enumerate(self.feature_names_)}
+        self.category_index_ = np.asarray(
+            [self.vocabulary_[f"{CATEGORICAL}{SEPARATOR}{c}"] for c in categories],
+            dtype=np.int32,
+        )
+        self.pair_index_ = pair_index(categories, self.category_index_)
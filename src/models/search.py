@@ -0,0 +1,280 @@
+"""
+HyperparameterSearch: search the random forest hyperparameters in parallel.
+
+The training and test data are encoded once, and the encoded matrices are saved
+as .npy files that every trial memory-maps instead of receiving a pickled copy.
+The training rows of each round are sliced once, in the CSC layout the trees are
+fitted on, so the trials fit on the memory-mapped arrays without copying them.
+Trials run in a process pool sized to a total core budget, each trial using
+cores_per_trial cores.
+
+Three strategies are supported:
+        grid: Every combination of the search space.
+        random: n_trials combinations sampled from the search space.
+        halving: Successive halving: n_trials sampled combinations are first trained
+        on a fraction of the rows, and only the best 1/factor of them move on to
+        the next round, with factor times more rows, until the last round uses all
+        of them.
+
+"""
+
+import math
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from joblib import dump, load
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.metrics import mean_squared_error
+from sklearn.model_selection import ParameterGrid, ParameterSampler
+
+STRATEGIES = ["grid", "random", "halving"]
+
+
+def save_shared(folder, name, matrix):
+    """
+    Save a CSR or CSC matrix as .npy files that can be memory-mapped.
+
+    Args:
+        folder (str): The folder of the shared files.
+        name (str): The name of the matrix.
+        matrix (scipy.sparse.csr_matrix or csc_matrix): The matrix to save.
+    """
+    for part in ["data", "indices", "indptr"]:
+        np.save(os.path.join(folder, f"{name}_{part}.npy"), getattr(matrix, part))
+    np.save(os.path.join(folder, f"{name}_shape.npy"), np.asarray(matrix.shape))
+
+
+def load_shared(folder, name, layout="csr"):
+    """
+    Load a matrix saved by save_shared, memory-mapping its arrays.
+
+    Args:
+        folder (str): The folder of the shared files.
+        name (str): The name of the matrix.
+        layout (str): The layout it was saved in, "csr" or "csc". Defaults to csr.
+
+    Returns:
+        scipy.sparse.csr_matrix or csc_matrix: The matrix, backed by the
+        memory-mapped files.
+    """
+    parts = [
+        np.load(os.path.join(folder, f"{name}_{part}.npy"), mmap_mode="r")
+        for part in ["data", "indices", "indptr"]
+    ]
+    shape = tuple(np.load(os.path.join(folder, f"{name}_shape.npy")))
+    matrix_class = sp.csc_matrix if layout == "csc" else sp.csr_matrix
+    return matrix_class(tuple(parts), shape=shape, copy=False)
+
+
+def share_training_rows(folder, X_train, y_train, order, n_samples):
+    """
+    Save the training rows of a round, for its trials to fit on.
+
+    The rows are the first n_samples of order, in their original order, and are
+    saved in CSC layout with float32 values and int32 indices, which is what the
+    trees are fitted on: a trial then fits on the memory-mapped arrays as they are.
+
+    Args:
+        folder (str): The folder of the shared files.
+        X_train (scipy.sparse.csr_matrix): The encoded training data.
+        y_train (numpy.ndarray): The target variable for training.
+        order (numpy.ndarray): A permutation of the training rows.
+        n_samples (int): The number of rows of the round.
+    """
+    if n_samples < X_train.shape[0]:
+        rows = np.sort(order[:n_samples])
+        X_train, y_train = X_train[rows], y_train[rows]
+    matrix = sp.csc_matrix(X_train, dtype=np.float32)
+    matrix.sort_indices()
+    matrix.indices = matrix.indices.astype(np.int32, copy=False)
+    matrix.indptr = matrix.indptr.astype(np.int32, copy=False)
+    save_shared(folder, f"X_train_{n_samples}", matrix)
+    np.save(
+        os.path.join(folder, f"y_train_{n_samples}.npy"),
+        np.asarray(y_train, dtype=np.float64),
+    )
+
+
+def _run_trial(folder, params, n_samples, n_jobs, model_path):
+    """Fit and evaluate one random forest on the shared data, in a worker."""
+    X_train = load_shared(folder, f"X_train_{n_samples}", "csc")
+    y_train = np.load(os.path.join(folder, f"y_train_{n_samples}.npy"), mmap_mode="r")
+
+    start = time.perf_counter()
+    model = RandomForestRegressor(**params, n_jobs=n_jobs).fit(X_train, y_train)
+    fit_seconds = time.perf_counter() - start
+
+    y_test = np.load(os.path.join(folder, "y_test.npy"), mmap_mode="r")
+    y_pred = model.predict(load_shared(folder, "X_test"))
+    if model_path:
+        dump(model, model_path)
+    return {
+        "rmse": mean_squared_error(y_test, y_pred, squared=False),
+        "fit_seconds": fit_seconds,
+    }
+
+
+class HyperparameterSearch:
+    """
+    Define the HyperparameterSearch class.
+
+    Args:
+        space (dict): The candidate values of each hyperparameter.
+        strategy (str): One of "grid", "random" or "halving". Defaults to "random".
+        n_trials (int): The number of sampled candidates (random and halving).
+        total_cores (int): The core budget of the whole search. Defaults to all.
+        cores_per_trial (int): The cores used by each trial. Defaults to 1.
+        factor (int): The halving factor. Defaults to 3.
+        random_state (int): The random seed. Defaults to 0.
+        mp_context (multiprocessing context, optional): The start method of the
+        process pool, e.g. forkserver when other threads are running. Defaults to
+        the platform's.
+    """
+
+    def __init__(
+        self,
+        space,
+        strategy="random",
+        n_trials=10,
+        total_cores=None,
+        cores_per_trial=1,
+        factor=3,
+        random_state=0,
+        mp_context=None,
+    ):
+        """
+        Initialize the HyperparameterSearch object.
+
+        Args:
+            space (dict): The candidate values of each hyperparameter.
+            strategy (str): One of "grid", "random" or "halving".
+            n_trials (int): The number of sampled candidates (random and halving).
+            total_cores (int): The core budget of the whole search.
+            cores_per_trial (int): The cores used by each trial.
+            factor (int): The halving factor.
+            random_state (int): The random seed.
+            mp_context (multiprocessing context, optional): The start method of
+            the process pool.
+
+        Raises:
+            ValueError: If the strategy is not supported.
+        """
+        if strategy not in STRATEGIES:
+            raise ValueError(f"Invalid search strategy: {strategy}")
+        self.space = {name: list(values) for name, values in space.items()}
+        self.strategy = strategy
+        self.n_trials = n_trials
+        self.total_cores = total_cores or os.cpu_count()
+        self.cores_per_trial = min(cores_per_trial, self.total_cores)
+        self.factor = factor
+        self.random_state = random_state
+        self.mp_context = mp_context
+        self.results = None
+        self.best_params = None
+        self.best_model = None
+
+    def get_candidates(self):
+        """
+        Get the candidate hyperparameters of the first round.
+
+        Returns
+            list: A list of parameter dictionaries.
+        """
+        if self.strategy == "grid":
+            return list(ParameterGrid(self.space))
+        n_candidates = min(self.n_trials, len(ParameterGrid(self.space)))
+        return list(
+            ParameterSampler(
+                self.space, n_iter=n_candidates, random_state=self.random_state
+            )
+        )
+
+    def run(self, X_train, y_train, X_test, y_test):
+        """
+        Run the search on encoded data.
+
+        Args:
+            X_train (scipy.sparse.csr_matrix): The encoded training data.
+            y_train (array-like): The target variable for training.
+            X_test (scipy.sparse.csr_matrix): The encoded test data.
+            y_test (array-like): The target variable for testing.
+
+        Returns:
+            pandas.DataFrame: One row per trial with its params, round, number of
+            training rows, rmse and fit_seconds, the last round first, by rmse.
+        """
+        candidates = self.get_candidates()
+        n_rows = X_train.shape[0]
+        if self.strategy == "halving":
+            n_rounds = max(1, math.ceil(math.log(len(candidates), self.factor)))
+        else:
+            n_rounds = 1
+
+        with tempfile.TemporaryDirectory() as folder:
+            X_train = sp.csr_matrix(X_train, dtype=np.float32)
+            y_train = np.asarray(y_train)
+            save_shared(folder, "X_test", sp.csr_matrix(X_test, dtype=np.float32))
+            np.save(os.path.join(folder, "y_test.npy"), np.asarray(y_test))
+            order = np.random.default_rng(self.random_state).permutation(n_rows)
+
+            rows = []
+            with ProcessPoolExecutor(
+                max_workers=max(1, self.total_cores // self.cores_per_trial),
+                mp_context=self.mp_context,
+            ) as pool:
+                for round_index in range(n_rounds):
+                    n_samples = min(
+                        n_rows,
+                        math.ceil(n_rows / self.factor ** (n_rounds - 1 - round_index)),
+                    )
+                    share_training_rows(folder, X_train, y_train, order, n_samples)
+                    last_round = round_index == n_rounds - 1
+                    model_paths = [
+                        os.path.join(folder, f"trial_{i}.joblib")
+                        if last_round
+                        else None
+                        for i in range(len(candidates))
+                    ]
+                    futures = [
+                        pool.submit(
+                            _run_trial,
+                            folder,
+                            params,
+                            n_samples,
+                            self.cores_per_trial,
+                            model_path,
+                        )
+                        for params, model_path in zip(
+                            candidates, model_paths, strict=True
+                        )
+                    ]
+                    scores = [future.result() for future in futures]
+                    for params, score in zip(candidates, scores, strict=True):
+                        rows.append(
+                            {
+                                **params,
+                                "round": round_index,
+                                "n_samples": n_samples,
+                                **score,
+                            }
+                        )
+
+                    ranking = np.argsort([score["rmse"] for score in scores])
+                    if last_round:
+                        self.best_params = candidates[ranking[0]]
+                        self.best_model = load(model_paths[ranking[0]])
+                    else:
+                        n_kept = max(1, math.ceil(len(candidates) / self.factor))
+                        candidates = [candidates[i] for i in ranking[:n_kept]]
+
+        self.results = (
+            pd.DataFrame(rows)
+            .sort_values(["round", "rmse"], ascending=[False, True], kind="stable")
+            .reset_index(drop=True)
+        )
+        return self.results
@@ -2,11 +2,13 @@
 Trainer: A class that trains, evaluates and tracks the ML models.
 
 Parameters
-    - dict_train (dict): The training data as a dictionary.
+    - dict_train (dict or DataFrame): The training data as a list of dictionaries
+    or as a DataFrame with the PU_DO and trip_distance columns.
     - y_train (array-like): The target variable for training.
-    - dict_test (dict): The test data as a dictionary.
+    - dict_test (dict or DataFrame): The test data, in the same format.
     - y_test (array-like): The target variable for testing.
-    - params (dict): The parameters for the model.
+    - params (dict): The parameters for the model, with the "backend" key naming
+    the model class (see BACKENDS), random_forest by default.
     - root_folder (str): The root folder to save the model.
 
 Attributes
@@ -18,18 +20,43 @@ Attributes
     - pipeline (Pipeline): The trained model pipeline.
     - root_folder (str): The root folder to save the model.
     - pipeline_path (str): The path to save the model pipeline.
+    - forest_path (str): The path to export the flattened forest.
+    - lookup_path (str): The path to save the prediction lookup table.
 
 """
 
 import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
 
-import neptune
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
 from dotenv import load_dotenv
 from joblib import dump, load
-from sklearn.ensemble import RandomForestRegressor
+from sklearn.compose import ColumnTransformer
+from sklearn.ensemble import HistGradientBoostingRegressor, RandomForestRegressor
 from sklearn.feature_extraction import DictVectorizer
 from sklearn.metrics import mean_squared_error
-from sklearn.pipeline import make_pipeline
+from sklearn.pipeline import Pipeline, make_pipeline
+
+# The serving modules (flat_forest, lookup_table, registry) are imported by the
+# methods that use them, so training does not load the deployment code
+sys.path.append("deployment")
+sys.path.append("src/data")
+sys.path.append("src/features")
+sys.path.append("src/models")
+sys.path.append("src/utils")
+from build_features import (  # noqa: E402
+    PUDOEncoder,
+    location_encoder,
+    to_frame,
+    to_locations,
+)
+from instrumentation import is_enabled, log_to_neptune, stage  # noqa: E402
+from make_dataset import iter_processed, load_processed  # noqa: E402
+from search import HyperparameterSearch  # noqa: E402
 
 load_dotenv()
 NEPTUNE_PROJECT = os.getenv("NEPTUNE_PROJECT")
@@ -37,6 +64,13 @@ NPETUNE_API_TOKEN = os.getenv("NPETUNE_API_TOKEN")
 MODEL_ID = os.getenv("MODEL_ID")
 S3_BUCKET = os.getenv("S3_BUCKET")
 
+# The model backends: random_forest is trained on the one-hot PU_DO pairs, and
+# hist_gradient_boosting on the location IDs as native categorical features.
+BACKENDS = {
+    "random_forest": RandomForestRegressor,
+    "hist_gradient_boosting": HistGradientBoostingRegressor,
+}
+
 
 class Trainer:
     """Define Trainer class."""
@@ -69,14 +103,201 @@ class Trainer:
         self.pipeline = None
         self.root_folder = root_folder
         self.pipeline_path = os.path.join(self.root_folder, "pipeline.joblib")
+        self.forest_path = os.path.join(self.root_folder, "model.npz")
+        self.lookup_path = os.path.join(self.root_folder, "lookup.npz")
+
+    @classmethod
+    def from_processed(  # noqa: D417
+        cls, train_path, test_path, params=None, root_folder="models"
+    ):
+        """
+        Build a Trainer from processed Arrow artifacts on disk.
+
+        Only the feature and target columns are read, through memory-mapping.
+
+        Parameters
+        - train_path (str): The processed artifact of the training data.
+        - test_path (str): The processed artifact of the test data.
+        - params (dict): A dictionary containing the parameters for the model.
+        - root_folder (str): The root folder where the model will be saved.
+
+        Returns
+        - trainer (Trainer): The Trainer object.
+        """
+        columns = ["PU_DO", "trip_distance", "duration"]
+        train = load_processed(train_path, columns)
+        test = load_processed(test_path, columns)
+        return cls(
+            train.drop(["duration"]),
+            train.column("duration").to_numpy(),
+            test.drop(["duration"]),
+            test.column("duration").to_numpy(),
+            params=params,
+            root_folder=root_folder,
+        )
 
+    @stage("Trainer.train", rows=lambda self: len(self.y_train))
     def train(self):
-        """Train the model using the training data."""
-        self.pipeline = make_pipeline(
-            DictVectorizer(), RandomForestRegressor(**self.params, n_jobs=-1)
+        """
+        Train the model using the training data.
+
+        For the random_forest backend, the features are encoded with the columnar
+        PUDOEncoder, which learns the same feature space as a DictVectorizer. For
+        the hist_gradient_boosting backend, the location IDs are ordinal-encoded
+        (see location_encoder) and handled as native categorical features.
+        """
+        backend, params = self._backend_params()
+        if backend == "random_forest":
+            self.pipeline = make_pipeline(
+                PUDOEncoder(), RandomForestRegressor(**params, n_jobs=-1)
+            )
+            self.pipeline.fit(self.dict_train, self.y_train)
+        else:
+            features = to_locations(self.dict_train)
+            self.pipeline = make_pipeline(
+                location_encoder(features),
+                BACKENDS[backend](**params, categorical_features=[0, 1]),
+            )
+            self.pipeline.fit(features, self.y_train)
+
+    @stage("Trainer.train_out_of_core", rows=lambda self, *_: self.dict_train.num_rows)
+    def train_out_of_core(self, paths, chunk_size=1_000_000):  # noqa: D417
+        """
+        Train the model on processed artifacts too large to fit in memory.
+
+        The artifacts are memory-mapped and streamed in chunks of rows (see
+        iter_processed) twice: a first pass learns the PU_DO vocabulary, then a
+        sub-forest is fitted on each encoded chunk. The sub-forests are bagged into
+        one forest of about n_estimators trees (at least one per chunk), so the
+        memory used grows with chunk_size rather than with the number of rows. The
+        result is the same pipeline as train's.
+
+        dict_train is set to the memory-mapped features, read on demand only.
+
+        Parameters
+        - paths (list): The processed artifacts of the training data.
+        - chunk_size (int): The maximum number of rows fitted at once.
+        """
+        categories = set()
+        for chunk in iter_processed(paths, ["PU_DO"], chunk_size):
+            categories.update(pc.unique(chunk.column("PU_DO")).to_pylist())
+        categories.discard(None)
+        # Fitting on the unique values learns the same vocabulary as on every row
+        encoder = PUDOEncoder().fit(pd.DataFrame({"PU_DO": sorted(categories)}))
+
+        chunks = list(
+            iter_processed(paths, ["PU_DO", "trip_distance", "duration"], chunk_size)
+        )
+        _, params = self._backend_params("random_forest")
+        n_estimators = max(params.pop("n_estimators", 100), len(chunks))
+        forest = None
+        for chunk, trees in zip(
+            chunks, np.array_split(np.arange(n_estimators), len(chunks)), strict=True
+        ):
+            features = encoder.transform(chunk.select(["PU_DO", "trip_distance"]))
+            sub_forest = RandomForestRegressor(
+                **params, n_estimators=len(trees), n_jobs=-1
+            ).fit(features, chunk.column("duration").to_numpy())
+            if forest is None:
+                forest = sub_forest
+            else:
+                forest.estimators_ += sub_forest.estimators_
+        forest.n_estimators = len(forest.estimators_)
+
+        self.dict_train = pa.concat_tables(
+            [load_processed(path, ["PU_DO", "trip_distance"]) for path in paths]
+        )
+        self.pipeline = Pipeline(
+            [("pudoencoder", encoder), ("randomforestregressor", forest)]
+        )
+
+    @stage("Trainer.train_incremental", rows=lambda self, *_: len(self.y_train))
+    def train_incremental(self, n_estimators=None, max_estimators=None):  # noqa: D417
+        """
+        Grow the saved pipeline with trees trained on the new training data.
+
+        The previous pipeline is loaded, its PU_DO vocabulary grown with the values
+        not seen yet (see PUDOEncoder.partial_fit), and n_estimators trees are fitted
+        on the training data only and added to the forest with warm_start. The cost
+        of a retraining then grows with the new data rather than with the history.
+
+        Parameters
+        - n_estimators (int): The number of trees to add. Defaults to the
+        n_estimators parameter.
+        - max_estimators (int): The number of trees to keep, the oldest being
+        pruned. Defaults to None, which keeps them all.
+        """
+        if not self.pipeline:
+            self.load_pipeline()
+        encoder, forest = self.pipeline.steps[0][1], self.pipeline.steps[-1][1]
+        if not isinstance(encoder, PUDOEncoder):
+            raise ValueError("The pipeline was not fitted on PU_DO/trip_distance")
+        _, params = self._backend_params("random_forest")
+        default_estimators = params.pop("n_estimators", forest.n_estimators)
+        n_estimators = n_estimators or default_estimators
+
+        features = encoder.partial_fit(self.dict_train).transform(self.dict_train)
+        _widen_trees(forest, features.shape[1])
+        forest.set_params(
+            **params,
+            warm_start=True,
+            n_estimators=len(forest.estimators_) + n_estimators,
+        )
+        forest.fit(features, self.y_train)
+        if max_estimators and len(forest.estimators_) > max_estimators:
+            forest.estimators_ = forest.estimators_[-max_estimators:]
+            forest.n_estimators = max_estimators
+
+    def search(  # noqa: D417
+        self, space, strategy="random", validation_size=0.2, **kwargs
+    ):
+        """
+        Search the model hyperparameters, then train and save the best pipeline.
+
+        The trials are scored on a validation split held out of the training data,
+        so the test data stays unseen until evaluate. The training data is encoded
+        once and shared with the trials, which run in parallel (see
+        HyperparameterSearch). The best parameters replace the model parameters of
+        params, and the model is then trained with them on the whole training data
+        (see train). The results table is written to search_results.csv in the root
+        folder. Only the random_forest backend is searched.
+
+        Parameters
+        - space (dict): The candidate values of each hyperparameter.
+        - strategy (str): One of "grid", "random" or "halving".
+        - validation_size (float): The share of the training rows held out to score
+        the trials. Defaults to 0.2.
+        - kwargs: The other HyperparameterSearch arguments (n_trials, total_cores,
+        cores_per_trial, factor, random_state, mp_context).
+
+        Returns
+        - results (DataFrame): One row per trial with its params, validation rmse
+        and fit time.
+        """
+        self._backend_params("random_forest")
+        features = PUDOEncoder().fit_transform(self.dict_train)
+        target = np.asarray(self.y_train)
+        order = np.random.default_rng(kwargs.get("random_state", 0)).permutation(
+            len(target)
+        )
+        n_validation = max(1, int(len(target) * validation_size))
+        validation = np.sort(order[:n_validation])
+        fit = np.sort(order[n_validation:])
+
+        search = HyperparameterSearch(space, strategy=strategy, **kwargs)
+        results = search.run(
+            features[fit], target[fit], features[validation], target[validation]
         )
-        self.pipeline.fit(self.dict_train, self.y_train)
 
+        self.params = {**(self.params or {}), **search.best_params}
+        self.train()
+        self.save_pipeline()
+        results.to_csv(
+            os.path.join(self.root_folder, "search_results.csv"), index=False
+        )
+        return results
+
+    @stage("Trainer.evaluate", rows=lambda self: len(self.y_test))
     def evaluate(self):
         """
         Evaluate the model using the test data.
@@ -85,10 +306,10 @@ class Trainer:
         - rmse (float): The root mean squared error of the model predictions.
         """
         if self.pipeline:
-            y_pred = self.pipeline.predict(self.dict_test)
+            y_pred = self._predict(self.dict_test)
         else:
             self.load_pipeline()
-            y_pred = self.pipeline.predict(self.dict_test)
+            y_pred = self._predict(self.dict_test)
         rmse = mean_squared_error(self.y_test, y_pred, squared=False)
         return rmse
 
@@ -103,21 +324,194 @@ class Trainer:
         - preds (float): The predicted value.
         """
         if self.pipeline:
-            preds = self.pipeline.predict(features)
+            preds = self._predict(features)
         else:
             self.load_pipeline()
-            preds = self.pipeline.predict(features)
+            preds = self._predict(features)
         return float(preds[0])
 
+    def predict_batch(self, features, chunk_size=100_000, n_threads=1):  # noqa: D417
+        """
+        Make predictions for many trips in one vectorized call.
+
+        The PU_DO pairs are looked up from the location IDs, then each chunk is
+        encoded and predicted at once. Chunks run on n_threads threads, the forest
+        prediction releasing the GIL.
+
+        Parameters
+        - features: The trips, as a DataFrame, a pyarrow Table, a dict of arrays
+        or a 2D array of (PULocationID, DOLocationID, trip_distance) rows. A PU_DO
+        column may be given instead of the location IDs.
+        - chunk_size (int): The number of rows predicted at once.
+        - n_threads (int): The number of chunks predicted concurrently.
+
+        Returns
+        - preds (numpy.ndarray): The predicted values, in the input order.
+        """
+        if not self.pipeline:
+            self.load_pipeline()
+        frame = to_frame(features, build_pu_do=False)
+        chunks = [
+            frame.iloc[start : start + chunk_size]
+            for start in range(0, len(frame), chunk_size)
+        ]
+        if n_threads > 1 and len(chunks) > 1:
+            with ThreadPoolExecutor(max_workers=n_threads) as executor:
+                preds = list(executor.map(self._predict, chunks))
+        else:
+            preds = [self._predict(chunk) for chunk in chunks]
+        return np.concatenate(preds) if preds else np.empty(0)
+
+    def _backend_params(self, expected=None):
+        """Split the params into the backend name and the model parameters."""
+        params = dict(self.params or {})
+        backend = params.pop("backend", None) or "random_forest"
+        if backend not in BACKENDS:
+            raise ValueError(f"Invalid model backend: {backend}")
+        if expected is not None and backend != expected:
+            raise ValueError(f"Only the {expected} backend is supported here")
+        return backend, params
+
+    def _predict(self, features):
+        """Predict with the pipeline, converting the features to its input."""
+        if isinstance(self.pipeline.steps[0][1], ColumnTransformer):
+            features = to_locations(features)
+        return self.pipeline.predict(features)
+
+    @stage("Trainer.save_pipeline")
     def save_pipeline(self):
-        """Save the trained model pipeline to disk."""
+        """
+        Save the trained model pipeline to disk.
+
+        The PUDOEncoder step is saved as the equivalent DictVectorizer, so the saved
+        pipeline only depends on scikit-learn and can be served as is.
+        """
+        if not os.path.exists(self.root_folder):
+            os.makedirs(self.root_folder)
+        steps = [
+            ("dictvectorizer", step.to_dict_vectorizer())
+            if isinstance(step, PUDOEncoder)
+            else (name, step)
+            for name, step in self.pipeline.steps
+        ]
+        dump(Pipeline(steps), self.pipeline_path)
+
+    def export_forest(self):
+        """
+        Export the trained forest for the NumPy-only FlatForest predictor.
+
+        The trees are flattened into node arrays and saved, with the PU_DO
+        vocabulary, as an uncompressed .npz file next to the pipeline.
+
+        Returns
+            FlatForest: The exported forest.
+        """
+        from flat_forest import FlatForest
+
+        if not os.path.exists(self.root_folder):
+            os.makedirs(self.root_folder)
+        forest = FlatForest.from_pipeline(self.pipeline)
+        forest.save(self.forest_path)
+        return forest
+
+    def build_lookup_table(self, n_buckets=64, max_distance=None):  # noqa: D417
+        """
+        Precompute the predictions of every known PU_DO pair over a distance grid.
+
+        The known pairs are the PU_DO vocabulary of the random_forest backend, or
+        every pair of the location IDs encoded by the hist_gradient_boosting one.
+        The latter also predicts a pair with a single known location ID from that
+        ID, so the table gets a row for each known location ID with an unknown
+        other side.
+        The table is saved next to the pipeline, for the lookup prediction mode of
+        the inference handlers.
+
+        Parameters
+        - n_buckets (int): The number of distance intervals of the grid.
+        - max_distance (float): The last distance of the grid. Defaults to the
+        99.9th percentile of the training distances.
+
+        Returns
+        - table (LookupTable): The lookup table.
+        """
+        from lookup_table import LookupTable
+
+        if not self.pipeline:
+            self.load_pipeline()
+        encoder = self.pipeline.steps[0][1]
+        pu_locations, do_locations = (), ()
+        if isinstance(encoder, ColumnTransformer):
+            pu_locations, do_locations = encoder.named_transformers_[
+                "locations"
+            ].categories_
+            pairs = [f"{pu:.0f}_{do:.0f}" for pu in pu_locations for do in do_locations]
+        elif isinstance(encoder, DictVectorizer):
+            pairs = PUDOEncoder.from_dict_vectorizer(encoder).categories_
+        else:
+            pairs = encoder.categories_
+        if max_distance is None:
+            max_distance = float(np.quantile(_distances(self.dict_train), 0.999))
+
+        table = LookupTable.build(
+            lambda pu_do, distance: self.predict_batch(
+                {"PU_DO": pu_do, "trip_distance": distance}
+            ),
+            pairs,
+            n_buckets=n_buckets,
+            max_distance=max_distance,
+            pu_locations=pu_locations,
+            do_locations=do_locations,
+        )
         if not os.path.exists(self.root_folder):
             os.makedirs(self.root_folder)
-        dump(self.pipeline, self.pipeline_path)
+        table.save(self.lookup_path)
+        return table
+
+    def evaluate_lookup(self, table):  # noqa: D417
+        """
+        Evaluate a lookup table on the test data.
+
+        Parameters
+        - table (LookupTable): The lookup table.
+
+        Returns
+        - rmse (float): The root mean squared error of the looked up predictions.
+        - model_rmse (float): Their root mean squared difference with the model's
+        predictions.
+        """
+        from lookup_table import split_pu_do
+
+        frame = to_frame(self.dict_test, build_pu_do=False)
+        if "PU_DO" in frame.columns:
+            pu_location, do_location = split_pu_do(frame["PU_DO"])
+        else:
+            pu_location = frame["PULocationID"].to_numpy(np.float64)
+            do_location = frame["DOLocationID"].to_numpy(np.float64)
+        y_lookup = table.predict(pu_location, do_location, frame["trip_distance"])
+        y_model = self.predict_batch(frame)
+        missing = np.isnan(y_lookup)
+        y_lookup[missing] = y_model[missing]
+        rmse = mean_squared_error(self.y_test, y_lookup, squared=False)
+        model_rmse = mean_squared_error(y_model, y_lookup, squared=False)
+        return rmse, model_rmse
 
     def load_pipeline(self):
-        """Load the trained model pipeline from disk."""
-        self.pipeline = load(self.pipeline_path)
+        """
+        Load the trained model pipeline from disk.
+
+        A DictVectorizer step fitted on PU_DO/trip_distance is swapped for the
+        equivalent PUDOEncoder, so the pipeline accepts DataFrames as well as dicts.
+        """
+        pipeline = load(self.pipeline_path)
+        steps = []
+        for name, step in pipeline.steps:
+            if isinstance(step, DictVectorizer):
+                try:
+                    name, step = "pudoencoder", PUDOEncoder.from_dict_vectorizer(step)
+                except ValueError:
+                    pass
+            steps.append((name, step))
+        self.pipeline = Pipeline(steps)
 
     def upload_to_neptune(self, rmse):  # noqa: D417
         """
@@ -126,9 +520,14 @@ class Trainer:
         Parameters
         - rmse (float): The root mean squared error of the model predictions.
         """
+        import neptune
+        from registry import HASHES, file_sha256
+
         run = neptune.init_run(project=NEPTUNE_PROJECT, api_token=NPETUNE_API_TOKEN)
         run["params"] = self.params
         run["rmse"] = rmse
+        if is_enabled():
+            log_to_neptune(run)
         run["dataset/raw"].track_files(f"s3://{S3_BUCKET}/web-service/raw")
         run["dataset/interim"].track_files(f"s3://{S3_BUCKET}/web-service/interim")
         run["dataset/processed"].track_files(f"s3://{S3_BUCKET}/web-service/processed")
@@ -136,9 +535,40 @@ class Trainer:
         model_version = neptune.init_model_version(
             model=MODEL_ID, project=NEPTUNE_PROJECT, api_token=NPETUNE_API_TOKEN
         )
-        model_version["model"].upload(self.pipeline_path)
+        # Record the digest of each artifact, for the deployment to verify and
+        # cache it (see ModelRegistry)
+        for field, path in [
+            ("model", self.pipeline_path),
+            ("forest", self.forest_path),
+            ("lookup", self.lookup_path),
+        ]:
+            if field == "model" or os.path.exists(path):
+                model_version[field].upload(path)
+                model_version[f"{HASHES}/{field}"] = file_sha256(path)
         model_version["run/id"] = run["sys/id"].fetch()
 
         model_version.stop()
         run.stop()
         print("Model uploaded to Neptune")
+
+
+def _widen_trees(forest, n_features):
+    """
+    Let the fitted trees of a forest take a feature space grown at the end.
+
+    The trees never split on the new columns, so only their n_features_in_ check
+    has to accept them; their nodes are left as they are. The forest-level
+    feature_importances_ is not supported once the feature space grew.
+    """
+    for estimator in forest.estimators_:
+        estimator.n_features_in_ = n_features
+
+
+def _distances(features, max_rows=1_000_000):
+    """Get the trip distances, evenly sampled from Arrow tables of max_rows+ rows."""
+    if hasattr(features, "column_names"):
+        column = features.column("trip_distance")
+        if len(column) > max_rows:
+            column = column.take(np.linspace(0, len(column) - 1, max_rows, dtype=int))
+        return column.to_numpy()
+    return to_frame(features, build_pu_do=False)["trip_distance"]
@@ -0,0 +1,148 @@
+"""
+TaskGraph: a small DAG runner for the stages of a job.
+
+Each task is a callable that runs once all the tasks it comes after have
+finished, and receives their results as arguments, in order. Independent tasks
+run concurrently on a thread pool. The wall time of every task is recorded, for
+the job report, and each task is an instrumentation stage (see instrumentation),
+which the stages it calls are nested in.
+
+Classes:
+        TaskGraph: The DAG runner.
+
+"""
+
+import logging
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+sys.path.append("src/utils")
+from instrumentation import stage  # noqa: E402
+
+
+class TaskGraph:
+    """
+    Define the TaskGraph class.
+
+    Args:
+        max_workers (int, optional): The number of tasks run at once. Defaults to
+        the number of tasks.
+
+    Attributes:
+        results (dict): The result of each finished task.
+        timings (list): One {"task", "start", "end", "seconds", "thread"} dict per
+        finished task, in completion order, the times in seconds since run started.
+    """
+
+    def __init__(self, max_workers=None):
+        """
+        Initialize the TaskGraph object.
+
+        Args:
+            max_workers (int, optional): The number of tasks run at once.
+        """
+        self.max_workers = max_workers
+        self.tasks = {}
+        self.results = {}
+        self.timings = []
+
+    def add(self, name, func, after=()):
+        """
+        Add a task to the graph.
+
+        Args:
+            name (str): The unique name of the task.
+            func (callable): The task, called with the results of the tasks in after.
+            after (list): The names of the tasks it depends on, already added.
+
+        Raises:
+            ValueError: If the name is taken or a dependency is unknown.
+        """
+        if name in self.tasks:
+            raise ValueError(f"Duplicate task: {name}")
+        unknown = [dependency for dependency in after if dependency not in self.tasks]
+        if unknown:
+            raise ValueError(f"Unknown dependencies of {name}: {unknown}")
+        self.tasks[name] = (func, list(after))
+
+    def run(self):
+        """
+        Run every task, as soon as its dependencies have finished.
+
+        Tasks are added after their dependencies, so the graph has no cycles. When a
+        task fails, no new task is started, the running ones are waited for, and
+        the error is raised.
+
+        Returns
+            dict: The result of each task.
+        """
+        start = time.perf_counter()
+        pending = dict(self.tasks)
+        running = {}
+        error = None
+        with ThreadPoolExecutor(
+            max_workers=self.max_workers or max(len(self.tasks), 1),
+            thread_name_prefix="task",
+        ) as executor:
+            while pending or running:
+                ready = [
+                    name
+                    for name, (_, after) in pending.items()
+                    if error is None and all(d in self.results for d in after)
+                ]
+                for name in ready:
+                    func, after = pending.pop(name)
+                    args = [self.results[dependency] for dependency in after]
+                    running[executor.submit(self._time, name, func, args, start)] = name
+                if not running:
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    try:
+                        self.results[name] = future.result()
+                    except Exception as e:
+                        logging.error(f"Task {name} failed: {e}")
+                        error = error or e
+        if error is not None:
+            raise error
+        return self.results
+
+    def _time(self, name, func, args, origin):
+        """Run a task and record its timing."""
+        start = time.perf_counter()
+        try:
+            with stage(name):
+                return func(*args)
+        finally:
+            end = time.perf_counter()
+            self.timings.append(
+                {
+                    "task": name,
+                    "start": start - origin,
+                    "end": end - origin,
+                    "seconds": end - start,
+                    "thread": threading.current_thread().name,
+                }
+            )
+
+    def report(self):
+        """
+        Format the task timings as a Markdown table.
+
+        Returns
+            str: One row per task, in start order, then the wall time of the run
+            against the sum of the task times.
+        """
+        timings = sorted(self.timings, key=lambda timing: timing["start"])
+        lines = ["| Stage | Start (s) | End (s) | Duration (s) |", "|---|---|---|---|"]
+        lines += [
+            f"| {t['task']} | {t['start']:.2f} | {t['end']:.2f} | {t['seconds']:.2f} |"
+            for t in timings
+        ]
+        wall = max((timing["end"] for timing in timings), default=0.0)
+        total = sum(timing["seconds"] for timing in timings)
+        lines.append(f"\nWall time: {wall:.2f} s, sum of the stages: {total:.2f} s")
+        return "\n".join(lines)
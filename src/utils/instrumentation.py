@@ -0,0 +1,331 @@
+"""
+Lightweight instrumentation of the stages of the data, training and deployment jobs.
+
+stage measures a block of code, as a context manager or as a decorator: its wall
+time, the CPU time of the process, the peak RSS and the number of rows it handled.
+Each measure is kept in memory, logged as one JSON line on the "instrumentation"
+logger and appended to a JSON lines file when one is set.
+
+Instrumentation is off unless the INSTRUMENTATION environment variable is set to 1
+or enable is called. When off, a stage costs a flag check and records nothing.
+
+Classes:
+        Stage: The context manager and decorator returned by stage.
+
+Functions:
+        enable: Turn the instrumentation on, for this process and its children.
+        disable: Turn the instrumentation off.
+        is_enabled: Whether the instrumentation is on.
+        stage: Measure a block of code or every call of a function.
+        get_records: Get the measures recorded by this process.
+        reset: Forget the recorded measures.
+        summarize: Aggregate the measures by stage.
+        summary_table: Format the aggregated measures as a Markdown table.
+        log_to_neptune: Log the aggregated measures to a Neptune run.
+
+"""
+
+import functools
+import json
+import logging
+import os
+import sys
+import threading
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+_ENABLED = os.getenv("INSTRUMENTATION", "0") == "1"
+_PATH = os.getenv("INSTRUMENTATION_PATH")
+_RECORDS = []
+_LOCK = threading.Lock()
+_LOCAL = threading.local()
+# ru_maxrss is in bytes on macOS, kilobytes elsewhere
+_RSS_UNIT = 2**20 if sys.platform == "darwin" else 2**10
+
+logger = logging.getLogger("instrumentation")
+
+
+def enable(path=None):
+    """
+    Turn the instrumentation on, for this process and its children.
+
+    The environment variables are set too, so worker processes started afterwards
+    record their stages as well: they only reach the JSON lines file, not the
+    records of this process.
+
+    Args:
+        path (str, optional): The JSON lines file the measures are appended to.
+        Defaults to INSTRUMENTATION_PATH, or no file.
+    """
+    global _ENABLED, _PATH
+    _ENABLED = True
+    os.environ["INSTRUMENTATION"] = "1"
+    if path is not None:
+        _PATH = path
+        os.environ["INSTRUMENTATION_PATH"] = path
+
+
+def disable():
+    """Turn the instrumentation off."""
+    global _ENABLED
+    _ENABLED = False
+    os.environ["INSTRUMENTATION"] = "0"
+
+
+def is_enabled():
+    """
+    Tell whether the instrumentation is on.
+
+    Returns
+        bool: True when the stages are measured.
+    """
+    return _ENABLED
+
+
+def _peak_rss_mb():
+    """Get the peak RSS of the process and of its largest finished child, in MB."""
+    if resource is None:
+        return None
+    peak = max(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    )
+    return peak / _RSS_UNIT
+
+
+def _cpu_seconds():
+    """Get the CPU time of the process and of its finished children."""
+    times = os.times()
+    return times.user + times.system + times.children_user + times.children_system
+
+
+def _stack():
+    """Get the names of the stages open in this thread."""
+    if not hasattr(_LOCAL, "stack"):
+        _LOCAL.stack = []
+    return _LOCAL.stack
+
+
+class Stage:
+    """
+    Define the Stage class, a context manager measuring a block of code.
+
+    Used as a decorator, it measures every call of the function instead. The CPU
+    time is the one of the whole process, so stages running concurrently are
+    counted in each other's. The peak RSS is the high-water mark of the process at
+    the end of the stage, and rss_growth_mb how much the stage raised it.
+
+    Args:
+        name (str): The name of the stage.
+        rows (int or callable, optional): The number of rows handled by the stage.
+        As a decorator, a callable is given the arguments of the call, once the
+        function has returned. It can also be set on the stage inside the block.
+        Defaults to None.
+
+    Attributes:
+        record (dict): The measures, once the block has run with instrumentation on.
+    """
+
+    def __init__(self, name, rows=None):
+        """
+        Initialize the Stage object.
+
+        Args:
+            name (str): The name of the stage.
+            rows (int or callable, optional): The number of rows of the stage.
+        """
+        self.name = name
+        self.rows = rows
+        self.record = None
+        self._start = None
+
+    def __enter__(self):
+        """Start measuring, when the instrumentation is on."""
+        if _ENABLED:
+            stack = _stack()
+            self._parent = stack[-1] if stack else None
+            stack.append(self.name)
+            self._peak = _peak_rss_mb()
+            self._cpu = _cpu_seconds()
+            self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """Record the measures of the block, if it was measured."""
+        if self._start is None:
+            return False
+        wall = time.perf_counter() - self._start
+        cpu = _cpu_seconds() - self._cpu
+        peak = _peak_rss_mb()
+        _stack().pop()
+        self.record = {
+            "stage": self.name,
+            "parent": self._parent,
+            "wall_s": round(wall, 6),
+            "cpu_s": round(cpu, 6),
+            "peak_rss_mb": peak,
+            "rss_growth_mb": None if peak is None else peak - self._peak,
+            "rows": None if callable(self.rows) else self.rows,
+            "ok": exc_type is None,
+            "pid": os.getpid(),
+            "thread": threading.current_thread().name,
+            "time": time.time(),
+        }
+        self._start = None
+        _emit(self.record)
+        return False
+
+    def __call__(self, func):
+        """Measure every call of a function."""
+        name, rows = self.name, self.rows
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _ENABLED:
+                return func(*args, **kwargs)
+            with Stage(name) as current:
+                result = func(*args, **kwargs)
+                current.rows = rows(*args, **kwargs) if callable(rows) else rows
+            return result
+
+        return wrapper
+
+
+def stage(name, rows=None):
+    """
+    Measure a block of code, or every call of a function.
+
+        with stage("prepare", rows=len(frame)):
+            ...
+
+        @stage("Trainer.evaluate", rows=lambda self: len(self.y_test))
+        def evaluate(self):
+            ...
+
+    Args:
+        name (str): The name of the stage.
+        rows (int or callable, optional): The number of rows of the stage (see
+        Stage). Defaults to None.
+
+    Returns:
+        Stage: The context manager, also usable as a decorator.
+    """
+    return Stage(name, rows)
+
+
+def _emit(record):
+    """Keep a record, log it and append it to the JSON lines file."""
+    line = json.dumps(record)
+    with _LOCK:
+        _RECORDS.append(record)
+        if _PATH:
+            with open(_PATH, "a") as outfile:
+                outfile.write(line + "\n")
+    logger.info(line)
+
+
+def get_records():
+    """
+    Get the measures recorded by this process.
+
+    Returns
+        list: One dict per measured block, in completion order.
+    """
+    with _LOCK:
+        return list(_RECORDS)
+
+
+def reset():
+    """Forget the recorded measures."""
+    with _LOCK:
+        _RECORDS.clear()
+
+
+def summarize(records=None):
+    """
+    Aggregate the measures by stage.
+
+    Args:
+        records (list, optional): The measures. Defaults to get_records().
+
+    Returns:
+        dict: For each stage, in order of first completion, its number of calls,
+        total wall and CPU times, rows and RSS growth, and highest peak RSS.
+    """
+    summary = {}
+    for record in get_records() if records is None else records:
+        totals = summary.setdefault(
+            record["stage"],
+            {
+                "calls": 0,
+                "wall_s": 0.0,
+                "cpu_s": 0.0,
+                "peak_rss_mb": None,
+                "rss_growth_mb": None,
+                "rows": None,
+            },
+        )
+        totals["calls"] += 1
+        totals["wall_s"] += record["wall_s"]
+        totals["cpu_s"] += record["cpu_s"]
+        for key, combine in [
+            ("peak_rss_mb", max),
+            ("rss_growth_mb", sum),
+            ("rows", sum),
+        ]:
+            if record[key] is not None:
+                previous = totals[key]
+                totals[key] = (
+                    record[key]
+                    if previous is None
+                    else combine([previous, record[key]])
+                )
+    return summary
+
+
+def summary_table(records=None):
+    """
+    Format the aggregated measures as a Markdown table.
+
+    Args:
+        records (list, optional): The measures. Defaults to get_records().
+
+    Returns:
+        str: One row per stage, in order of first completion.
+    """
+
+    def cell(value, spec):
+        return "" if value is None else format(value, spec)
+
+    lines = [
+        "| Stage | Calls | Wall (s) | CPU (s) | Peak RSS (MB) | RSS growth (MB) "
+        "| Rows |",
+        "|---|---|---|---|---|---|---|",
+    ]
+    lines += [
+        f"| {name} | {t['calls']} | {t['wall_s']:.2f} | {t['cpu_s']:.2f} "
+        f"| {cell(t['peak_rss_mb'], '.1f')} | {cell(t['rss_growth_mb'], '.1f')} "
+        f"| {cell(t['rows'], ',')} |"
+        for name, t in summarize(records).items()
+    ]
+    return "\n".join(lines)
+
+
+def log_to_neptune(run, records=None, prefix="instrumentation"):
+    """
+    Log the aggregated measures to a Neptune run.
+
+    Args:
+        run (neptune.Run): The run, e.g. the one of Trainer.upload_to_neptune.
+        records (list, optional): The measures. Defaults to get_records().
+        prefix (str, optional): The namespace of the fields. Defaults to
+        "instrumentation".
+    """
+    for name, totals in summarize(records).items():
+        for key, value in totals.items():
+            if value is not None:
+                run[f"{prefix}/{name}/{key}"] = value
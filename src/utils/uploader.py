@@ -0,0 +1,149 @@
+"""
+S3Uploader: upload files to S3 in the background.
+
+The uploads run on a thread pool and share one pooled S3 client (see
+get_s3_client) and the multipart settings of get_transfer_config, so a pipeline
+can submit a file and move on to its next stage while the file is being uploaded.
+join waits for every submitted upload and returns a report of them. Files may be
+submitted from several threads at once, e.g. concurrent pipeline stages.
+
+DeferredUploader: record the uploads instead, to submit them later to an
+S3Uploader, e.g. from the process that started a data preparation worker.
+
+"""
+
+import logging
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append("src/utils")
+from utils import get_s3_client, get_s3_key, get_transfer_config  # noqa: E402
+
+
+class S3Uploader:
+    """
+    Define the S3Uploader class.
+
+    Args:
+        bucket (str): The name of the S3 bucket.
+        client (botocore.client.S3, optional): The S3 client. Defaults to the
+        shared pooled client.
+        max_workers (int, optional): The number of concurrent uploads. Defaults to 4.
+        transfer_config (TransferConfig, optional): The multipart settings.
+        Defaults to get_transfer_config().
+    """
+
+    def __init__(self, bucket, client=None, max_workers=4, transfer_config=None):
+        """
+        Initialize the S3Uploader object.
+
+        Args:
+            bucket (str): The name of the S3 bucket.
+            client (botocore.client.S3, optional): The S3 client. Defaults to the
+            shared pooled client.
+            max_workers (int, optional): The number of concurrent uploads.
+            transfer_config (TransferConfig, optional): The multipart settings.
+        """
+        self.bucket = bucket
+        self.client = client
+        self.max_workers = max_workers
+        self.transfer_config = transfer_config
+        self.executor = None
+        self.futures = []
+        # Guards the executor and the futures against concurrent submits
+        self._lock = threading.Lock()
+
+    def submit(self, file_name, subfolder):
+        """
+        Start uploading a file in the background.
+
+        Args:
+            file_name (str): The path of the file to be uploaded.
+            subfolder (str): The subfolder within the bucket to upload the file to.
+
+        Returns:
+            concurrent.futures.Future: The future of the upload report.
+        """
+        with self._lock:
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix="s3-upload"
+                )
+            future = self.executor.submit(self._upload, file_name, subfolder)
+            self.futures.append(future)
+        return future
+
+    def join(self):
+        """
+        Wait for every submitted upload.
+
+        Returns
+            list: One report per upload, in submission order, with the "key",
+            "bytes", "seconds" and "ok" entries.
+        """
+        with self._lock:
+            futures, self.futures = self.futures, []
+            executor, self.executor = self.executor, None
+        reports = [future.result() for future in futures]
+        if executor is not None:
+            executor.shutdown()
+
+        uploaded = [report for report in reports if report["ok"]]
+        logging.info(
+            f"Uploaded {len(uploaded)}/{len(reports)} files "
+            f"({sum(report['bytes'] for report in uploaded) / 2**20:.1f} MB) "
+            f"to s3://{self.bucket}"
+        )
+        return reports
+
+    def _upload(self, file_name, subfolder):
+        """Upload a file and report on it."""
+        from boto3.exceptions import S3UploadFailedError
+        from botocore.exceptions import ClientError
+
+        key = get_s3_key(file_name, subfolder)
+        client = self.client or get_s3_client()
+        start = time.perf_counter()
+        try:
+            client.upload_file(
+                file_name,
+                self.bucket,
+                key,
+                Config=self.transfer_config or get_transfer_config(),
+            )
+            ok = True
+        except (ClientError, S3UploadFailedError) as e:
+            logging.error(e)
+            ok = False
+        return {
+            "key": key,
+            "bytes": os.path.getsize(file_name),
+            "seconds": time.perf_counter() - start,
+            "ok": ok,
+        }
+
+
+class DeferredUploader:
+    """
+    Define the DeferredUploader class.
+
+    It takes the place of an S3Uploader, but only records the submitted files, in
+    uploads, as (file_name, subfolder) tuples.
+    """
+
+    def __init__(self):
+        """Initialize the DeferredUploader object."""
+        self.uploads = []
+
+    def submit(self, file_name, subfolder):
+        """
+        Record a file to be uploaded later.
+
+        Args:
+            file_name (str): The path of the file to be uploaded.
+            subfolder (str): The subfolder within the bucket to upload the file to.
+        """
+        self.uploads.append((file_name, subfolder))
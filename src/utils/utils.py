@@ -3,16 +3,28 @@
 import logging
 import os
 from datetime import date
+from functools import lru_cache
 
-import boto3
-from botocore.exceptions import ClientError
 from dotenv import load_dotenv
-from hydra import compose, initialize
 
 load_dotenv()
 BASE_URL = os.getenv("BASE_URL")
 DATA_ROOT_LOCAL_FOLDER = os.getenv("DATA_ROOT_LOCAL_FOLDER", "data")
 CONFIG_DIR = os.getenv("CONFIG_DIR")
+S3_MAX_POOL_CONNECTIONS = int(os.getenv("S3_MAX_POOL_CONNECTIONS", "20"))
+
+# boto3 and hydra are imported where they are used, so that importing this module
+# (and the modules using it) does not pay for them on code paths that never touch
+# S3 or the config files.
+
+# Config types that are read from another config type's file
+CONFIG_FILES = {
+    "data_range": "data.yaml",
+    "search": "model.yaml",
+    "lookup": "model.yaml",
+    "incremental": "model.yaml",
+    "out_of_core": "model.yaml",
+}
 
 
 def get_config(config_path: str = CONFIG_DIR, config_type: str = "data"):
@@ -25,12 +37,16 @@ def get_config(config_path: str = CONFIG_DIR, config_type: str = "data"):
 
     Returns:
         tuple or dict: Depending on the config_type, returns a tuple or dictionary
-        containing the relevant configuration values.
+        containing the relevant configuration values. The "data_range" type
+        returns the taxi types and the (year, month) tuples to train on, and the
+        "model" type the model backend with the parameters of its section.
 
     Raises:
         ValueError: If an invalid config_type is provided.
     """
-    config_file = f"{config_type}.yaml"
+    from hydra import compose, initialize
+
+    config_file = CONFIG_FILES.get(config_type, f"{config_type}.yaml")
     with initialize(version_base=None, config_path=config_path):
         cfg = compose(config_name=config_file)
         if config_type == "data":
@@ -38,10 +54,53 @@ def get_config(config_path: str = CONFIG_DIR, config_type: str = "data"):
             year = cfg.source.year
             month = cfg.source.month
             return taxi_type, year, month
+        if config_type == "data_range":
+            training_range = cfg.get("training_range") or {}
+            taxi_types = training_range.get("taxi_types") or [cfg.source.taxi_type]
+            if training_range.get("start") and training_range.get("end"):
+                months = get_month_range(training_range.start, training_range.end)
+            else:
+                months = [(cfg.source.year, cfg.source.month)]
+            return {"taxi_types": list(taxi_types), "months": months}
         if config_type == "model":
-            n_estimators = cfg.random_forest_reg.n_estimators
-            max_depth = cfg.random_forest_reg.max_depth
-            return {"n_estimators": n_estimators, "max_depth": max_depth}
+            backend = cfg.get("backend") or "random_forest"
+            if backend == "hist_gradient_boosting":
+                params = dict(cfg.hist_gradient_boosting_reg)
+            else:
+                n_estimators = cfg.random_forest_reg.n_estimators
+                max_depth = cfg.random_forest_reg.max_depth
+                params = {"n_estimators": n_estimators, "max_depth": max_depth}
+            return {"backend": backend, **params}
+        if config_type == "search":
+            search = cfg.search
+            return {
+                "enabled": bool(search.get("enabled", False)),
+                "space": {name: list(values) for name, values in search.space.items()},
+                "strategy": search.strategy,
+                "n_trials": search.n_trials,
+                "validation_size": search.get("validation_size", 0.2),
+                "total_cores": search.total_cores,
+                "cores_per_trial": search.cores_per_trial,
+            }
+        if config_type == "lookup":
+            lookup = cfg.get("lookup") or {}
+            return {
+                "n_buckets": lookup.get("n_buckets", 64),
+                "max_distance": lookup.get("max_distance"),
+            }
+        if config_type == "incremental":
+            incremental = cfg.get("incremental") or {}
+            return {
+                "enabled": bool(incremental.get("enabled", False)),
+                "n_estimators": incremental.get("n_estimators"),
+                "max_estimators": incremental.get("max_estimators"),
+            }
+        if config_type == "out_of_core":
+            out_of_core = cfg.get("out_of_core") or {}
+            return {
+                "enabled": bool(out_of_core.get("enabled", False)),
+                "chunk_size": out_of_core.get("chunk_size") or 1_000_000,
+            }
         raise ValueError(f"Invalid config type: {config_type}")
 
 
@@ -66,6 +125,81 @@ def get_previous_month(year, month):
     return year, month
 
 
+def get_month_range(start, end):
+    """
+    Get the months between two months, both included.
+
+    Args:
+        start (str): The first month, as "YYYY-MM".
+        end (str): The last month, as "YYYY-MM".
+
+    Returns:
+        list: A list of (year, month) tuples, in chronological order.
+
+    Raises:
+        ValueError: If end is before start.
+    """
+    start_year, start_month = (int(part) for part in str(start).split("-"))
+    end_year, end_month = (int(part) for part in str(end).split("-"))
+    first, last = start_year * 12 + start_month - 1, end_year * 12 + end_month - 1
+    if last < first:
+        raise ValueError(f"Invalid month range: {start} > {end}")
+    return [(index // 12, index % 12 + 1) for index in range(first, last + 1)]
+
+
+def get_s3_key(file_name, subfolder):
+    """
+    Get the S3 key of a file uploaded to the given subfolder.
+
+    Args:
+        file_name (str): The path of the file to be uploaded.
+        subfolder (str): The subfolder within the bucket to upload the file to.
+
+    Returns:
+        str: The S3 key.
+    """
+    return os.path.join("web-service", subfolder, os.path.basename(file_name))
+
+
+@lru_cache(maxsize=1)
+def get_s3_client():
+    """
+    Get the S3 client shared by the whole process.
+
+    The client is created once, with a connection pool large enough for the
+    concurrent uploads, and reused so each upload skips the client construction
+    and TLS setup.
+
+    Returns
+        botocore.client.S3: The S3 client.
+    """
+    import boto3
+    from botocore.config import Config
+
+    return boto3.client(
+        "s3", config=Config(max_pool_connections=S3_MAX_POOL_CONNECTIONS)
+    )
+
+
+@lru_cache(maxsize=1)
+def get_transfer_config():
+    """
+    Get the multipart settings shared by every upload.
+
+    Files above 16 MB are sent in 16 MB parts, up to 8 parts at a time.
+
+    Returns
+        boto3.s3.transfer.TransferConfig: The multipart settings.
+    """
+    from boto3.s3.transfer import TransferConfig
+
+    return TransferConfig(
+        multipart_threshold=16 * 2**20,
+        multipart_chunksize=16 * 2**20,
+        max_concurrency=8,
+    )
+
+
 def upload_file_to_s3(file_name, bucket, subfolder):
     """
     Upload a file to an S3 bucket.
@@ -78,14 +212,16 @@ def upload_file_to_s3(file_name, bucket, subfolder):
     Returns:
         bool: True if the file was successfully uploaded, False otherwise.
     """
-    # If S3 object_name was not specified, use file_name
-    key = os.path.join("web-service", subfolder, os.path.basename(file_name))
+    from boto3.exceptions import S3UploadFailedError
+    from botocore.exceptions import ClientError
+
+    key = get_s3_key(file_name, subfolder)
 
-    s3_client = boto3.client("s3")
+    s3_client = get_s3_client()
 
     try:
-        s3_client.upload_file(file_name, bucket, key)
-    except ClientError as e:
+        s3_client.upload_file(file_name, bucket, key, Config=get_transfer_config())
+    except (ClientError, S3UploadFailedError) as e:
         logging.error(e)
         return False
     return True
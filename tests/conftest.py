@@ -0,0 +1,150 @@
+"""Fixtures and stand-ins shared by the unit tests."""
+import os
+import shutil
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+from botocore.exceptions import ClientError
+from joblib import dump
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.feature_extraction import DictVectorizer
+from sklearn.pipeline import make_pipeline
+
+
+class LocalS3Client:
+    """
+    A stand-in for the S3 client.
+
+    Uploaded files are copied to a local folder; put objects and multipart uploads
+    are kept in memory, with their parts.
+    """
+
+    def __init__(self, root=None, fail=False, fail_part=None):
+        """Store the files under root, fail every file upload or part fail_part."""
+        self.root = root
+        self.fail = fail
+        self.fail_part = fail_part
+        self.threads = set()
+        self.objects = {}
+        self.uploads = {}
+        self.aborted = []
+        self.lock = threading.Lock()
+
+    def upload_file(self, file_name, bucket, key, Config=None):
+        """Copy the file to root/bucket/key."""
+        self.threads.add(threading.current_thread().name)
+        if self.fail:
+            raise ClientError({"Error": {"Code": "500"}}, "PutObject")
+        destination = os.path.join(self.root, bucket, key)
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        shutil.copyfile(file_name, destination)
+
+    def put_object(self, Bucket, Key, Body):
+        """Store an object."""
+        self.objects[(Bucket, Key)] = bytes(Body)
+
+    def create_multipart_upload(self, Bucket, Key):
+        """Start a multipart upload."""
+        upload_id = f"upload-{len(self.uploads)}"
+        self.uploads[upload_id] = {}
+        return {"UploadId": upload_id}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body):
+        """Store a part."""
+        if PartNumber == self.fail_part:
+            raise OSError("connection reset")
+        with self.lock:
+            self.uploads[UploadId][PartNumber] = bytes(Body)
+        return {"ETag": f'"{PartNumber}"'}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        """Assemble the parts into the object."""
+        parts = self.uploads.pop(UploadId)
+        numbers = [part["PartNumber"] for part in MultipartUpload["Parts"]]
+        assert numbers == sorted(parts)
+        self.objects[(Bucket, Key)] = b"".join(parts[number] for number in numbers)
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        """Drop the parts of an upload."""
+        self.uploads.pop(UploadId)
+        self.aborted.append(UploadId)
+
+
+@pytest.fixture
+def local_s3_client():
+    """
+    Get the S3 stand-in.
+
+    Returns
+        type: The LocalS3Client class, to build clients with.
+    """
+    return LocalS3Client
+
+
+@pytest.fixture
+def raw_trips():
+    """
+    Create a sample DataFrame of raw trips.
+
+    Returns
+        pandas.DataFrame: A DataFrame containing dummy data.
+    """
+    return pd.DataFrame(
+        {
+            "lpep_pickup_datetime": pd.to_datetime(
+                ["2022-01-01 00:00:00", "2022-01-01 00:01:00"]
+            ),
+            "lpep_dropoff_datetime": pd.to_datetime(
+                ["2022-01-01 00:01:00", "2022-01-01 00:02:00"]
+            ),
+            "PULocationID": [1, 2],
+            "DOLocationID": [3, 4],
+            "trip_distance": [1.5, 2.0],
+        }
+    )
+
+
+@pytest.fixture
+def trips():
+    """
+    Create sample trips with their location IDs, PU_DO and duration.
+
+    Returns
+        pandas.DataFrame: A DataFrame of 500 trips.
+    """
+    rng = np.random.default_rng(0)
+    trips = pd.DataFrame(
+        {
+            "PULocationID": rng.integers(1, 10, 500),
+            "DOLocationID": rng.integers(1, 10, 500),
+            "trip_distance": rng.random(500) * 10,
+        }
+    )
+    trips["PU_DO"] = (
+        trips["PULocationID"].astype(str) + "_" + trips["DOLocationID"].astype(str)
+    )
+    trips["duration"] = trips["trip_distance"] * 3 + trips["PULocationID"]
+    return trips
+
+
+@pytest.fixture
+def model_dir(tmp_path):
+    """
+    Save a small DictVectorizer pipeline as model.joblib.
+
+    Returns
+        str: The model directory.
+    """
+    rng = np.random.default_rng(0)
+    train = [
+        {"PU_DO": f"{rng.integers(1, 10)}_{rng.integers(1, 10)}", "trip_distance": d}
+        for d in rng.random(200) * 10
+    ]
+    target = [record["trip_distance"] * 3 for record in train]
+    pipeline = make_pipeline(
+        DictVectorizer(), RandomForestRegressor(n_estimators=5, random_state=0)
+    )
+    dump(pipeline.fit(train, target), tmp_path / "model.joblib")
+    return str(tmp_path)
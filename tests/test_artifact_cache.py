@@ -0,0 +1,177 @@
+"""Unit tests of the ArtifactCache class."""
+import os
+import sys
+
+import pytest
+
+sys.path.append("src/data")
+from artifact_cache import ArtifactCache, make_key  # noqa: E402
+from make_dataset import Data  # noqa: E402
+
+
+@pytest.fixture
+def cache(tmp_path):
+    """
+    Create an empty cache in a temporary directory.
+
+    Args:
+        tmp_path: The temporary directory provided by pytest.
+
+    Returns:
+        ArtifactCache: The cache.
+    """
+    return ArtifactCache(root=os.path.join(tmp_path, "cache"), max_bytes=1000)
+
+
+def write_file(path, size):
+    """Write a file of the given size."""
+    with open(path, "wb") as file:
+        file.write(b"x" * size)
+    return path
+
+
+def test_make_key():
+    """Test that the keys depend on every part, but not on their order."""
+    assert make_key(a=1, b="x") == make_key(b="x", a=1)
+    assert make_key(a=1, b="x") != make_key(a=2, b="x")
+
+
+def test_store_and_restore(tmp_path, cache):
+    """Test that a stored artifact is restored, and that a miss returns False."""
+    source = write_file(os.path.join(tmp_path, "artifact"), 10)
+    cache.store("abc", source)
+
+    destination = os.path.join(tmp_path, "restored", "artifact")
+    assert cache.restore("abc", destination)
+    with open(destination, "rb") as file:
+        assert file.read() == b"x" * 10
+    assert not cache.restore("missing", destination)
+
+
+def test_lru_eviction(tmp_path, cache):
+    """Test that the least recently used entries are evicted over the size limit."""
+    for key in ["first", "second"]:
+        cache.store(key, write_file(os.path.join(tmp_path, key), 400))
+        os.utime(cache.get_path(key), ns=(1, 1) if key == "first" else (2, 2))
+
+    # Using "first" makes "second" the least recently used entry
+    assert cache.restore("first", os.path.join(tmp_path, "used"))
+    cache.store("third", write_file(os.path.join(tmp_path, "third"), 400))
+
+    assert os.path.exists(cache.get_path("first"))
+    assert not os.path.exists(cache.get_path("second"))
+    assert os.path.exists(cache.get_path("third"))
+
+
+def test_data_run_uses_cache(tmp_path, monkeypatch, raw_trips):
+    """Test that a second Data.run is served from the cache."""
+    source = os.path.join(tmp_path, "source.parquet")
+    raw_trips.to_parquet(source)
+    cache = ArtifactCache(root=os.path.join(tmp_path, "cache"), max_bytes=2**30)
+    input_data = {"taxi_type": "green", "year": 2022, "month": 1}
+
+    data = Data(input_data, mode="cached", cache=cache)
+    data.paths["file_url"] = source
+    data.run(upload_s3=False)
+    expected = data.get_target_values()
+
+    def fail(*args, **kwargs):
+        raise AssertionError("The cached stages should be skipped")
+
+    monkeypatch.setattr(Data, "download_data", fail)
+    monkeypatch.setattr(Data, "prepare_data", fail)
+    monkeypatch.setattr(Data, "prepare_dictionaries", fail)
+
+    cached = Data(input_data, mode="cached", cache=cache)
+    cached.paths["file_url"] = source
+    cached.run(upload_s3=False)
+    assert list(cached.get_target_values()) == list(expected)
+
+    for stage in ["raw", "interim", "processed"]:
+        os.remove(cached.paths[stage])
+
+
+def test_unknown_source_version_is_not_cached(tmp_path, monkeypatch, raw_trips):
+    """Test that a source whose version is unknown is neither restored nor stored."""
+    import make_dataset
+
+    monkeypatch.setattr(make_dataset, "get_source_version", lambda file_url: None)
+    source = os.path.join(tmp_path, "source.parquet")
+    cache = ArtifactCache(root=os.path.join(tmp_path, "cache"), max_bytes=2**30)
+    input_data = {"taxi_type": "green", "year": 2022, "month": 1}
+
+    # The source changes between the runs, but its version cannot be retrieved
+    for distances in [[1.5, 2.0], [7.0, 8.0]]:
+        raw_trips.assign(trip_distance=distances).to_parquet(source)
+        data = Data(input_data, mode="offline", cache=cache)
+        data.paths["file_url"] = source
+        assert data.get_cache_keys() is None
+        data.run(upload_s3=False)
+        assert [record["trip_distance"] for record in data.data_dict] == distances
+
+    assert [files for _, _, files in os.walk(cache.root) if files] == []
+    for stage in ["raw", "interim", "processed"]:
+        os.remove(data.paths[stage])
+
+
+def test_month_runs_as_train_then_test(tmp_path, raw_trips):
+    """Test a month run as train then test, the test run hitting its interim file."""
+    source = os.path.join(tmp_path, "source.parquet")
+    raw_trips.to_parquet(source)
+    cache = ArtifactCache(root=os.path.join(tmp_path, "cache"), max_bytes=2**30)
+    input_data = {"taxi_type": "green", "year": 2022, "month": 1}
+
+    runs = {}
+    for mode in ["train", "test"]:
+        runs[mode] = Data(input_data, mode=mode, cache=cache)
+        runs[mode].paths["file_url"] = source
+        runs[mode].run(upload_s3=False)
+
+    assert not os.path.exists(runs["test"].paths["raw"])
+    assert list(runs["test"].get_target_values()) == list(
+        runs["train"].get_target_values()
+    )
+    keys = runs["test"].get_cache_keys()
+    assert os.path.exists(cache.get_path(keys["processed"]))
+
+    with pytest.raises(FileNotFoundError):
+        cache.store(keys["raw"], runs["test"].paths["raw"])
+
+    for data in runs.values():
+        for stage in ["raw", "interim", "processed"]:
+            if os.path.exists(data.paths[stage]):
+                os.remove(data.paths[stage])
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_overwriting_a_restored_path_keeps_the_entry(
+    tmp_path, monkeypatch, raw_trips, stream
+):
+    """Test that rewriting the hard-linked outputs of a run leaves the cache intact."""
+    source = os.path.join(tmp_path, "source.parquet")
+    raw_trips.to_parquet(source)
+    cache = ArtifactCache(root=os.path.join(tmp_path, "cache"), max_bytes=2**30)
+    input_data = {"taxi_type": "green", "year": 2022, "month": 1}
+
+    data = Data(input_data, mode="overwrite", cache=cache)
+    data.paths["file_url"] = source
+    data.run(stream=stream, upload_s3=False)
+    keys = data.get_cache_keys()
+    entries = {}
+    for stage in ["raw", "interim", "processed"]:
+        with open(cache.get_path(keys[stage]), "rb") as entry:
+            entries[stage] = entry.read()
+    assert cache.restore(keys["processed"], data.paths["processed"])
+
+    # An uncached run of the same month, on other trips, rewrites every output
+    other_source = os.path.join(tmp_path, "other.parquet")
+    raw_trips.assign(trip_distance=[7.0, 8.0]).to_parquet(other_source)
+    uncached = Data(input_data, mode="overwrite")
+    uncached.paths["file_url"] = other_source
+    uncached.run(stream=stream, upload_s3=False)
+    assert [record["trip_distance"] for record in uncached.data_dict] == [7.0, 8.0]
+
+    for stage in ["raw", "interim", "processed"]:
+        with open(cache.get_path(keys[stage]), "rb") as entry:
+            assert entry.read() == entries[stage]
+        os.remove(uncached.paths[stage])
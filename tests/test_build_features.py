@@ -0,0 +1,133 @@
+"""Unit tests of the PUDOEncoder class."""
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.feature_extraction import DictVectorizer
+
+sys.path.append("src/features")
+from build_features import PUDOEncoder, location_encoder, to_locations  # noqa: E402
+
+
+@pytest.fixture
+def features():
+    """
+    Create a sample features DataFrame.
+
+    Returns
+        pandas.DataFrame: A DataFrame with the PU_DO and trip_distance columns.
+    """
+    return pd.DataFrame(
+        {
+            "PU_DO": ["1_4", "2_5", "1_4", "3_6", "10_2"],
+            "trip_distance": [1.5, 2.0, 0.0, 3.0, 7.25],
+        }
+    )
+
+
+def test_same_feature_space_as_dict_vectorizer(features):
+    """Test that the encoder learns and produces the DictVectorizer features."""
+    records = features.to_dict(orient="records")
+    vectorizer = DictVectorizer().fit(records)
+    encoder = PUDOEncoder().fit(features)
+
+    assert encoder.feature_names_ == vectorizer.feature_names_
+    assert encoder.vocabulary_ == vectorizer.vocabulary_
+    assert (encoder.transform(features) != vectorizer.transform(records)).nnz == 0
+
+
+def test_transform_records_and_unknown_categories(features):
+    """Test that records are accepted and unseen PU_DO values are ignored."""
+    encoder = PUDOEncoder().fit(features)
+    matrix = encoder.transform([{"PU_DO": "99_99", "trip_distance": 4.0}])
+
+    assert matrix.shape == (1, len(encoder.feature_names_))
+    assert matrix.nnz == 1
+    assert matrix[0, encoder.vocabulary_["trip_distance"]] == 4.0
+
+
+def test_location_ids_build_pu_do(features):
+    """Test that PU_DO is built from the location IDs when it is missing."""
+    encoder = PUDOEncoder().fit(features)
+    matrix = encoder.transform(
+        {"PULocationID": 1, "DOLocationID": 4, "trip_distance": 1.0}
+    )
+
+    assert matrix[0, encoder.vocabulary_["PU_DO=1_4"]] == 1.0
+
+
+def test_location_ids_match_pu_do_strings():
+    """Test that only the PU_DO values written from location IDs get a pair key."""
+    frame = pd.DataFrame(
+        {
+            "PU_DO": ["09_4", "9_4", "1_4_2", "x_1", "12_0"],
+            "trip_distance": [1.0, 2.0, 3.0, 4.0, 5.0],
+        }
+    )
+    encoder = PUDOEncoder().fit(frame)
+    locations = pd.DataFrame(
+        {
+            "PULocationID": [9, 1, 12, 0],
+            "DOLocationID": [4, 4, 0, 9],
+            "trip_distance": [1.0, 1.0, 1.0, 1.0],
+        }
+    )
+    pu_do = locations.assign(
+        PU_DO=locations["PULocationID"].astype(str)
+        + "_"
+        + locations["DOLocationID"].astype(str)
+    )[["PU_DO", "trip_distance"]]
+
+    assert (encoder.transform(locations) != encoder.transform(pu_do)).nnz == 0
+    assert len(encoder.pair_index_[0]) == 2
+
+
+def test_dict_vectorizer_round_trip(features):
+    """Test the conversion to and from an equivalent DictVectorizer."""
+    encoder = PUDOEncoder().fit(features)
+    vectorizer = encoder.to_dict_vectorizer()
+    records = features.to_dict(orient="records")
+
+    assert (vectorizer.transform(records) != encoder.transform(features)).nnz == 0
+
+    restored = PUDOEncoder.from_dict_vectorizer(vectorizer)
+    assert (restored.transform(features) != encoder.transform(features)).nnz == 0
+
+    with pytest.raises(ValueError):
+        PUDOEncoder.from_dict_vectorizer(DictVectorizer().fit([{"other": "a"}]))
+
+
+def test_partial_fit_appends_new_categories(features):
+    """Test that partial_fit keeps the existing columns and appends the new ones."""
+    encoder = PUDOEncoder().fit(features)
+    vocabulary = dict(encoder.vocabulary_)
+    new = pd.DataFrame({"PU_DO": ["0_1", "1_4"], "trip_distance": [2.0, 3.0]})
+    matrix = encoder.partial_fit(new).transform(new)
+
+    assert {name: encoder.vocabulary_[name] for name in vocabulary} == vocabulary
+    assert encoder.vocabulary_["PU_DO=0_1"] == len(vocabulary)
+    assert list(encoder.categories_) == sorted(encoder.categories_)
+    assert matrix[0, len(vocabulary)] == 1.0
+    assert matrix[1, vocabulary["PU_DO=1_4"]] == 1.0
+
+    restored = PUDOEncoder.from_dict_vectorizer(encoder.to_dict_vectorizer())
+    assert (restored.transform(new) != matrix).nnz == 0
+    assert PUDOEncoder().partial_fit(features).vocabulary_ == vocabulary
+
+
+def test_location_encoder(features):
+    """Test that location IDs are parsed and the rare ones encoded as missing."""
+    locations = to_locations(
+        features.assign(PU_DO=features["PU_DO"].where(features.index != 4, "bad"))
+    )
+    assert list(locations.columns) == ["PULocationID", "DOLocationID", "trip_distance"]
+    assert locations["PULocationID"].tolist()[:4] == [1, 2, 1, 3]
+    assert locations.iloc[4].isna().tolist() == [True, True, False]
+
+    encoder = location_encoder(locations, max_categories=1).fit(locations)
+    encoded = encoder.transform(locations)
+    # Only PULocationID 1 and DOLocationID 4 are kept
+    np.testing.assert_array_equal(encoded[:, 0], [0, np.nan, 0, np.nan, np.nan])
+    np.testing.assert_array_equal(encoded[:, 1], [0, np.nan, 0, np.nan, np.nan])
+    np.testing.assert_array_equal(encoded[:, 2], features["trip_distance"])
@@ -0,0 +1,62 @@
+"""Unit tests of the TaskGraph class."""
+import sys
+import threading
+
+import pytest
+
+sys.path.append("src/utils")
+from dag import TaskGraph  # noqa: E402
+
+
+def test_tasks_get_the_results_of_their_dependencies():
+    """Test that each task runs after its dependencies, with their results."""
+    graph = TaskGraph()
+    graph.add("a", lambda: 2)
+    graph.add("b", lambda: 3)
+    graph.add("product", lambda a, b: a * b, after=["a", "b"])
+    graph.add("square", lambda product: product**2, after=["product"])
+
+    assert graph.run() == {"a": 2, "b": 3, "product": 6, "square": 36}
+    timings = {timing["task"]: timing for timing in graph.timings}
+    assert timings["square"]["start"] >= timings["product"]["end"]
+    assert "| square |" in graph.report()
+    assert "Wall time" in graph.report()
+
+
+def test_independent_tasks_run_concurrently():
+    """Test that independent tasks overlap: each one waits for the other."""
+    barrier = threading.Barrier(2, timeout=5)
+    graph = TaskGraph()
+    graph.add("left", barrier.wait)
+    graph.add("right", barrier.wait)
+
+    results = graph.run()
+    assert sorted(results.values()) == [0, 1]
+
+
+def test_failure_stops_the_dependent_tasks():
+    """Test that a failed task is raised and its dependents never start."""
+    started = []
+
+    def fail():
+        raise RuntimeError("boom")
+
+    graph = TaskGraph()
+    graph.add("fail", fail)
+    graph.add("other", lambda: started.append("other"))
+    graph.add("after", lambda _: started.append("after"), after=["fail"])
+
+    with pytest.raises(RuntimeError, match="boom"):
+        graph.run()
+    assert "after" not in started
+    assert "fail" in [timing["task"] for timing in graph.timings]
+
+
+def test_invalid_tasks():
+    """Test that duplicate names and unknown dependencies are rejected."""
+    graph = TaskGraph()
+    graph.add("a", lambda: None)
+    with pytest.raises(ValueError):
+        graph.add("a", lambda: None)
+    with pytest.raises(ValueError):
+        graph.add("b", lambda _: None, after=["missing"])
@@ -0,0 +1,149 @@
+"""Unit tests of the endpoint readiness waiter, with a stubbed SageMaker client."""
+import asyncio
+import sys
+import threading
+
+import pytest
+
+sys.path.append("deployment")
+import deploy  # noqa: E402
+from endpoint_waiter import backoff_delays, wait_for_endpoint  # noqa: E402
+
+
+class StubSageMakerClient:
+    """A stand-in for the SageMaker client, each endpoint going through statuses."""
+
+    def __init__(self, statuses, failure_reason="capacity error"):
+        """Answer the statuses in turn to the describe_endpoint of each endpoint."""
+        self.statuses = statuses
+        self.failure_reason = failure_reason
+        self.polls = {}
+        self.created = []
+        self.lock = threading.Lock()
+
+    def describe_endpoint(self, EndpointName):
+        """Describe an endpoint, at its next status."""
+        with self.lock:
+            count = self.polls.get(EndpointName, 0)
+            self.polls[EndpointName] = count + 1
+        status = self.statuses[min(count, len(self.statuses) - 1)]
+        response = {"EndpointName": EndpointName, "EndpointStatus": status}
+        if status == "Failed":
+            response["FailureReason"] = self.failure_reason
+        return response
+
+    def create_model(self, ModelName, Containers, ExecutionRoleArn):
+        """Create a model."""
+        self.created.append(ModelName)
+        return {"ModelArn": f"arn:{ModelName}"}
+
+    def create_endpoint_config(self, EndpointConfigName, ProductionVariants):
+        """Create an endpoint configuration."""
+        self.created.append(EndpointConfigName)
+
+    def create_endpoint(self, EndpointName, EndpointConfigName):
+        """Create an endpoint."""
+        self.created.append(EndpointName)
+        return {"EndpointArn": f"arn:{EndpointName}"}
+
+
+class FakeClock:
+    """A clock advanced by the sleeps of the waiter, which returns at once."""
+
+    def __init__(self):
+        """Start at 0."""
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        """Get the time."""
+        return self.now
+
+    async def sleep(self, seconds):
+        """Advance the time."""
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def wait(client, clock, **kwargs):
+    """Wait for the endpoint "ep" on the fake clock, without jitter."""
+    return asyncio.run(
+        wait_for_endpoint(
+            client, "ep", jitter=0, sleep=clock.sleep, clock=clock, **kwargs
+        )
+    )
+
+
+def test_backoff_grows_up_to_the_cap():
+    """Test the geometric backoff schedule and its jitter."""
+    delays = backoff_delays(1.0, max_delay=4.0, factor=2.0, jitter=0)
+    assert [next(delays) for _ in range(5)] == [1.0, 2.0, 4.0, 4.0, 4.0]
+    delays = backoff_delays(10.0, jitter=0.1)
+    assert 9.0 <= next(delays) <= 11.0
+
+
+def test_waits_until_in_service():
+    """Test that the waiter backs off, and starts again on a new status."""
+    client = StubSageMakerClient(
+        ["Creating", "Creating", "Creating", "Updating", "InService"]
+    )
+    clock = FakeClock()
+    response = wait(client, clock, initial_delay=1.0, factor=2.0)
+
+    assert response["EndpointStatus"] == "InService"
+    assert clock.sleeps == [1.0, 2.0, 4.0, 1.0]
+
+
+def test_terminal_failure_is_raised_at_once():
+    """Test that a failed endpoint raises its failure reason without waiting."""
+    client = StubSageMakerClient(["Creating", "Failed"])
+    clock = FakeClock()
+    with pytest.raises(RuntimeError, match="Failed: capacity error"):
+        wait(client, clock)
+    assert client.polls == {"ep": 2}
+
+
+def test_timeout():
+    """Test that the waiter gives up after the timeout, its last sleep shortened."""
+    client = StubSageMakerClient(["Creating"])
+    clock = FakeClock()
+    with pytest.raises(TimeoutError, match="still Creating"):
+        wait(client, clock, timeout=10.0, initial_delay=4.0, factor=1.0)
+    assert clock.sleeps == [4.0, 4.0, 2.0]
+
+
+def test_variants_are_deployed_concurrently(monkeypatch):
+    """Test that every variant gets its own endpoint, and its phases are timed."""
+    client = StubSageMakerClient(["Creating", "InService"])
+    deployer = deploy.Deployer(client, "model.tar.gz", None)
+    monkeypatch.setattr(deploy, "ENDPOINT_POLL_DELAY", 0.01)
+    monkeypatch.setattr(deployer, "get_production_ready_model", lambda: "MOD-3")
+    monkeypatch.setattr(
+        deployer, "upload_model_artifact_to_s3", lambda: "s3://bucket/model.tar.gz"
+    )
+    monkeypatch.setattr(deployer, "get_sklearn_image", lambda: "image")
+
+    endpoints, model_version = deployer.deploy_variants(["model", "forest"])
+
+    assert model_version == "MOD-3"
+    assert sorted(endpoints) == ["forest", "model"]
+    assert endpoints["model"] != endpoints["forest"]
+    assert all(endpoint.endswith(variant) for variant, endpoint in endpoints.items())
+    assert len(client.created) == 6
+    phases = {(phase["variant"], phase["phase"]) for phase in deployer.phases}
+    assert ("forest", "wait_for_endpoint") in phases
+    assert ("all", "upload_model_artifact_to_s3") in phases
+    assert "| model | create_endpoint |" in deployer.phase_report()
+
+
+def test_failed_variant_is_raised(monkeypatch):
+    """Test that a failed variant fails the deployment."""
+    client = StubSageMakerClient(["Creating", "Failed"])
+    deployer = deploy.Deployer(client, "model.tar.gz", None)
+    monkeypatch.setattr(deploy, "ENDPOINT_POLL_DELAY", 0.01)
+    monkeypatch.setattr(deployer, "get_production_ready_model", lambda: "MOD-3")
+    monkeypatch.setattr(deployer, "upload_model_artifact_to_s3", lambda: "s3://b/k")
+    monkeypatch.setattr(deployer, "get_sklearn_image", lambda: "image")
+
+    with pytest.raises(RuntimeError, match="capacity error"):
+        deployer.deploy()
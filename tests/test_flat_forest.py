@@ -0,0 +1,130 @@
+"""Unit tests of the FlatForest predictor."""
+import sys
+
+import numpy as np
+import pytest
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.feature_extraction import DictVectorizer
+from sklearn.pipeline import make_pipeline
+
+sys.path.append("deployment")
+sys.path.append("src/models")
+from flat_forest import FlatForest, load_npz  # noqa: E402
+from inference import model_fn, predict_fn  # noqa: E402
+from train_model import Trainer  # noqa: E402
+
+
+@pytest.fixture
+def trainer_dir(tmp_path, trips):
+    """
+    Train a small Trainer, then save its pipeline as model.joblib and its forest.
+
+    Returns
+        str: The model directory.
+    """
+    trainer = Trainer(
+        trips[["PU_DO", "trip_distance"]],
+        trips["duration"].to_numpy(),
+        params={"n_estimators": 5, "max_depth": 4},
+        root_folder=str(tmp_path),
+    )
+    trainer.train()
+    trainer.pipeline_path = str(tmp_path / "model.joblib")
+    trainer.save_pipeline()
+    trainer.export_forest()
+    return str(tmp_path)
+
+
+def test_matches_dict_vectorizer_pipeline(trips):
+    """Test that the flat forest predicts like the DictVectorizer pipeline."""
+    records = trips[["PU_DO", "trip_distance"]].to_dict("records")
+    pipeline = make_pipeline(
+        DictVectorizer(), RandomForestRegressor(n_estimators=10, random_state=0)
+    ).fit(records[:400], trips["duration"][:400])
+    forest = FlatForest.from_pipeline(pipeline)
+
+    # Unseen pairs (like "99_99") are ignored, as DictVectorizer does
+    unseen = {"PU_DO": "99_99", "trip_distance": 4.0}
+    expected = pipeline.predict([*records, unseen])
+    predictions = forest.predict(
+        [*trips["PU_DO"], unseen["PU_DO"]],
+        [*trips["trip_distance"], unseen["trip_distance"]],
+        chunk_size=64,
+    )
+    np.testing.assert_allclose(predictions, expected, rtol=1e-9)
+    np.testing.assert_allclose(
+        forest.predict_locations(
+            trips["PULocationID"].astype(float),
+            trips["DOLocationID"],
+            trips["trip_distance"],
+        ),
+        expected[:-1],
+        rtol=1e-9,
+    )
+
+
+def test_trainer_export(tmp_path, trips):
+    """Test that Trainer.export_forest saves a forest that loads back."""
+    trainer = Trainer(
+        trips[["PU_DO", "trip_distance"]],
+        trips["duration"].to_numpy(),
+        params={"n_estimators": 5, "max_depth": 4},
+        root_folder=str(tmp_path),
+    )
+    trainer.train()
+    trainer.save_pipeline()
+    trainer.export_forest()
+
+    forest = FlatForest.load(trainer.forest_path)
+    assert forest.max_depth <= 4
+    assert forest.nbytes > 0
+    np.testing.assert_allclose(
+        forest.predict(trips["PU_DO"], trips["trip_distance"]),
+        trainer.predict_batch(trips[["PU_DO", "trip_distance"]]),
+        rtol=1e-9,
+    )
+
+
+def test_memory_mapped_load(tmp_path, trips):
+    """Test that the saved arrays are memory-mapped in place and predict the same."""
+    records = trips[["PU_DO", "trip_distance"]].to_dict("records")
+    pipeline = make_pipeline(
+        DictVectorizer(), RandomForestRegressor(n_estimators=5, random_state=0)
+    ).fit(records, trips["duration"])
+    path = str(tmp_path / "model.npz")
+    FlatForest.from_pipeline(pipeline).save(path)
+
+    arrays = load_npz(path, mmap_mode="r")
+    assert all(isinstance(array, np.memmap) for array in arrays.values())
+    assert not arrays["children"].flags.writeable
+    for name, array in load_npz(path).items():
+        np.testing.assert_array_equal(arrays[name], array)
+
+    forest = FlatForest.load(path, mmap_mode="r")
+    np.testing.assert_allclose(
+        forest.predict(trips["PU_DO"], trips["trip_distance"]),
+        pipeline.predict(records),
+        rtol=1e-9,
+    )
+
+
+def test_inference_forest_mode(trainer_dir, trips, monkeypatch):
+    """Test that model_fn serves the flattened forest when the mode is on."""
+    requests = trips[["PULocationID", "DOLocationID", "trip_distance"]]
+    expected = predict_fn(requests, model_fn(trainer_dir))
+
+    monkeypatch.setenv("PREDICTION_MODE", "forest")
+    model = model_fn(trainer_dir)
+    assert isinstance(model, FlatForest)
+    np.testing.assert_allclose(predict_fn(requests, model), expected, rtol=1e-9)
+    np.testing.assert_allclose(
+        predict_fn(requests.astype({"PULocationID": str}), model), expected, rtol=1e-9
+    )
+
+
+def test_rejects_other_pipelines(trips):
+    """Test that pipelines without a fitted forest are rejected."""
+    pipeline = make_pipeline(DictVectorizer())
+    pipeline.fit(trips[["PU_DO", "trip_distance"]].to_dict("records"))
+    with pytest.raises(ValueError):
+        FlatForest.from_pipeline(pipeline)
@@ -0,0 +1,59 @@
+"""Test that the entry points do not import their heavy optional dependencies."""
+import json
+import subprocess
+import sys
+
+import pytest
+
+OPTIONAL = {"boto3", "botocore", "neptune", "sagemaker", "hydra"}
+
+
+def loaded_modules(path, module):
+    """
+    Import a module in a fresh interpreter.
+
+    Args:
+        path (str): The folder to add to sys.path.
+        module (str): The module to import.
+
+    Returns:
+        set: The top-level packages loaded after the import.
+    """
+    code = (
+        f"import sys; sys.path.append({path!r}); import {module}; "
+        "import json; print(json.dumps(sorted(sys.modules)))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    )
+    return {name.split(".")[0] for name in json.loads(result.stdout.splitlines()[-1])}
+
+
+@pytest.mark.parametrize(
+    "path, module",
+    [
+        ("deployment", "deploy"),
+        ("src/utils", "utils"),
+        ("src/utils", "uploader"),
+        ("src/models", "train_model"),
+    ],
+)
+def test_optional_dependencies_are_lazy(path, module):
+    """Test that boto3, Neptune, SageMaker and Hydra are imported where used."""
+    assert not loaded_modules(path, module) & OPTIONAL
+
+
+def test_inference_does_not_import_the_training_stack():
+    """Test that the inference handlers import neither sklearn nor SciPy."""
+    assert not loaded_modules("deployment", "inference") & (
+        OPTIONAL | {"sklearn", "scipy", "joblib"}
+    )
+
+
+def test_training_does_not_import_the_serving_code():
+    """Test that train_model imports the deployment modules where they are used."""
+    assert not loaded_modules("src/models", "train_model") & {
+        "flat_forest",
+        "lookup_table",
+        "registry",
+    }
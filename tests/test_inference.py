@@ -0,0 +1,215 @@
+"""Unit tests of the SageMaker inference handlers."""
+import io
+import json
+import sys
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pytest
+
+sys.path.append("deployment")
+sys.path.append("src/features")
+from build_features import PUDOEncoder  # noqa: E402
+from inference import (  # noqa: E402
+    _encode,
+    input_fn,
+    model_fn,
+    negotiate,
+    output_fn,
+    predict_fn,
+)
+
+
+@pytest.fixture
+def records():
+    """
+    Create sample request records.
+
+    Returns
+        list: A list of 50 records with location IDs and trip_distance.
+    """
+    rng = np.random.default_rng(0)
+    return [
+        {
+            "PULocationID": int(rng.integers(1, 10)),
+            "DOLocationID": int(rng.integers(1, 10)),
+            "trip_distance": float(rng.random() * 10),
+        }
+        for _ in range(50)
+    ]
+
+
+def expected(model, records):
+    """Predict the records one by one through the whole pipeline."""
+    return [
+        int(
+            model.predict(
+                [
+                    {
+                        "PU_DO": f"{r['PULocationID']}_{r['DOLocationID']}",
+                        "trip_distance": r["trip_distance"],
+                    }
+                ]
+            )[0]
+        )
+        for r in records
+    ]
+
+
+def invoke(model, body, content_type, accept="application/json"):
+    """Run a request through input_fn, predict_fn and output_fn."""
+    return output_fn(predict_fn(input_fn(body, content_type), model), accept)
+
+
+def test_single_record(model_dir, records):
+    """Test that a single record keeps the {"Output": int} response."""
+    model = model_fn(model_dir)
+    response = invoke(model, json.dumps({"Input": records[0]}), "application/json")
+    assert response == {"Output": expected(model, records[:1])[0]}
+
+
+@pytest.mark.parametrize("wrapped", [True, False])
+def test_json_array(model_dir, records, wrapped):
+    """Test that a JSON array of records returns the outputs in order."""
+    model = model_fn(model_dir)
+    body = json.dumps({"Input": records} if wrapped else records)
+    response = invoke(model, body.encode(), "application/json; charset=utf-8")
+    assert response == {"Output": expected(model, records)}
+
+
+def test_json_lines(model_dir, records):
+    """Test that JSON Lines requests get one output line per record."""
+    model = model_fn(model_dir)
+    body = "\n".join(json.dumps(record) for record in records) + "\n"
+    response = invoke(model, body, "application/jsonlines", "application/jsonlines")
+    outputs = [json.loads(line)["Output"] for line in response.splitlines()]
+    assert outputs == expected(model, records)
+
+
+def test_unknown_pairs_and_pu_do(model_dir, records):
+    """Test unseen location pairs and records that already hold PU_DO."""
+    model = model_fn(model_dir)
+    batch = pd.DataFrame(
+        [
+            {"PU_DO": "1000_1000", "trip_distance": 2.0},
+            {"PU_DO": "1_1", "trip_distance": 3.0},
+        ]
+    )
+    assert list(predict_fn(batch, model)) == list(
+        model.predict(batch.to_dict("records"))
+    )
+
+
+def test_pairs_are_indexed_by_model_fn(model_dir, records):
+    """Test that model_fn indexes the pairs, and requests leave the model as is."""
+    model = model_fn(model_dir)
+    vectorizer = model.steps[0][1]
+    index = vectorizer.pair_index_
+    state = dict(vars(vectorizer))
+
+    batch = pd.DataFrame([*records, {**records[0], "PULocationID": 1000}])
+    assert list(predict_fn(batch, model)) == list(
+        model.predict(
+            batch.assign(
+                PU_DO=batch["PULocationID"].astype(str)
+                + "_"
+                + batch["DOLocationID"].astype(str)
+            )[["PU_DO", "trip_distance"]].to_dict("records")
+        )
+    )
+    assert vars(vectorizer) == state
+    assert vectorizer.pair_index_ is index
+
+
+def test_serving_encodes_like_training(model_dir, records):
+    """Test that the handlers and PUDOEncoder build the same sparse rows."""
+    vectorizer = model_fn(model_dir).steps[0][1]
+    encoder = PUDOEncoder.from_dict_vectorizer(vectorizer)
+    batch = pd.DataFrame([*records, {**records[0], "PULocationID": 1000}])
+    pu_do = batch.assign(
+        PU_DO=batch["PULocationID"].astype(str)
+        + "_"
+        + batch["DOLocationID"].astype(str)
+    )[["PU_DO", "trip_distance"]]
+
+    for frame in [batch, pu_do]:
+        served, trained = _encode(frame, vectorizer), encoder.transform(frame)
+        assert served.dtype == trained.dtype
+        assert (served != trained).nnz == 0
+
+
+def test_unsupported_content_type(model_dir):
+    """Test that other content types are rejected."""
+    with pytest.raises(ValueError):
+        input_fn("1,2,3", "text/plain")
+    with pytest.raises(ValueError):
+        output_fn(np.ones(2), "text/plain")
+
+
+def encode(frame, content_type):
+    """Encode a DataFrame of records in one of the binary or columnar formats."""
+    if content_type == "application/x-npy":
+        buffer = io.BytesIO()
+        np.save(buffer, frame.to_numpy(dtype=np.float64))
+        return buffer.getvalue()
+    if content_type == "text/csv":
+        return frame.to_csv(index=False, header=False).encode()
+    table = pa.Table.from_pandas(frame, preserve_index=False)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def decode(body, content_type):
+    """Decode a binary or columnar response into an array of predictions."""
+    if content_type == "application/x-npy":
+        return np.load(io.BytesIO(body))
+    if content_type == "text/csv":
+        return np.asarray([float(line) for line in body.splitlines()])
+    return pa.ipc.open_stream(body).read_all().column("Output").to_numpy()
+
+
+@pytest.mark.parametrize(
+    "content_type",
+    ["application/x-npy", "text/csv", "application/vnd.apache.arrow.stream"],
+)
+def test_binary_encodings(model_dir, records, content_type):
+    """Test that each encoding round-trips to the same predictions as JSON."""
+    model = model_fn(model_dir)
+    frame = pd.DataFrame(records)
+    response = invoke(model, encode(frame, content_type), content_type, content_type)
+    expected_values = model.predict(
+        [
+            {
+                "PU_DO": f"{r['PULocationID']}_{r['DOLocationID']}",
+                "trip_distance": r["trip_distance"],
+            }
+            for r in records
+        ]
+    )
+    np.testing.assert_allclose(decode(response, content_type), expected_values)
+
+
+def test_npy_structured_and_csv_header(model_dir, records):
+    """Test structured .npy arrays and CSV bodies with a header."""
+    model = model_fn(model_dir)
+    frame = pd.DataFrame(records)
+    buffer = io.BytesIO()
+    np.save(buffer, frame.to_records(index=False))
+    structured = predict_fn(input_fn(buffer.getvalue(), "application/x-npy"), model)
+    with_header = predict_fn(
+        input_fn(frame.to_csv(index=False).encode(), "text/csv"), model
+    )
+    np.testing.assert_allclose(structured, predict_fn(frame, model))
+    np.testing.assert_allclose(with_header, predict_fn(frame, model))
+
+
+def test_negotiate():
+    """Test that the Accept header picks the preferred supported content type."""
+    assert negotiate(None) == "application/json"
+    assert negotiate("*/*") == "application/json"
+    assert negotiate("text/csv") == "text/csv"
+    assert negotiate("application/json;q=0.5, application/x-npy") == "application/x-npy"
+    assert negotiate("text/html, text/csv;q=0.2") == "text/csv"
@@ -0,0 +1,117 @@
+"""Unit tests of the instrumentation stages."""
+import json
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.append("src/models")
+sys.path.append("src/utils")
+import instrumentation  # noqa: E402
+from instrumentation import stage  # noqa: E402
+from train_model import Trainer  # noqa: E402
+
+
+@pytest.fixture
+def enabled(tmp_path):
+    """
+    Turn the instrumentation on, with a JSON lines file, for one test.
+
+    Returns
+        str: The location of the JSON lines file.
+    """
+    path = str(tmp_path / "stages.jsonl")
+    instrumentation.reset()
+    instrumentation.enable(path)
+    yield path
+    instrumentation.disable()
+    instrumentation._PATH = None
+    instrumentation.reset()
+
+
+def test_disabled_stages_record_nothing():
+    """Test that the stages only run the code when the instrumentation is off."""
+    instrumentation.reset()
+
+    @stage("double", rows=lambda x: x)
+    def double(x):
+        return 2 * x
+
+    with stage("block") as block:
+        assert double(2) == 4
+    assert block.record is None
+    assert instrumentation.get_records() == []
+
+
+def test_stages_record_their_measures(enabled):
+    """Test the measures of nested stages, and their JSON lines."""
+
+    @stage("inner", rows=lambda values: len(values))
+    def inner(values):
+        return sum(values)
+
+    with stage("outer", rows=3) as outer:
+        assert inner([1, 2, 3]) == 6
+
+    records = instrumentation.get_records()
+    assert [record["stage"] for record in records] == ["inner", "outer"]
+    assert records[0]["parent"] == "outer"
+    assert records[0]["rows"] == 3
+    assert outer.record == records[1]
+    for record in records:
+        assert record["ok"]
+        assert record["wall_s"] >= 0
+        assert record["cpu_s"] >= 0
+        assert record["peak_rss_mb"] > 0
+    with open(enabled) as infile:
+        assert [json.loads(line) for line in infile] == records
+
+
+def test_failed_stages_are_recorded(enabled):
+    """Test that a stage raising an error is recorded as failed, and re-raises."""
+    with pytest.raises(ValueError):
+        with stage("fail"):
+            raise ValueError("boom")
+    (record,) = instrumentation.get_records()
+    assert not record["ok"]
+
+
+def test_summary(enabled):
+    """Test the aggregation by stage, its Markdown table and its Neptune fields."""
+    for rows in [10, 20]:
+        with stage("prepare", rows=rows):
+            pass
+    with stage("train"):
+        pass
+
+    summary = instrumentation.summarize()
+    assert list(summary) == ["prepare", "train"]
+    assert summary["prepare"]["calls"] == 2
+    assert summary["prepare"]["rows"] == 30
+    assert summary["train"]["rows"] is None
+    table = instrumentation.summary_table()
+    assert "| prepare | 2 |" in table
+    assert table.splitlines()[-1].endswith("|  |")
+
+    run = {}
+    instrumentation.log_to_neptune(run)
+    assert run["instrumentation/prepare/rows"] == 30
+    assert "instrumentation/train/rows" not in run
+
+
+def test_trainer_stages(enabled):
+    """Test that the Trainer records its training and evaluation stages."""
+    features = [{"PU_DO": "1_2", "trip_distance": 1.0}] * 10
+    trainer = Trainer(
+        features,
+        np.ones(10),
+        features[:4],
+        np.ones(4),
+        params={"n_estimators": 2, "max_depth": 2},
+    )
+    trainer.train()
+    trainer.evaluate()
+
+    summary = instrumentation.summarize()
+    assert summary["Trainer.train"]["rows"] == 10
+    assert summary["Trainer.evaluate"]["rows"] == 4
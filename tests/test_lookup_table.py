@@ -0,0 +1,150 @@
+"""Unit tests of the prediction lookup table."""
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+from joblib import load
+
+sys.path.append("deployment")
+sys.path.append("src/models")
+from inference import LookupModel, model_fn, predict_fn  # noqa: E402
+from lookup_table import LookupTable, split_pu_do  # noqa: E402
+from train_model import Trainer  # noqa: E402
+
+LOCATION_COLUMNS = ["PULocationID", "DOLocationID", "trip_distance"]
+
+
+@pytest.fixture
+def trainer(tmp_path, trips):
+    """
+    Train a small Trainer on the sample trips, from their location IDs.
+
+    Returns
+        Trainer: The trained Trainer.
+    """
+    trainer = Trainer(
+        trips[LOCATION_COLUMNS],
+        trips["duration"].to_numpy(),
+        trips[LOCATION_COLUMNS],
+        trips["duration"].to_numpy(),
+        params={"n_estimators": 5, "max_depth": 6},
+        root_folder=str(tmp_path),
+    )
+    trainer.train()
+    return trainer
+
+
+def test_split_pu_do():
+    """Test that PU_DO values are split into location IDs, NaN when invalid."""
+    pu_location, do_location = split_pu_do(["9_70", "1_x", "nan"])
+    np.testing.assert_array_equal(pu_location, [9, 1, np.nan])
+    np.testing.assert_array_equal(do_location, [70, np.nan, np.nan])
+
+
+def test_lookup_matches_model_on_the_grid(trainer):
+    """Test grid points, interpolation, unknown pairs and out-of-range zones."""
+    table = trainer.build_lookup_table(n_buckets=20, max_distance=10.0)
+    assert table.values.shape[1] == 21
+    assert table.nbytes == (
+        table.pair_index.nbytes
+        + table.pu_index.nbytes
+        + table.do_index.nbytes
+        + table.values.nbytes
+    )
+
+    on_grid = pd.DataFrame(
+        {"PULocationID": [3, 5, 200], "DOLocationID": [4, 2, 1]}
+    ).assign(trip_distance=[2.5, 7.0, 1.0])
+    predictions = table.predict(
+        on_grid["PULocationID"], on_grid["DOLocationID"], on_grid["trip_distance"]
+    )
+    np.testing.assert_allclose(
+        predictions[:2], trainer.predict_batch(on_grid[:2]), rtol=1e-6
+    )
+    # Zone 200 is beyond the index: the model has to answer
+    assert np.isnan(predictions[2])
+
+    low, high = table.predict([3, 3], [4, 4], [2.5, 3.0])
+    middle = table.predict(3, 4, 2.75)[0]
+    assert middle == pytest.approx((low + high) / 2, rel=1e-6)
+
+    # Zone 0 is in the index but was never seen: no PU_DO indicator
+    assert table.pair_index[0, 1] == 0
+    assert table.predict(0, 1, 4.0)[0] == pytest.approx(
+        trainer.predict_batch({"PU_DO": ["0_1"], "trip_distance": [4.0]})[0],
+        rel=1e-6,
+    )
+
+    loaded = LookupTable.load(trainer.lookup_path)
+    np.testing.assert_array_equal(loaded.values, table.values)
+    assert loaded.step == table.step
+
+    rmse, model_rmse = trainer.evaluate_lookup(table)
+    assert rmse > 0
+    assert model_rmse < rmse
+
+
+def test_half_known_pairs_match_the_model(tmp_path, trips):
+    """Test that pairs with one unseen zone get the model's predictions (HGB)."""
+    trips = trips.assign(duration=trips["duration"] - trips["DOLocationID"])
+    trainer = Trainer(
+        trips[LOCATION_COLUMNS],
+        trips["duration"].to_numpy(),
+        trips[LOCATION_COLUMNS],
+        trips["duration"].to_numpy(),
+        params={"backend": "hist_gradient_boosting", "max_iter": 20},
+        root_folder=str(tmp_path),
+    )
+    trainer.train()
+    table = trainer.build_lookup_table(n_buckets=20, max_distance=10.0)
+
+    # Zone 0 is in the index but unknown to the encoder
+    requests = pd.DataFrame(
+        {
+            "PULocationID": [3, 0, 0, 5],
+            "DOLocationID": [0, 4, 0, 2],
+            "trip_distance": [2.5, 7.0, 1.0, 4.0],
+        }
+    )
+    predictions = table.predict(
+        requests["PULocationID"], requests["DOLocationID"], requests["trip_distance"]
+    )
+    np.testing.assert_allclose(predictions, trainer.predict_batch(requests), rtol=1e-5)
+    assert predictions[0] != predictions[1] != predictions[2]
+
+    loaded = LookupTable.load(trainer.lookup_path)
+    np.testing.assert_array_equal(loaded.pu_index, table.pu_index)
+    np.testing.assert_array_equal(loaded.do_index, table.do_index)
+
+
+def test_inference_lookup_mode(trainer, tmp_path, monkeypatch):
+    """Test that model_fn serves the lookup table when the mode is on."""
+    trainer.save_pipeline()
+    trainer.build_lookup_table(n_buckets=100, max_distance=10.0)
+    model_dir = tmp_path / "model"
+    model_dir.mkdir()
+    (model_dir / "model.joblib").write_bytes(open(trainer.pipeline_path, "rb").read())
+    (model_dir / "lookup.npz").write_bytes(open(trainer.lookup_path, "rb").read())
+
+    requests = pd.DataFrame(
+        {
+            "PULocationID": [3, 5, 300],
+            "DOLocationID": [4, 2, 1],
+            "trip_distance": [2.5, 7.0, 1.0],
+        }
+    )
+    assert not isinstance(model_fn(str(model_dir)), LookupModel)
+
+    monkeypatch.setenv("PREDICTION_MODE", "lookup")
+    model = model_fn(str(model_dir))
+    assert isinstance(model, LookupModel)
+    # Zone 300 falls back to the model, the other rows are on the grid
+    np.testing.assert_allclose(
+        predict_fn(requests, model),
+        predict_fn(requests, load(trainer.pipeline_path)),
+        rtol=1e-6,
+    )
+    assert predict_fn(
+        {"PULocationID": 3, "DOLocationID": 4, "trip_distance": 2.5}, model
+    ) == pytest.approx(model.predict(requests[:1])[0])
@@ -1,14 +1,16 @@
 """Unit tests of the Data class methods."""
 import os
+import pickle
 import sys
 
 import numpy as np
 import pandas as pd
+import pyarrow as pa
 import pytest
 
 sys.path.append("src/data")
 from dotenv import load_dotenv  # noqa: E402
-from make_dataset import Data  # noqa: E402
+from make_dataset import Data, iter_processed, load_processed  # noqa: E402
 
 load_dotenv()
 DATA_ROOT_LOCAL_FOLDER = os.getenv("DATA_ROOT_LOCAL_FOLDER")
@@ -187,9 +189,15 @@ def test_prepare_dictionaries(input_data, sample_interim_dataframe):
     # Check if the processed folder is created
     assert os.path.exists(os.path.join(DATA_ROOT_LOCAL_FOLDER, "processed"))
 
-    # Check if the dictionary file is saved
+    # Check if the processed file is saved
     assert os.path.exists(data.paths["processed"])
 
+    # Check if the processed file holds the dictionary-encoded PU_DO column
+    table = load_processed(data.paths["processed"], columns=["PU_DO", "duration"])
+    assert table.column_names == ["PU_DO", "duration"]
+    assert pa.types.is_dictionary(table.schema.field("PU_DO").type)
+    assert table.column("PU_DO").to_pylist() == expected_pu_do.tolist()
+
     # Delete the interim file
     os.remove(data.paths["interim"])
     assert not os.path.exists(data.paths["interim"])
@@ -214,3 +222,159 @@ def test_get_target_values(input_data, sample_interim_dataframe):
     data.data_frame = sample_interim_dataframe
     target_values = data.get_target_values()
     assert isinstance(target_values, np.ndarray)
+
+
+def test_load_processed_legacy_pickle(tmp_path, sample_interim_dataframe):
+    """
+    Test that load_processed still reads the legacy pickled records.
+
+    Args:
+        tmp_path: The temporary directory provided by pytest.
+        sample_interim_dataframe: The data frame to be used for testing.
+    """
+    records = sample_interim_dataframe[["trip_distance", "duration"]].to_dict(
+        orient="records"
+    )
+    path = os.path.join(tmp_path, "legacy.pkl")
+    with open(path, "wb") as dict_file:
+        pickle.dump(records, dict_file)
+
+    table = load_processed(path, columns=["trip_distance"])
+    assert table.column_names == ["trip_distance"]
+    assert table.column("trip_distance").to_pylist() == [1.5, 2.0, 3.0]
+
+
+def test_iter_processed(tmp_path):
+    """
+    Test that iter_processed cuts the artifacts into chunks of equal size.
+
+    Args:
+        tmp_path: The temporary directory provided by pytest.
+    """
+    from pyarrow import feather
+
+    paths = []
+    for index, n_rows in enumerate([7, 5]):
+        path = os.path.join(tmp_path, f"processed_{index}.arrow")
+        feather.write_feather(
+            pa.table({"trip_distance": np.arange(n_rows) + 10.0 * index}),
+            path,
+            compression="uncompressed",
+        )
+        paths.append(path)
+
+    chunks = list(iter_processed(paths, ["trip_distance"], chunk_size=5))
+    assert [chunk.num_rows for chunk in chunks] == [4, 4, 4]
+    assert pa.concat_tables(chunks).column("trip_distance").to_pylist() == [
+        *range(7),
+        *range(10, 15),
+    ]
+
+
+def test_stream_data(tmp_path, input_data, raw_data_frame):
+    """
+    Test that the streaming path produces the same outputs as the in-memory path.
+
+    Args:
+        tmp_path: The temporary directory provided by pytest.
+        input_data: The input data for the test.
+        raw_data_frame: The data frame to be used as the remote file.
+    """
+    source = os.path.join(tmp_path, "source.parquet")
+    raw_data_frame.to_parquet(source)
+
+    data = Data(input_data, mode="stream")
+    data.paths["file_url"] = source
+    data.stream_data(upload_s3=False, batch_size=1)
+
+    assert os.path.exists(data.paths["raw"])
+    assert len(pd.read_parquet(data.paths["interim"])) == len(raw_data_frame)
+    assert data.data_frame is None
+
+    expected = Data(input_data, mode="memory")
+    expected.data_frame = raw_data_frame
+    expected.prepare_data(upload_s3=False)
+    expected.prepare_dictionaries(upload_s3=False)
+
+    features = data.get_features()
+    assert features.column("PU_DO").to_pylist() == ["1_3", "2_4"]
+    assert features.column("PU_DO").to_pylist() == list(
+        expected.get_features()["PU_DO"]
+    )
+    np.testing.assert_array_equal(
+        data.get_target_values(), expected.get_target_values()
+    )
+
+    for paths in [data.paths, expected.paths]:
+        for stage in ["raw", "interim", "processed"]:
+            if os.path.exists(paths[stage]):
+                os.remove(paths[stage])
+
+
+def test_data_range(tmp_path, monkeypatch, raw_data_frame):
+    """
+    Test that DataRange prepares every month and combines them.
+
+    Args:
+        tmp_path: The temporary directory provided by pytest.
+        monkeypatch: The pytest fixture used to point BASE_URL to tmp_path.
+        raw_data_frame: The data frame to be used as each remote file.
+    """
+    import make_dataset
+
+    months = [(2021, 12), (2022, 1)]
+    for year, month in months:
+        raw_data_frame.to_parquet(
+            os.path.join(tmp_path, f"green_tripdata_{year:04d}-{month:02d}.parquet")
+        )
+    monkeypatch.setattr(make_dataset, "BASE_URL", f"{tmp_path}{os.sep}")
+
+    data_range = make_dataset.DataRange(["green"], months, mode="range", max_workers=2)
+    data_range.run(upload_s3=False)
+
+    assert data_range.get_features().column_names == ["PU_DO", "trip_distance"]
+    assert data_range.get_features().num_rows == 2 * len(raw_data_frame)
+    assert len(data_range.get_target_values()) == 2 * len(raw_data_frame)
+
+    for data in data_range.datasets:
+        for stage in ["raw", "interim", "processed"]:
+            os.remove(data.paths[stage])
+
+
+def test_data_range_taxi_types(tmp_path, monkeypatch, raw_data_frame):
+    """
+    Test that DataRange prepares green and yellow months, timed by their columns.
+
+    Args:
+        tmp_path: The temporary directory provided by pytest.
+        monkeypatch: The pytest fixture used to point BASE_URL to tmp_path.
+        raw_data_frame: The data frame to be used as the green remote file.
+    """
+    import make_dataset
+
+    yellow_data_frame = raw_data_frame.rename(
+        columns={
+            "lpep_pickup_datetime": "tpep_pickup_datetime",
+            "lpep_dropoff_datetime": "tpep_dropoff_datetime",
+        }
+    ).assign(tpep_dropoff_datetime=pd.to_datetime(["2022-01-01 00:11:00"] * 2))
+    raw_data_frame.to_parquet(os.path.join(tmp_path, "green_tripdata_2022-01.parquet"))
+    yellow_data_frame.to_parquet(
+        os.path.join(tmp_path, "yellow_tripdata_2022-01.parquet")
+    )
+    monkeypatch.setattr(make_dataset, "BASE_URL", f"{tmp_path}{os.sep}")
+
+    for stream in [False, True]:
+        data_range = make_dataset.DataRange(
+            ["green", "yellow"], [(2022, 1)], mode="types", max_workers=2
+        )
+        data_range.run(stream=stream, upload_s3=False)
+
+        assert data_range.get_features().num_rows == 2 * len(raw_data_frame)
+        np.testing.assert_allclose(
+            data_range.get_target_values(), [3.0, 3.0, 33.0, 30.0]
+        )
+
+        for data in data_range.datasets:
+            for stage in ["raw", "interim", "processed"]:
+                os.remove(data.paths[stage])
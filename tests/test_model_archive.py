@@ -0,0 +1,117 @@
+"""Unit tests of the model artifacts packaging, against a local S3 stand-in."""
+import io
+import os
+import sys
+import tarfile
+
+import pytest
+
+sys.path.append("deployment")
+import deploy  # noqa: E402
+from model_archive import S3MultipartWriter, package_to_s3, write_archive  # noqa: E402
+
+
+class FakeSession:
+    """A stand-in for the boto3 session, handing out the S3 stand-in."""
+
+    def __init__(self, client):
+        """Hand out client."""
+        self.s3 = client
+
+    def client(self, service_name):
+        """Get the S3 client."""
+        return self.s3
+
+
+@pytest.fixture
+def artifacts(tmp_path):
+    """
+    Write model artifacts, the model being incompressible.
+
+    Returns
+        list: The locations of the files.
+    """
+    files = {
+        "model.joblib": os.urandom(50_000),
+        "inference.py": b"print(1)\n" * 100,
+        "pair_encoding.py": b"print(2)\n" * 100,
+    }
+    for name, content in files.items():
+        (tmp_path / name).write_bytes(content)
+    return [str(tmp_path / name) for name in files]
+
+
+def read_archive(content, compression="gz"):
+    """Read the files of an archive into a {name: bytes} dict."""
+    with tarfile.open(fileobj=io.BytesIO(content), mode=f"r:{compression}") as archive:
+        return {
+            member.name: archive.extractfile(member).read()
+            for member in archive.getmembers()
+        }
+
+
+@pytest.mark.parametrize("compression", ["gz", "bz2", "xz", ""])
+def test_archive_is_streamed_in_parts(artifacts, compression, local_s3_client):
+    """Test that the archive uploaded in parts holds the files, in every format."""
+    client = local_s3_client()
+    report = package_to_s3(
+        artifacts, client, "bucket", "model.tar.gz", compression, 1, part_size=8192
+    )
+
+    content = client.objects[("bucket", "model.tar.gz")]
+    assert report["bytes"] == len(content)
+    assert report["parts"] == -(-len(content) // 8192)
+    assert report["raw_bytes"] == sum(os.path.getsize(path) for path in artifacts)
+    assert read_archive(content, compression) == {
+        os.path.basename(path): open(path, "rb").read() for path in artifacts
+    }
+
+
+def test_small_archive_is_put_at_once(artifacts, local_s3_client):
+    """Test that an archive smaller than a part is sent without a multipart upload."""
+    client = local_s3_client()
+    report = package_to_s3(artifacts, client, "bucket", "model.tar.gz")
+
+    assert report["parts"] == 0
+    assert client.uploads == {}
+    content = client.objects[("bucket", "model.tar.gz")]
+    assert len(read_archive(content)) == len(artifacts)
+
+
+def test_failed_part_aborts_the_upload(artifacts, local_s3_client):
+    """Test that a failed part aborts the upload and raises the error."""
+    client = local_s3_client(fail_part=2)
+    with pytest.raises(OSError, match="connection reset"):
+        package_to_s3(artifacts, client, "bucket", "model.tar.gz", "", part_size=8192)
+    assert client.aborted == ["upload-0"]
+    assert client.objects == {}
+
+
+def test_error_while_packing_aborts_the_upload(tmp_path, local_s3_client):
+    """Test that an error in the block of the writer aborts the upload."""
+    client = local_s3_client()
+    with pytest.raises(FileNotFoundError):
+        with S3MultipartWriter(client, "bucket", "key", part_size=10) as writer:
+            write_archive([str(tmp_path / "missing")], writer, "")
+    assert client.objects == {}
+
+
+def test_deployer_streams_the_artifacts(
+    artifacts, tmp_path, monkeypatch, local_s3_client
+):
+    """Test that the Deployer uploads the archive without writing it to disk."""
+    monkeypatch.chdir(tmp_path)
+    client = local_s3_client()
+    deployer = deploy.Deployer(None, "model.tar.gz", FakeSession(client))
+
+    model_artifacts = deployer.upload_model_artifact_to_s3()
+
+    assert model_artifacts == f"s3://{deploy.S3_BUCKET}/model.tar.gz"
+    assert not os.path.exists("model.tar.gz")
+    content = client.objects[(deploy.S3_BUCKET, "model.tar.gz")]
+    assert sorted(read_archive(content)) == [
+        "inference.py",
+        "model.joblib",
+        "pair_encoding.py",
+    ]
+    assert deployer.artifact_report["bytes"] == len(content)
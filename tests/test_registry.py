@@ -0,0 +1,201 @@
+"""Unit tests of the ModelRegistry class, against a local fake registry."""
+import hashlib
+import os
+import shutil
+import sys
+
+import pandas as pd
+import pytest
+
+sys.path.append("deployment")
+sys.path.append("src/data")
+from artifact_cache import ArtifactCache  # noqa: E402
+from registry import ModelRegistry, file_sha256  # noqa: E402
+
+
+class FakeTable:
+    """A stand-in for the Neptune table of the model versions."""
+
+    def __init__(self, frame):
+        """Hold the table as a DataFrame."""
+        self.frame = frame
+
+    def to_pandas(self):
+        """Return the DataFrame."""
+        return self.frame
+
+
+class FakeField:
+    """A stand-in for a Neptune file field, stored as a local file."""
+
+    def __init__(self, registry, path):
+        """Serve the file at path."""
+        self.registry = registry
+        self.path = path
+
+    def download(self, destination):
+        """Copy the file to destination."""
+        self.registry.downloads.append(os.path.basename(self.path))
+        shutil.copyfile(self.path, destination)
+
+
+class FakeModelVersion:
+    """A stand-in for a Neptune model version."""
+
+    def __init__(self, registry, version_id):
+        """Serve the files of the version folder."""
+        self.registry = registry
+        self.folder = os.path.join(registry.root, version_id)
+
+    def exists(self, field):
+        """Tell whether the version has the field."""
+        return os.path.exists(os.path.join(self.folder, field))
+
+    def __getitem__(self, field):
+        """Get a file field."""
+        return FakeField(self.registry, os.path.join(self.folder, field))
+
+    def stop(self):
+        """Do nothing."""
+
+
+class FakeNeptune:
+    """A local fake of the neptune module: one folder per model version."""
+
+    def __init__(self, root):
+        """Store the versions under root."""
+        self.root = root
+        self.rows = []
+        self.opened = []
+        self.downloads = []
+
+    def add_version(self, version_id, stage, created, artifacts, hashed=True):
+        """Register a version with the given {field: bytes} artifacts."""
+        folder = os.path.join(self.root, version_id)
+        os.makedirs(folder)
+        row = {"sys/id": version_id, "sys/stage": stage, "sys/creation_time": created}
+        for field, content in artifacts.items():
+            with open(os.path.join(folder, field), "wb") as outfile:
+                outfile.write(content)
+            if hashed:
+                row[f"hashes/{field}"] = file_sha256(os.path.join(folder, field))
+        self.rows.append(row)
+
+    def init_model(self, project, api_token, with_id):
+        """Open the registered model."""
+        return self
+
+    def fetch_model_versions_table(self, columns=None):
+        """Get the table of the versions."""
+        return FakeTable(pd.DataFrame(self.rows))
+
+    def init_model_version(self, project, api_token, with_id):
+        """Open a model version."""
+        self.opened.append(with_id)
+        return FakeModelVersion(self, with_id)
+
+    def stop(self):
+        """Do nothing."""
+
+
+@pytest.fixture
+def neptune(tmp_path):
+    """
+    Create a fake registry with versions in several stages.
+
+    Returns
+        FakeNeptune: The registry, whose newest production version is MOD-3.
+    """
+    registry = FakeNeptune(str(tmp_path / "registry"))
+    created = pd.Timestamp("2024-01-01")
+    registry.add_version("MOD-1", "production", created, {"model": b"one"})
+    registry.add_version(
+        "MOD-2", "archived", created + pd.Timedelta(days=2), {"model": b"two"}
+    )
+    registry.add_version(
+        "MOD-3",
+        "production",
+        created + pd.Timedelta(days=1),
+        {"model": b"three", "lookup": b"table"},
+    )
+    registry.add_version(
+        "MOD-4", "staging", created + pd.Timedelta(days=3), {"model": b"four"}
+    )
+    return registry
+
+
+@pytest.fixture
+def registry(neptune, tmp_path):
+    """
+    Create a ModelRegistry of the fake registry, with a local cache.
+
+    Returns
+        ModelRegistry: The client.
+    """
+    cache = ArtifactCache(root=str(tmp_path / "cache"))
+    return ModelRegistry("project", "token", "MOD", cache=cache, client=neptune)
+
+
+def test_downloads_the_newest_production_version_only(registry, neptune, tmp_path):
+    """Test that only the newest production version is opened and downloaded."""
+    destination = tmp_path / "deploy"
+    destination.mkdir()
+    # A forest left over from a previous deployment
+    (destination / "model.npz").write_bytes(b"stale")
+
+    assert registry.fetch_production_model(str(destination)) == "MOD-3"
+    assert neptune.opened == ["MOD-3"]
+    assert sorted(neptune.downloads) == ["lookup", "model"]
+    assert (destination / "model.joblib").read_bytes() == b"three"
+    assert (destination / "lookup.npz").read_bytes() == b"table"
+    assert not (destination / "model.npz").exists()
+
+
+def test_redeploy_is_served_by_the_cache(registry, neptune, tmp_path):
+    """Test that redeploying a version neither opens it nor downloads anything."""
+    registry.fetch_production_model(str(tmp_path))
+    os.remove(tmp_path / "model.joblib")
+    neptune.opened.clear()
+    neptune.downloads.clear()
+
+    assert registry.fetch_production_model(str(tmp_path)) == "MOD-3"
+    assert neptune.opened == []
+    assert neptune.downloads == []
+    assert (tmp_path / "model.joblib").read_bytes() == b"three"
+
+
+def test_corrupted_download_is_rejected(registry, neptune, tmp_path):
+    """Test that an artifact not matching its digest is neither kept nor cached."""
+    with open(os.path.join(neptune.root, "MOD-3", "model"), "wb") as outfile:
+        outfile.write(b"tampered")
+
+    with pytest.raises(ValueError, match="digest"):
+        registry.fetch_production_model(str(tmp_path))
+    assert not (tmp_path / "model.joblib").exists()
+    digest = hashlib.sha256(b"three").hexdigest()
+    assert not os.path.exists(registry.cache.get_path(digest))
+
+
+def test_versions_without_digests_are_downloaded(neptune, tmp_path):
+    """Test that a version uploaded without digests is still downloaded."""
+    neptune.add_version(
+        "MOD-5", "production", pd.Timestamp("2025-01-01"), {"model": b"5"}, False
+    )
+    registry = ModelRegistry(
+        "project",
+        "token",
+        "MOD",
+        cache=ArtifactCache(root=str(tmp_path / "cache")),
+        client=neptune,
+    )
+    assert registry.fetch_production_model(str(tmp_path)) == "MOD-5"
+    assert (tmp_path / "model.joblib").read_bytes() == b"5"
+
+
+def test_no_production_version(tmp_path):
+    """Test that a registry without a production version is an error."""
+    neptune = FakeNeptune(str(tmp_path))
+    neptune.add_version("MOD-1", "staging", pd.Timestamp("2024-01-01"), {"model": b""})
+    registry = ModelRegistry("project", "token", "MOD", client=neptune)
+    with pytest.raises(ValueError, match="production"):
+        registry.fetch_production_model(str(tmp_path))
@@ -0,0 +1,152 @@
+"""Unit tests of the pooled inference client and of the load generator."""
+import asyncio
+import io
+import json
+import sys
+import threading
+
+import pytest
+
+sys.path.append("benchmarks")
+sys.path.append("deployment")
+import deploy  # noqa: E402
+from bench_load import EndpointTarget, HttpTarget, run_load, summarize  # noqa: E402
+from runtime_client import InferenceClient  # noqa: E402
+from server import serve  # noqa: E402
+
+
+class StubRuntimeClient:
+    """A stand-in for the sagemaker-runtime client, doubling the trip distances."""
+
+    def __init__(self, fail=False):
+        """Answer every call with a throttling error, if fail."""
+        self.fail = fail
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def invoke_endpoint(self, EndpointName, ContentType, Accept, Body):
+        """Predict twice the trip distance of the records of the body."""
+        with self.lock:
+            self.calls.append(EndpointName)
+        if self.fail:
+            error = Exception("throttled")
+            error.response = {"Error": {"Code": "ThrottlingException"}}
+            raise error
+        records = json.loads(Body)["Input"]
+        if isinstance(records, list):
+            output = [2 * record["trip_distance"] for record in records]
+        else:
+            output = 2 * records["trip_distance"]
+        return {"Body": io.BytesIO(json.dumps({"Output": output}).encode())}
+
+
+def test_invoke_single_and_batch():
+    """Test that batches are split into requests and answered in order."""
+    stub = StubRuntimeClient()
+    client = InferenceClient("ep", max_pool_connections=3, client=stub)
+    records = [{"trip_distance": float(i)} for i in range(25)]
+
+    assert client.invoke(records[3]) == 6.0
+    assert client.invoke_batch(records, batch_size=4) == [2.0 * i for i in range(25)]
+    assert len(stub.calls) == 1 + 7
+    client.close()
+
+
+def test_async_calls_share_the_client():
+    """Test that concurrent async calls go through the one client."""
+    stub = StubRuntimeClient()
+    client = InferenceClient("ep", max_pool_connections=4, client=stub)
+
+    async def main():
+        return await asyncio.gather(
+            *(client.ainvoke({"trip_distance": float(i)}) for i in range(10))
+        )
+
+    assert asyncio.run(main()) == [2.0 * i for i in range(10)]
+    assert stub.calls == ["ep"] * 10
+    client.close()
+
+
+def test_client_is_configured_with_a_pool(monkeypatch):
+    """Test that the boto3 client is created once, with the pool and retries."""
+    boto3 = pytest.importorskip("boto3")
+    created = []
+    monkeypatch.setattr(
+        boto3, "client", lambda *args, **kwargs: created.append(kwargs) or "runtime"
+    )
+    client = InferenceClient("ep", "eu-west-1", max_pool_connections=7, max_attempts=5)
+
+    assert client.client == client.client == "runtime"
+    assert len(created) == 1
+    config = created[0]["config"]
+    assert config.max_pool_connections == 7
+    assert config.retries == {"max_attempts": 5, "mode": "adaptive"}
+
+
+def test_deployer_reuses_the_client(monkeypatch):
+    """Test that Deployer.infer keeps one client per endpoint."""
+    stub = StubRuntimeClient()
+    monkeypatch.setattr(
+        deploy, "InferenceClient", lambda name: InferenceClient(name, client=stub)
+    )
+    deployer = deploy.Deployer(None, "model.tar.gz", None)
+
+    assert deployer.infer("ep", {"trip_distance": 1.5}) == 3.0
+    assert deployer.infer("ep", {"trip_distance": 2.0}) == 4.0
+    deployer.infer("other", {"trip_distance": 2.0})
+    assert sorted(deployer.inference_clients) == ["ep", "other"]
+    assert deployer.get_inference_client("ep") is deployer.inference_clients["ep"]
+
+
+def test_load_against_the_local_server(model_dir):
+    """Test a load run against the local server, over keep-alive connections."""
+    bodies = [
+        json.dumps({"Input": {"PU_DO": "1_2", "trip_distance": d}}).encode()
+        for d in (1.0, 2.0, 3.0)
+    ] + [b"not json"]
+
+    async def main():
+        server, batcher = await serve(model_dir, port=0)
+        port = server.sockets[0].getsockname()[1]
+        target = HttpTarget(f"http://127.0.0.1:{port}")
+        try:
+            return await run_load(target, bodies, qps=400, count=40, concurrency=4)
+        finally:
+            await target.close()
+            server.close()
+            await server.wait_closed()
+            await batcher.stop()
+
+    summary = summarize(asyncio.run(main()), qps=400)
+
+    assert summary["requests"] == 40
+    assert summary["ok"] == 30
+    assert summary["errors"] == {"HTTP 400": 10}
+    assert summary["error_rate"] == 0.25
+    latency = summary["latency_ms"]
+    assert latency["p50"] <= latency["p90"] <= latency["p99"] <= latency["max"]
+    assert summary["service_ms"]["p50"] <= latency["max"]
+
+
+def test_load_bounds_the_requests_in_flight():
+    """Test the concurrency bound, and the error kinds of an endpoint."""
+    in_flight = []
+    peak = []
+
+    class SlowTarget:
+        async def send(self, body):
+            in_flight.append(body)
+            peak.append(len(in_flight))
+            await asyncio.sleep(0.01)
+            in_flight.pop()
+
+    outcomes = asyncio.run(run_load(SlowTarget(), [b"{}"], 1000, 20, 3))
+    assert max(peak) == 3
+    assert all(o["due"] <= o["sent"] <= o["done"] for o in outcomes)
+
+    target = EndpointTarget(
+        "ep", 2, client=InferenceClient("ep", client=StubRuntimeClient(fail=True))
+    )
+    outcomes = asyncio.run(run_load(target, [b"{}"], 1000, 5, 2))
+    assert summarize(outcomes, 1000)["errors"] == {"ThrottlingException": 5}
+    target.client.close()
@@ -0,0 +1,97 @@
+"""Unit tests of the HyperparameterSearch class."""
+import sys
+
+import numpy as np
+import pytest
+import scipy.sparse as sp
+
+sys.path.append("src/models")
+from search import (  # noqa: E402
+    HyperparameterSearch,
+    load_shared,
+    save_shared,
+    share_training_rows,
+)
+
+
+@pytest.fixture
+def encoded_data():
+    """
+    Create a small encoded dataset.
+
+    Returns
+        tuple: X_train, y_train, X_test, y_test.
+    """
+    rng = np.random.default_rng(0)
+    X = sp.random(300, 20, density=0.2, format="csr", random_state=0)
+    y = X @ rng.random(20) + rng.random(300) * 0.1
+    return X[:200], y[:200], X[200:], y[200:]
+
+
+@pytest.fixture
+def space():
+    """
+    Return a small search space.
+
+    Returns
+        dict: The candidate values of each hyperparameter.
+    """
+    return {"n_estimators": [2, 4, 8], "max_depth": [2, 4, 8]}
+
+
+def test_shared_matrix_round_trip(tmp_path, encoded_data):
+    """Test that a saved CSR matrix is memory-mapped back unchanged."""
+    X_train = encoded_data[0]
+    save_shared(str(tmp_path), "X", X_train)
+    loaded = load_shared(str(tmp_path), "X")
+
+    assert not loaded.data.flags.writeable
+    assert (loaded != X_train).nnz == 0
+
+
+def test_grid_search(encoded_data, space):
+    """Test that the grid strategy runs every combination and keeps the best."""
+    search = HyperparameterSearch(space, strategy="grid", total_cores=2)
+    results = search.run(*encoded_data)
+
+    assert len(results) == 9
+    assert {"n_estimators", "max_depth", "rmse", "fit_seconds"} <= set(results)
+    assert results["rmse"].is_monotonic_increasing
+    assert search.best_params == {
+        "n_estimators": results.loc[0, "n_estimators"],
+        "max_depth": results.loc[0, "max_depth"],
+    }
+    assert search.best_model.n_estimators == search.best_params["n_estimators"]
+
+
+def test_successive_halving(encoded_data, space):
+    """Test that successive halving keeps the best third of the candidates."""
+    search = HyperparameterSearch(space, strategy="halving", n_trials=9, total_cores=2)
+    results = search.run(*encoded_data)
+
+    assert results.groupby("round").size().to_dict() == {0: 9, 1: 3}
+    assert results.groupby("round")["n_samples"].first().to_dict() == {0: 67, 1: 200}
+
+
+def test_invalid_strategy(space):
+    """Test that an unknown strategy is rejected."""
+    with pytest.raises(ValueError):
+        HyperparameterSearch(space, strategy="bayesian")
+
+
+def test_trials_fit_on_the_shared_rows(tmp_path, encoded_data):
+    """Test that the rows of a round are shared in the layout the trees fit on."""
+    from sklearn.utils import check_array
+
+    X_train, y_train = encoded_data[:2]
+    order = np.random.default_rng(0).permutation(X_train.shape[0])
+    share_training_rows(str(tmp_path), X_train, y_train, order, 50)
+    shared = load_shared(str(tmp_path), "X_train_50", "csc")
+
+    rows = np.sort(order[:50])
+    assert (shared != X_train[rows].astype(np.float32)).nnz == 0
+    assert not shared.data.flags.writeable
+    # Validating the shared matrix for a fit does not copy it
+    checked = check_array(shared, accept_sparse="csc", dtype=np.float32)
+    assert np.shares_memory(checked.data, shared.data)
+    assert np.shares_memory(checked.indices, shared.indices)
@@ -0,0 +1,107 @@
+"""Unit tests of the local micro-batching prediction server."""
+import asyncio
+import json
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.append("deployment")
+from inference import model_fn, predict_fn  # noqa: E402
+from server import serve  # noqa: E402
+
+
+async def request(port, method, path, body=b"", headers=None):
+    """Send one HTTP request and return its status and body."""
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    lines = [f"{method} {path} HTTP/1.1", f"Content-Length: {len(body)}"]
+    lines += [f"{name}: {value}" for name, value in (headers or {}).items()]
+    lines.append("Connection: close")
+    writer.write(("\r\n".join(lines) + "\r\n\r\n").encode() + body)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, _, payload = response.partition(b"\r\n\r\n")
+    return int(head.split(b" ")[1]), payload
+
+
+def run_server(model_dir, client, **kwargs):
+    """Start the server on a free port, run the client coroutine, then stop."""
+
+    async def main():
+        server, batcher = await serve(model_dir, port=0, **kwargs)
+        port = server.sockets[0].getsockname()[1]
+        try:
+            return await client(port)
+        finally:
+            server.close()
+            await server.wait_closed()
+            await batcher.stop()
+
+    return asyncio.run(main())
+
+
+def test_concurrent_requests_are_batched(model_dir):
+    """Test that concurrent requests share batches and get their own outputs."""
+    samples = [
+        {"PULocationID": i % 9 + 1, "DOLocationID": 3, "trip_distance": i / 4}
+        for i in range(20)
+    ]
+
+    async def client(port):
+        responses = await asyncio.gather(
+            *[
+                request(
+                    port,
+                    "POST",
+                    "/invocations",
+                    json.dumps({"Input": sample}).encode(),
+                    {"Content-Type": "application/json"},
+                )
+                for sample in samples
+            ]
+        )
+        _, metrics = await request(port, "GET", "/metrics")
+        return responses, json.loads(metrics)
+
+    responses, metrics = run_server(model_dir, client, max_wait=0.2)
+    model = model_fn(model_dir)
+    assert [status for status, _ in responses] == [200] * len(samples)
+    assert [json.loads(body)["Output"] for _, body in responses] == [
+        int(predict_fn(sample, model)) for sample in samples
+    ]
+    assert metrics["requests"] == len(samples)
+    assert metrics["batches"] < len(samples)
+    assert metrics["p99_ms"] >= metrics["p50_ms"] > 0
+
+
+def test_batch_request_and_errors(model_dir):
+    """Test a multi-record request, a bad request and the health check."""
+    samples = [
+        {"PULocationID": 1, "DOLocationID": 2, "trip_distance": 1.5},
+        {"PULocationID": 4, "DOLocationID": 5, "trip_distance": 7.0},
+    ]
+
+    async def client(port):
+        batch = await request(
+            port,
+            "POST",
+            "/invocations",
+            "\n".join(json.dumps(sample) for sample in samples).encode(),
+            {"Content-Type": "application/jsonlines", "Accept": "text/csv"},
+        )
+        bad = await request(
+            port, "POST", "/invocations", b"x", {"Content-Type": "text/plain"}
+        )
+        ping = await request(port, "GET", "/ping")
+        return batch, bad, ping
+
+    batch, bad, ping = run_server(model_dir, client, max_batch_size=1)
+    model = model_fn(model_dir)
+    assert batch[0] == 200
+    np.testing.assert_allclose(
+        [float(line) for line in batch[1].splitlines()],
+        predict_fn(pd.DataFrame(samples), model),
+    )
+    assert bad[0] == 400
+    assert ping[0] == 200
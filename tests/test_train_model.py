@@ -0,0 +1,230 @@
+"""Unit tests of the Trainer class."""
+import os
+import sys
+
+import numpy as np
+import pyarrow as pa
+import pytest
+
+sys.path.append("deployment")
+sys.path.append("src/features")
+sys.path.append("src/models")
+from build_features import PUDOEncoder  # noqa: E402
+from inference import model_fn, predict_fn  # noqa: E402
+from train_model import Trainer  # noqa: E402
+
+
+@pytest.fixture
+def trainer(tmp_path, trips):
+    """
+    Train a small Trainer on the sample trips.
+
+    Returns
+        Trainer: The trained Trainer.
+    """
+    trainer = Trainer(
+        trips[["PU_DO", "trip_distance"]],
+        trips["duration"].to_numpy(),
+        trips[["PU_DO", "trip_distance"]],
+        trips["duration"].to_numpy(),
+        params={"n_estimators": 5, "max_depth": 4},
+        root_folder=str(tmp_path),
+    )
+    trainer.train()
+    return trainer
+
+
+def test_saved_pipeline_is_dict_vectorizer_compatible(trainer, trips):
+    """Test that the saved pipeline accepts records, and loads back for frames."""
+    from joblib import load
+
+    trainer.save_pipeline()
+    saved = load(trainer.pipeline_path)
+    records = trips[["PU_DO", "trip_distance"]].to_dict(orient="records")
+    expected = trainer.pipeline.predict(trips[["PU_DO", "trip_distance"]])
+
+    assert saved.steps[0][0] == "dictvectorizer"
+    np.testing.assert_allclose(saved.predict(records), expected)
+
+    loaded = Trainer(root_folder=trainer.root_folder)
+    loaded.load_pipeline()
+    np.testing.assert_allclose(
+        loaded.pipeline.predict(trips[["PU_DO", "trip_distance"]]), expected
+    )
+
+
+def test_predict_batch(trainer, trips):
+    """Test that predict_batch matches the pipeline on every input format."""
+    expected = trainer.pipeline.predict(trips[["PU_DO", "trip_distance"]])
+    locations = trips[["PULocationID", "DOLocationID", "trip_distance"]]
+
+    inputs = [
+        locations,
+        pa.Table.from_pandas(locations),
+        locations.to_numpy(dtype=np.float64),
+        {name: locations[name].to_numpy() for name in locations},
+    ]
+    for features in inputs:
+        np.testing.assert_allclose(trainer.predict_batch(features), expected)
+
+    np.testing.assert_allclose(
+        trainer.predict_batch(locations, chunk_size=64, n_threads=3), expected
+    )
+    assert trainer.predict(locations.iloc[0].to_dict()) == pytest.approx(expected[0])
+
+
+def test_train_incremental(trainer, trips):
+    """Test that new trees and PU_DO values are added to the saved pipeline."""
+    trainer.save_pipeline()
+    before = trainer.pipeline.predict(trips[["PU_DO", "trip_distance"]])
+    new_trips = trips.assign(
+        PU_DO=trips["PU_DO"].where(trips.index % 2 == 0, "2" + trips["PU_DO"]),
+        duration=trips["duration"] + 1,
+    )
+
+    incremental = Trainer(
+        new_trips[["PU_DO", "trip_distance"]],
+        new_trips["duration"].to_numpy(),
+        new_trips[["PU_DO", "trip_distance"]],
+        new_trips["duration"].to_numpy(),
+        params={"n_estimators": 3, "max_depth": 4},
+        root_folder=trainer.root_folder,
+    )
+    incremental.train_incremental()
+    encoder, forest = incremental.pipeline.steps[0][1], incremental.pipeline[-1]
+    assert len(forest.estimators_) == 8
+    # The columns of the old vocabulary did not move
+    old_vocabulary = trainer.pipeline.steps[0][1].vocabulary_
+    assert {name: encoder.vocabulary_[name] for name in old_vocabulary} == (
+        old_vocabulary
+    )
+    assert set("PU_DO=" + new_trips["PU_DO"]) <= set(encoder.vocabulary_)
+    # The old trees still predict what they did
+    old_trees = np.mean(
+        [
+            tree.predict(encoder.transform(trips[["PU_DO", "trip_distance"]]))
+            for tree in forest.estimators_[:5]
+        ],
+        axis=0,
+    )
+    np.testing.assert_allclose(old_trees, before)
+    assert {tree.n_features_in_ for tree in forest.estimators_} == {
+        len(encoder.feature_names_)
+    }
+
+    incremental.train_incremental(n_estimators=4, max_estimators=6)
+    assert len(incremental.pipeline[-1].estimators_) == 6
+    assert incremental.pipeline[-1].n_estimators == 6
+
+    incremental.save_pipeline()
+    incremental.load_pipeline()
+    assert incremental.evaluate() < trainer.evaluate() + 1
+
+
+def test_train_out_of_core(tmp_path, trips):
+    """Test that sub-forests fitted chunk by chunk make a servable pipeline."""
+    from pyarrow import feather
+
+    paths = []
+    for index, month in enumerate([trips[:300], trips[300:]]):
+        path = str(tmp_path / f"train_{index}.arrow")
+        feather.write_feather(
+            pa.Table.from_pandas(
+                month[["PU_DO", "trip_distance", "duration"]], preserve_index=False
+            ),
+            path,
+            compression="uncompressed",
+        )
+        paths.append(path)
+
+    trainer = Trainer(
+        dict_test=trips[["PU_DO", "trip_distance"]],
+        y_test=trips["duration"].to_numpy(),
+        params={"n_estimators": 4, "max_depth": 4},
+        root_folder=str(tmp_path / "models"),
+    )
+    trainer.train_out_of_core(paths, chunk_size=100)
+    encoder, forest = trainer.pipeline.steps[0][1], trainer.pipeline[-1]
+    # 5 chunks of 100 rows, at least one tree each
+    assert len(forest.estimators_) == forest.n_estimators == 5
+    assert encoder.vocabulary_ == PUDOEncoder().fit(trips).vocabulary_
+    assert trainer.evaluate() < trips["duration"].std()
+    assert trainer.build_lookup_table(n_buckets=4).step > 0
+
+    trainer.save_pipeline()
+    np.testing.assert_allclose(
+        predict_fn(
+            trips[["PULocationID", "DOLocationID", "trip_distance"]],
+            model_fn(str(tmp_path / "models")),
+        ),
+        trainer.pipeline.predict(trips[["PU_DO", "trip_distance"]]),
+    )
+
+
+def test_train_hist_gradient_boosting(tmp_path, trips):
+    """Test the hist_gradient_boosting backend, from training to the handlers."""
+    trainer = Trainer(
+        trips[["PU_DO", "trip_distance"]],
+        trips["duration"].to_numpy(),
+        trips[["PU_DO", "trip_distance"]],
+        trips["duration"].to_numpy(),
+        params={"backend": "hist_gradient_boosting", "max_iter": 20},
+        root_folder=str(tmp_path),
+    )
+    trainer.train()
+    assert trainer.evaluate() < trips["duration"].std()
+    locations = trips[["PULocationID", "DOLocationID", "trip_distance"]]
+    expected = trainer.predict_batch(trips[["PU_DO", "trip_distance"]])
+    np.testing.assert_allclose(trainer.predict_batch(locations), expected)
+
+    table = trainer.build_lookup_table(n_buckets=4)
+    # Every pair of the 9 encoded location IDs, each of them with an unknown other
+    # side, plus the unknown pair
+    assert table.values.shape[0] == 9 * 9 + 2 * 9 + 1
+    with pytest.raises(ValueError):
+        trainer.export_forest()
+    with pytest.raises(ValueError):
+        trainer.train_incremental()
+
+    trainer.save_pipeline()
+    os.rename(trainer.pipeline_path, tmp_path / "model.joblib")
+    model = model_fn(str(tmp_path))
+    np.testing.assert_allclose(predict_fn(locations, model), expected)
+    np.testing.assert_allclose(
+        predict_fn(trips[["PU_DO", "trip_distance"]], model), expected
+    )
+    assert predict_fn(locations.iloc[0].to_dict(), model) == pytest.approx(expected[0])
+
+
+def test_search_keeps_the_best_model(tmp_path, trips):
+    """Test that a search scores its trials on the training data only."""
+    trainer = Trainer(
+        trips[["PU_DO", "trip_distance"]],
+        trips["duration"].to_numpy(),
+        params={"backend": "random_forest", "n_estimators": 5, "max_depth": 4},
+        root_folder=str(tmp_path),
+    )
+    results = trainer.search(
+        {"n_estimators": [2, 4], "max_depth": [2, 6]},
+        "grid",
+        validation_size=0.25,
+        total_cores=2,
+    )
+
+    assert len(results) == 4
+    assert (results["n_samples"] == 375).all()
+    best = results.loc[0, ["n_estimators", "max_depth"]].to_dict()
+    assert trainer.params == {"backend": "random_forest", **best}
+    assert os.path.exists(trainer.pipeline_path)
+    assert os.path.exists(os.path.join(tmp_path, "search_results.csv"))
+    # The model is trained on every training row, with the best parameters
+    forest = trainer.pipeline.steps[-1][1]
+    assert forest.n_estimators == best["n_estimators"]
+    assert forest.max_depth == best["max_depth"]
+    trainer.dict_test = trips[["PU_DO", "trip_distance"]]
+    trainer.y_test = trips["duration"].to_numpy()
+    assert trainer.evaluate() < trips["duration"].std()
+
+    trainer.params = {"backend": "hist_gradient_boosting"}
+    with pytest.raises(ValueError):
+        trainer.search({"max_depth": [2]})
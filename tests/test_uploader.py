@@ -0,0 +1,134 @@
+"""Unit tests of the S3Uploader class, against a local S3 stand-in."""
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append("src/data")
+sys.path.append("src/utils")
+from make_dataset import Data  # noqa: E402
+from uploader import S3Uploader  # noqa: E402
+
+
+def test_uploads_run_in_background(tmp_path, local_s3_client):
+    """Test that the files are uploaded on the pool threads and reported."""
+    client = local_s3_client(os.path.join(tmp_path, "s3"))
+    uploader = S3Uploader("bucket", client=client, max_workers=2)
+    for name in ["a.parquet", "b.parquet"]:
+        with open(os.path.join(tmp_path, name), "wb") as file:
+            file.write(b"data")
+        uploader.submit(os.path.join(tmp_path, name), "raw")
+
+    reports = uploader.join()
+
+    assert [report["key"] for report in reports] == [
+        "web-service/raw/a.parquet",
+        "web-service/raw/b.parquet",
+    ]
+    assert all(report["ok"] and report["bytes"] == 4 for report in reports)
+    assert os.path.exists(os.path.join(tmp_path, "s3/bucket/web-service/raw/b.parquet"))
+    assert all(name.startswith("s3-upload") for name in client.threads)
+
+
+def test_concurrent_submits_share_one_pool(tmp_path, local_s3_client, monkeypatch):
+    """Test that threads submitting at once start one pool, joined with its uploads."""
+    import uploader as uploader_module
+
+    pools = []
+
+    class SlowPool(ThreadPoolExecutor):
+        def __init__(self, *args, **kwargs):
+            pools.append(self)
+            # Widen the window in which another thread could start its own pool
+            time.sleep(0.05)
+            super().__init__(*args, **kwargs)
+
+    monkeypatch.setattr(uploader_module, "ThreadPoolExecutor", SlowPool)
+    uploader = S3Uploader("bucket", client=local_s3_client(tmp_path / "s3"))
+    paths = []
+    for i in range(8):
+        paths.append(os.path.join(tmp_path, f"{i}.parquet"))
+        with open(paths[-1], "wb") as file:
+            file.write(b"data")
+    threads = [
+        threading.Thread(target=uploader.submit, args=(path, "raw")) for path in paths
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(pools) == 1
+    assert len(uploader.join()) == len(paths)
+
+
+def test_failed_upload_is_reported(tmp_path, local_s3_client):
+    """Test that a failed upload is reported instead of raised."""
+    uploader = S3Uploader("bucket", client=local_s3_client(tmp_path, fail=True))
+    path = os.path.join(tmp_path, "a.parquet")
+    with open(path, "wb") as file:
+        file.write(b"data")
+    uploader.submit(path, "raw")
+
+    assert [report["ok"] for report in uploader.join()] == [False]
+
+
+def test_data_run_uploads_every_stage(tmp_path, raw_trips, local_s3_client):
+    """Test that Data.run uploads its three artifacts and reports them."""
+    source = os.path.join(tmp_path, "source.parquet")
+    raw_trips.to_parquet(source)
+    client = local_s3_client(os.path.join(tmp_path, "s3"))
+
+    data = Data(
+        {"taxi_type": "green", "year": 2022, "month": 1},
+        mode="upload",
+        uploader=S3Uploader("bucket", client=client),
+    )
+    data.paths["file_url"] = source
+    data.run()
+
+    assert [report["key"].split("/")[1] for report in data.upload_report] == [
+        "raw",
+        "interim",
+        "processed",
+    ]
+    assert all(report["ok"] for report in data.upload_report)
+
+    for stage in ["raw", "interim", "processed"]:
+        os.remove(data.paths[stage])
+
+
+def test_deferred_uploads(tmp_path, monkeypatch, raw_trips, local_s3_client):
+    """Test that DataRange hands the uploads of its workers to the caller."""
+    import make_dataset
+
+    months = [(2021, 12), (2022, 1)]
+    for year, month in months:
+        raw_trips.to_parquet(
+            os.path.join(tmp_path, f"green_tripdata_{year:04d}-{month:02d}.parquet")
+        )
+    monkeypatch.setattr(make_dataset, "BASE_URL", f"{tmp_path}{os.sep}")
+    client = local_s3_client(os.path.join(tmp_path, "s3"))
+    uploader = S3Uploader("bucket", client=client)
+
+    data_range = make_dataset.DataRange(["green"], months, mode="deferred")
+    data_range.run(uploader=uploader)
+    test_data = Data(
+        {"taxi_type": "green", "year": 2022, "month": 2},
+        mode="deferred",
+        uploader=uploader,
+    )
+    test_data.paths["file_url"] = os.path.join(
+        tmp_path, "green_tripdata_2022-01.parquet"
+    )
+    test_data.run(wait_uploads=False)
+    assert test_data.upload_report == []
+
+    reports = uploader.join()
+    assert len(reports) == 9
+    assert all(report["ok"] for report in reports)
+
+    for data in [*data_range.datasets, test_data]:
+        for stage in ["raw", "interim", "processed"]:
+            os.remove(data.paths[stage])
@@ -21,6 +21,7 @@ def test_get_config_model():
     assert "max_depth" in config
     assert isinstance(config["n_estimators"], int)
     assert isinstance(config["max_depth"], int)
+    assert config["backend"] == "random_forest"
 
 
 def test_get_previous_month():
@@ -34,3 +35,58 @@ def test_get_previous_month():
     year, month = utils.get_previous_month(2022, 1)
     assert year == 2021
     assert month == 12
+
+
+def test_get_config_data_range():
+    """Test case for the 'get_config' function with config_type = 'data_range'."""
+    config = utils.get_config(config_type="data_range")
+    assert isinstance(config["taxi_types"], list)
+    assert len(config["months"]) >= 1
+    assert all(isinstance(month, tuple) for month in config["months"])
+
+
+def test_get_month_range():
+    """Test case for the get_month_range function."""
+    assert utils.get_month_range("2021-11", "2022-02") == [
+        (2021, 11),
+        (2021, 12),
+        (2022, 1),
+        (2022, 2),
+    ]
+    assert utils.get_month_range("2022-03", "2022-03") == [(2022, 3)]
+
+
+def test_get_s3_client_is_shared():
+    """Test case for the get_s3_client function."""
+    assert utils.get_s3_client() is utils.get_s3_client()
+
+
+def test_get_config_search():
+    """Test case for the 'get_config' function with config_type = 'search'."""
+    config = utils.get_config(config_type="search")
+    assert isinstance(config["enabled"], bool)
+    assert config["strategy"] in ["grid", "random", "halving"]
+    assert isinstance(config["space"], dict)
+    assert all(isinstance(values, list) for values in config["space"].values())
+    assert 0 < config["validation_size"] < 1
+
+
+def test_get_config_lookup():
+    """Test case for the 'get_config' function with config_type = 'lookup'."""
+    config = utils.get_config(config_type="lookup")
+    assert config["n_buckets"] > 0
+    assert config["max_distance"] is None or config["max_distance"] > 0
+
+
+def test_get_config_incremental():
+    """Test case for the 'get_config' function with config_type = 'incremental'."""
+    config = utils.get_config(config_type="incremental")
+    assert isinstance(config["enabled"], bool)
+    assert config["n_estimators"] is None or config["n_estimators"] > 0
+
+
+def test_get_config_out_of_core():
+    """Test case for the 'get_config' function with config_type = 'out_of_core'."""
+    config = utils.get_config(config_type="out_of_core")
+    assert isinstance(config["enabled"], bool)
+    assert config["chunk_size"] > 0
@@ -1,61 +1,190 @@
 """Run the training job to train and evaluate a model for the NY Taxi Web Service."""
-from src.data.make_dataset import Data
+import multiprocessing
+import os
+import sys
+
+from src.data.artifact_cache import ArtifactCache
+from src.data.make_dataset import Data, DataRange
 from src.models.train_model import Trainer
+from src.utils.dag import TaskGraph
+from src.utils.uploader import S3Uploader
 from src.utils.utils import get_config, get_previous_month
 
+# The src modules import the instrumentation by its name on sys.path: use the same
+# module, to read the stages they record.
+sys.path.append("src/utils")
+from instrumentation import enable, summary_table  # noqa: E402
+
+S3_BUCKET = os.getenv("S3_BUCKET")
+INSTRUMENTATION_PATH = os.getenv("INSTRUMENTATION_PATH", "instrumentation.jsonl")
+
 
 def run_training_job():
     """
     Run the training job to train and evaluate a model for the NY Taxi Web Service.
 
-    This function performs the following steps:
-    1. Instantiates a Data object for training and testing.
-    2. Runs the Data object to download, prepare, and save the train and test data.
-    3. Gets the target values for the train and test data to be used for evaluation.
-    4. Instantiates a Trainer object to train and evaluate the model.
-    5. Saves the pipeline.
-    6. Uploads the results to Neptune.
-    7. Writes the training job report to a file.
+    The job runs as a graph of stages (see TaskGraph), each one starting as soon as
+    the stages it needs have finished:
+    1. The train months (DataRange) and the test month (Data) are downloaded and
+    prepared concurrently, both reusing the artifacts cached by previous runs.
+    2. Their artifacts are uploaded to S3 in the background, overlapping with the
+    training, and waited for at the end of the job.
+    3. A Trainer trains the model, streaming the training data from disk when
+    out-of-core training is enabled, or growing the previous model with new trees
+    when incremental retraining is enabled. When the hyperparameter search is
+    enabled, it scores the candidate parameters on a validation split of the
+    training range instead, and trains the model with the best ones.
+    4. The model is evaluated on the test month while the pipeline is saved, the
+    flattened forest exported (random_forest backend) and the lookup table built.
+    5. The results are uploaded to Neptune in the background, while the lookup
+    table is evaluated.
+    6. The training job report, with the timings of every stage and their
+    instrumentation (wall and CPU time, peak RSS, rows), is written to a file. The
+    instrumentation records are also appended to INSTRUMENTATION_PATH as JSON
+    lines, and logged to the Neptune run.
     """
-    # Get the taxi_type, year, month from config file.
-    taxi_type, year, month = get_config()
-    train_data_file = {"taxi_type": taxi_type, "year": year, "month": month}
+    enable(INSTRUMENTATION_PATH)
 
-    # Use previous month data for testing.
-    test_year, test_month = get_previous_month(year, month)
+    # Read every config first: hydra is not thread-safe.
+    taxi_type, _, _ = get_config()
+    training_range = get_config(config_type="data_range")
+    params = get_config(config_type="model")
+    search_config = get_config(config_type="search")
+    out_of_core = get_config(config_type="out_of_core")
+    incremental = get_config(config_type="incremental")
+    lookup_config = get_config(config_type="lookup")
+
+    # Use the month before the training range for testing.
+    test_year, test_month = get_previous_month(*training_range["months"][0])
     test_data_file = {"taxi_type": taxi_type, "year": test_year, "month": test_month}
 
-    # Instantiate a Data object for training and testing
-    train_data = Data(input_data=train_data_file, mode="train")
-    test_data = Data(input_data=test_data_file, mode="test")
+    # Instantiate a DataRange object for training and a Data object for testing,
+    # both reusing the artifacts cached by previous runs and handing their uploads
+    # to one background uploader. The months are prepared in a forkserver pool,
+    # as other threads are running when it starts.
+    cache = ArtifactCache()
+    uploader = S3Uploader(S3_BUCKET)
+    train_data = DataRange(
+        training_range["taxi_types"],
+        training_range["months"],
+        mode="train",
+        cache=cache,
+        mp_context=multiprocessing.get_context("forkserver"),
+    )
+    test_data = Data(
+        input_data=test_data_file, mode="test", cache=cache, uploader=uploader
+    )
+
+    def train(*_):
+        # The search scores its trials on a validation split of the training
+        # range: the test month is kept for evaluate.
+        if search_config["enabled"]:
+            trainer = Trainer(
+                train_data.get_features(),
+                train_data.get_target_values(),
+                params=params,
+                root_folder="models",
+            )
+            results = trainer.search(
+                search_config["space"],
+                search_config["strategy"],
+                validation_size=search_config["validation_size"],
+                n_trials=search_config["n_trials"],
+                total_cores=search_config["total_cores"],
+                cores_per_trial=search_config["cores_per_trial"],
+                mp_context=multiprocessing.get_context("forkserver"),
+            )
+            return trainer, f"{search_config['strategy']} search, {len(results)} trials"
+        # Out of core, the training data is streamed from disk by the Trainer.
+        if out_of_core["enabled"]:
+            trainer = Trainer(params=params, root_folder="models")
+            trainer.train_out_of_core(
+                train_data.get_processed_paths(), out_of_core["chunk_size"]
+            )
+            return trainer, f"out of core, chunks of {out_of_core['chunk_size']} rows"
+        trainer = Trainer(
+            train_data.get_features(),
+            train_data.get_target_values(),
+            params=params,
+            root_folder="models",
+        )
+        if incremental["enabled"] and os.path.exists(trainer.pipeline_path):
+            trainer.train_incremental(
+                incremental["n_estimators"], incremental["max_estimators"]
+            )
+            n_trees = len(trainer.pipeline.steps[-1][1].estimators_)
+            return trainer, f"incremental, {n_trees} trees"
+        trainer.train()
+        return trainer, "full"
 
-    # Run the Data object to download, prepare and save the train and test data
-    train_data.run()
-    test_data.run()
+    def evaluate(training, _):
+        trainer, _ = training
+        trainer.dict_test = test_data.get_features()
+        trainer.y_test = test_data.get_target_values()
+        rmse = trainer.evaluate()
+        print(trainer.params, rmse)
+        return rmse
 
-    # Get the target values for the train and test data to be used for evaluation
-    y_train, y_test = train_data.get_target_values(), test_data.get_target_values()
+    def save(training):
+        # Save the pipeline, and export the forest for the NumPy-only predictor
+        trainer, _ = training
+        trainer.save_pipeline()
+        if params["backend"] == "random_forest":
+            trainer.export_forest()
 
-    # Instantiate a Trainer object to train and evaluate the model
-    params = get_config(config_type="model")
-    trainer = Trainer(
-        train_data.data_dict,
-        y_train,
-        test_data.data_dict,
-        y_test,
-        params=params,
-        root_folder="models",
+    def upload_to_neptune(training, rmse, *_):
+        trainer, _ = training
+        trainer.upload_to_neptune(rmse)
+
+    graph = TaskGraph()
+    graph.add("prepare_train", lambda: train_data.run(uploader=uploader))
+    graph.add("prepare_test", lambda: test_data.run(wait_uploads=False))
+    graph.add("train", train, after=["prepare_train"])
+    graph.add("evaluate", evaluate, after=["train", "prepare_test"])
+    graph.add("save", save, after=["train"])
+    # Precompute the prediction lookup table and measure what it costs
+    graph.add(
+        "build_lookup",
+        lambda training, _: training[0].build_lookup_table(**lookup_config),
+        after=["train", "save"],
+    )
+    graph.add(
+        "evaluate_lookup",
+        lambda training, lookup, _: training[0].evaluate_lookup(lookup),
+        after=["train", "build_lookup", "evaluate"],
     )
-    trainer.train()
-    rmse = trainer.evaluate()
-    print(trainer.params, rmse)
+    # Upload to Neptune in the background, while the lookup table is evaluated
+    graph.add(
+        "upload_to_neptune",
+        upload_to_neptune,
+        after=["train", "evaluate", "save", "build_lookup"],
+    )
+    # The data uploads overlap with every stage after the data preparation
+    graph.add(
+        "upload_data",
+        lambda *_: uploader.join(),
+        after=["prepare_train", "prepare_test"],
+    )
+    results = graph.run()
 
-    # Save the pipeline
-    trainer.save_pipeline()
-    trainer.upload_to_neptune(rmse)
+    trainer, training_mode = results["train"]
+    rmse, lookup = results["evaluate"], results["build_lookup"]
+    lookup_rmse, lookup_model_rmse = results["evaluate_lookup"]
+    training_seconds = next(
+        timing["seconds"] for timing in graph.timings if timing["task"] == "train"
+    )
+    uploads = [upload for upload in results["upload_data"] if upload["ok"]]
 
     report = f"""Training Job Report \nTraining Job parameters:
-                    {trainer.params}\nRMSE:\n{rmse}\n"""
+                    {trainer.params}\nTraining ({training_mode}):
+                    {training_seconds:.1f} s\nRMSE:\n{rmse}\n
+                    \nLookup table ({lookup.values.shape[1] - 1} distance buckets,
+                    {lookup.nbytes / 2**20:.1f} MB):\nRMSE: {lookup_rmse}
+                    \nRMSE against the model: {lookup_model_rmse}\n
+                    \nData uploads: {len(uploads)}/{len(results["upload_data"])}
+                    files, {sum(u["bytes"] for u in uploads) / 2**20:.1f} MB\n
+\nStages:\n{graph.report()}\n
+\nInstrumentation:\n{summary_table()}\n"""
 
     print(report)
 